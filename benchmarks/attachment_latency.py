@@ -0,0 +1,91 @@
+"""
+Compare the latency of sending a file inline with the request against uploading it with the Files API.
+
+For each file size, random hex text is written to a temporary file and sent to the model both
+ways: inline (read through a memory map and sent as an inline data part) and uploaded (Files API upload
+followed by a request referencing the uploaded file). Reading and request times are reported separately.
+
+Requires GEMINI_API_KEY. Example:
+
+    python benchmarks/attachment_latency.py --sizes 16384 262144 1048576 4194304 --repeats 5
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from google import genai
+
+from promptpal.attachments import inline_part
+
+PROMPT = "Reply with the single word OK."
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def benchmark_size(client, model: str, size: int, repeats: int) -> dict[str, float]:
+    with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as handle:
+        # Text content so both paths are accepted for any size
+        handle.write(os.urandom(size // 2).hex().encode()[:size])
+        path = Path(handle.name)
+
+    try:
+        read, inline, upload, uploaded_request = [], [], [], []
+        for _ in range(repeats):
+            part, seconds = timed(lambda: inline_part(path))
+            read.append(seconds)
+            _, seconds = timed(lambda part=part: client.models.generate_content(model=model, contents=[PROMPT, part]))
+            inline.append(seconds)
+
+            uploaded, seconds = timed(lambda: client.files.upload(file=path))
+            upload.append(seconds)
+            _, seconds = timed(
+                lambda uploaded=uploaded: client.models.generate_content(model=model, contents=[PROMPT, uploaded])
+            )
+            uploaded_request.append(seconds)
+            client.files.delete(name=uploaded.name)
+    finally:
+        path.unlink()
+
+    return {
+        "read": statistics.median(read),
+        "inline": statistics.median(inline),
+        "upload": statistics.median(upload),
+        "uploaded_request": statistics.median(uploaded_request),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model", default="gemini-2.0-flash")
+    args = parser.parse_args()
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if api_key is None:
+        raise SystemExit("GEMINI_API_KEY environment variable not found!")
+    client = genai.Client(api_key=api_key, http_options={"api_version": "v1beta"})
+
+    columns = ("bytes", 10), ("read (ms)", 10), ("inline (ms)", 12), ("upload (ms)", 12), ("+request (ms)", 14)
+    print(" ".join(f"{name:>{width}}" for name, width in columns), f"{'faster':>8}")
+    for size in args.sizes:
+        result = benchmark_size(client, args.model, size, args.repeats)
+        inline_total = result["read"] + result["inline"]
+        upload_total = result["upload"] + result["uploaded_request"]
+        print(
+            f"{size:>10} {result['read'] * 1000:>10.1f} {result['inline'] * 1000:>12.1f} "
+            f"{result['upload'] * 1000:>12.1f} {result['uploaded_request'] * 1000:>14.1f} "
+            f"{'inline' if inline_total <= upload_total else 'upload':>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+
+from promptpal.cli import main
+
+sys.exit(main())
@@ -0,0 +1,304 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# File extensions for the languages commonly tagged on markdown code fences
+LANGUAGE_EXTENSIONS = {
+    "python": ".py",
+    "py": ".py",
+    "javascript": ".js",
+    "js": ".js",
+    "jsx": ".jsx",
+    "typescript": ".ts",
+    "ts": ".ts",
+    "tsx": ".tsx",
+    "java": ".java",
+    "kotlin": ".kt",
+    "scala": ".scala",
+    "c": ".c",
+    "cpp": ".cpp",
+    "c++": ".cpp",
+    "csharp": ".cs",
+    "cs": ".cs",
+    "go": ".go",
+    "rust": ".rs",
+    "swift": ".swift",
+    "ruby": ".rb",
+    "php": ".php",
+    "perl": ".pl",
+    "lua": ".lua",
+    "r": ".R",
+    "julia": ".jl",
+    "matlab": ".m",
+    "sql": ".sql",
+    "html": ".html",
+    "css": ".css",
+    "scss": ".scss",
+    "bash": ".sh",
+    "sh": ".sh",
+    "shell": ".sh",
+    "zsh": ".sh",
+    "powershell": ".ps1",
+    "dockerfile": ".dockerfile",
+    "makefile": ".mk",
+    "json": ".json",
+    "yaml": ".yaml",
+    "yml": ".yaml",
+    "toml": ".toml",
+    "xml": ".xml",
+    "markdown": ".md",
+    "md": ".md",
+    "latex": ".tex",
+    "tex": ".tex",
+}
+
+
+def content_hash(content: str) -> str:
+    """
+    Compute the content address of an artifact.
+
+    Args:
+        content (str): The artifact content.
+
+    Returns:
+        str: The full hex SHA-256 digest of the UTF-8 encoded content.
+    """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def artifact_filename(language: str, content: str) -> str:
+    """
+    Build the content-addressed filename for a code snippet.
+
+    Args:
+        language (str): The language tag of the snippet.
+        content (str): The snippet content.
+
+    Returns:
+        str: The filename, e.g. ``code_snippet_<sha256>.py``. Unknown languages use ``.txt``.
+    """
+    extension = LANGUAGE_EXTENSIONS.get(language.lower(), ".txt")
+    return f"code_snippet_{content_hash(content)}{extension}"
+
+
+@dataclass(frozen=True)
+class Artifact:
+    """A generated file tracked by an ArtifactStore.
+
+    Attributes:
+        sha256: The content address of the file.
+        path: Path of the file on disk.
+        language: The language tag the content was extracted with.
+        size: Size of the content in bytes.
+        role: Name of the role whose response produced the artifact.
+        message_number: Message number within the session that produced the artifact.
+        created_at: Unix timestamp at which the artifact was recorded.
+    """
+
+    sha256: str
+    path: str
+    language: str
+    size: int
+    role: str | None
+    message_number: int | None
+    created_at: float
+
+
+class ArtifactStore:
+    """
+    A content-addressed store for generated files.
+
+    Files are named by the SHA-256 of their content, so identical content is only ever written once.
+    Every time an artifact is produced, the role and message number are recorded in a SQLite index
+    kept alongside the files, which backs the lookup methods.
+    """
+
+    INDEX_FILENAME = ".artifacts.sqlite3"
+
+    def __init__(self, root: str | Path):
+        """
+        Initialize the store. The directory and index are created on first use.
+
+        Args:
+            root (str | Path): Directory holding the artifacts and the index.
+        """
+        self._root = Path(root)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def root(self) -> Path:
+        """The directory holding the artifacts."""
+        return self._root
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._root.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self._root / self.INDEX_FILENAME, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    sha256 TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS occurrences (
+                    sha256 TEXT NOT NULL REFERENCES artifacts(sha256),
+                    role TEXT,
+                    message_number INTEGER,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS occurrences_sha256 ON occurrences(sha256);
+                CREATE INDEX IF NOT EXISTS occurrences_role ON occurrences(role, message_number);
+                """
+            )
+            self._connection = connection
+        return self._connection
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        # Write to a temporary file in the same directory, then rename it into place
+        fd, temp_path = tempfile.mkstemp(dir=self._root, prefix=".tmp_", suffix=path.suffix)
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+    def put(
+        self,
+        content: str,
+        language: str,
+        role: str | None = None,
+        message_number: int | None = None,
+    ) -> tuple[Artifact, bool]:
+        """
+        Store a generated file, skipping the write if identical content already exists.
+
+        Args:
+            content (str): The file content.
+            language (str): The language tag of the content, used to choose the file extension.
+            role (str, optional): Name of the role that produced the content. Defaults to None.
+            message_number (int, optional): Message number that produced the content. Defaults to None.
+
+        Returns:
+            tuple[Artifact, bool]: The stored artifact and whether a new file was written.
+        """
+        data = content.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        filename = artifact_filename(language, content)
+        path = self._root / filename
+        now = time.time()
+
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT filename FROM artifacts WHERE sha256 = ?", (sha256,)).fetchone()
+
+            written = False
+            if row is None or not (self._root / row[0]).exists():
+                if not path.exists():
+                    self._write_atomic(path, data)
+                    written = True
+                connection.execute(
+                    "INSERT OR REPLACE INTO artifacts (sha256, filename, language, size, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (sha256, filename, language, len(data), now),
+                )
+            else:
+                path = self._root / row[0]
+
+            connection.execute(
+                "INSERT INTO occurrences (sha256, role, message_number, created_at) VALUES (?, ?, ?, ?)",
+                (sha256, role, message_number, now),
+            )
+            connection.commit()
+
+        if not written:
+            logger.debug(f"Artifact {sha256[:12]} already stored; skipping write.")
+
+        return Artifact(sha256, str(path), language, len(data), role, message_number, now), written
+
+    def get(self, sha256: str) -> Artifact | None:
+        """
+        Look up an artifact by its content hash or a unique prefix of it.
+
+        Args:
+            sha256 (str): The full hash or a unique prefix.
+
+        Returns:
+            Artifact | None: The artifact with its first recorded occurrence, or None if not found.
+        """
+        # Compare the prefix literally; with LIKE, "%" and "_" would act as wildcards
+        rows = self._query(
+            "WHERE substr(a.sha256, 1, ?) = ? GROUP BY a.sha256", (len(sha256), sha256.lower()), first_only=True
+        )
+        if len(rows) > 1:
+            raise ValueError(f"Artifact hash prefix '{sha256}' is ambiguous.")
+        return rows[0] if rows else None
+
+    def find(
+        self,
+        role: str | None = None,
+        message_number: int | None = None,
+        language: str | None = None,
+    ) -> list[Artifact]:
+        """
+        Find artifacts by the role and message that produced them, or by language.
+
+        Args:
+            role (str, optional): Only return artifacts produced by this role.
+            message_number (int, optional): Only return artifacts produced by this message number.
+            language (str, optional): Only return artifacts with this language tag.
+
+        Returns:
+            list[Artifact]: One entry per matching occurrence, oldest first.
+        """
+        clauses, params = [], []
+        for column, value in (("o.role", role), ("o.message_number", message_number), ("a.language", language)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(where, tuple(params))
+
+    def _query(self, where: str, params: tuple, first_only: bool = False) -> list[Artifact]:
+        created = "MIN(o.created_at)" if first_only else "o.created_at"
+        sql = (
+            f"SELECT a.sha256, a.filename, a.language, a.size, o.role, o.message_number, {created} "
+            f"FROM artifacts a JOIN occurrences o ON o.sha256 = a.sha256 {where} ORDER BY o.created_at, o.rowid"
+        )
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [
+            Artifact(sha256, str(self._root / filename), language, size, role, message_number, created_at)
+            for sha256, filename, language, size, role, message_number, created_at in rows
+        ]
+
+    def __contains__(self, sha256: str) -> bool:
+        with self._lock:
+            row = self._connect().execute("SELECT 1 FROM artifacts WHERE sha256 = ?", (sha256,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the index connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,105 @@
+import mimetypes
+import mmap
+from pathlib import Path
+
+from google.genai import types
+
+# Gemini rejects requests with more than 20 MB of inline data
+MAX_INLINE_BYTES = 20 * 1024 * 1024
+
+# Files up to this size are sent inline by default; larger ones are uploaded with the Files API
+DEFAULT_INLINE_THRESHOLD = 1024 * 1024
+
+# Non-"text/" MIME types whose content is text
+_TEXT_APPLICATION_TYPES = {
+    "application/json",
+    "application/xml",
+    "application/yaml",
+    "application/x-yaml",
+    "application/javascript",
+    "application/x-sh",
+    "application/sql",
+    "application/toml",
+}
+
+# Bytes sniffed to tell text from binary files with an unknown extension
+_SNIFF_BYTES = 8192
+
+
+def attachment_mime_type(path: str | Path) -> str:
+    """
+    Guess the MIME type of a file.
+
+    Args:
+        path (str | Path): The file.
+
+    Returns:
+        str: The MIME type. Files with an unknown extension are "text/plain" if their first bytes decode
+            as UTF-8 without NUL bytes, and "application/octet-stream" otherwise.
+    """
+    mime_type, _ = mimetypes.guess_type(str(path))
+    if mime_type is not None:
+        return mime_type
+
+    with open(path, "rb") as handle:
+        head = handle.read(_SNIFF_BYTES)
+    if b"\x00" in head:
+        return "application/octet-stream"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character may be cut off at the end of the sniffed bytes
+        if e.start < len(head) - 3:
+            return "application/octet-stream"
+    return "text/plain"
+
+
+def is_text_mime_type(mime_type: str) -> bool:
+    """
+    Check whether a MIME type denotes text.
+
+    Args:
+        mime_type (str): The MIME type.
+
+    Returns:
+        bool: Whether files of this type hold text.
+    """
+    return mime_type.startswith("text/") or mime_type in _TEXT_APPLICATION_TYPES
+
+
+def read_file_bytes(path: str | Path) -> bytes:
+    """
+    Read a file's bytes through a memory map.
+
+    The file is copied once, from the page cache straight into the returned bytes, with no intermediate
+    read buffers or text decoding.
+
+    Args:
+        path (str | Path): The file.
+
+    Returns:
+        bytes: The file's content.
+    """
+    with open(path, "rb") as handle:
+        if Path(path).stat().st_size == 0:
+            return b""  # Empty files cannot be memory-mapped
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:]
+
+
+def inline_part(path: str | Path, mime_type: str | None = None) -> types.Part:
+    """
+    Build an inline data part holding a file's content.
+
+    Args:
+        path (str | Path): The file.
+        mime_type (str, optional): The MIME type. Guessed from the file if None. Text types are sent as
+            "text/plain", which the API accepts for any text. Defaults to None.
+
+    Returns:
+        types.Part: The part.
+    """
+    mime_type = mime_type or attachment_mime_type(path)
+    if is_text_mime_type(mime_type):
+        mime_type = "text/plain"
+    return types.Part.from_bytes(data=read_file_bytes(path), mime_type=mime_type)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str, casefold: bool = True) -> str:
+    """
+    Normalize a prompt so that trivially different copies deduplicate to the same entry.
+
+    Collapses runs of whitespace, strips leading and trailing whitespace and, unless casefold is False,
+    casefolds the text. Prompts that differ only in case then share one result, so pass casefold=False
+    when the result keeps the prompt's own text (e.g. keyword refinement).
+
+    Args:
+        prompt (str): The prompt to normalize.
+        casefold (bool): Whether prompts that differ only in case are the same entry. Defaults to True.
+
+    Returns:
+        str: The normalized prompt.
+    """
+    prompt = re.sub(r"\s+", " ", prompt).strip()
+    return prompt.casefold() if casefold else prompt
+
+
+def prompt_key(prompt: str, *parts: str) -> str:
+    """
+    Build a stable key for a prompt and any additional qualifiers (e.g. the refinement type).
+
+    Args:
+        prompt (str): The (already normalized) prompt.
+        *parts (str): Additional values that distinguish otherwise identical prompts.
+
+    Returns:
+        str: A hex SHA-256 digest identifying the prompt.
+    """
+    digest = hashlib.sha256()
+    for part in (*parts, prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def load_checkpoint(path: str | Path, key_field: str = "key") -> dict[str, dict]:
+    """
+    Load completed records from a JSONL checkpoint file.
+
+    A partially written final line (e.g. from an interrupted run) is ignored, as are records that
+    carry an ``error`` field, so that failed entries are retried on resume.
+
+    Args:
+        path (str | Path): The JSONL file to read.
+        key_field (str): The record field holding the entry key. Defaults to "key".
+
+    Returns:
+        dict[str, dict]: Completed records by key. Empty if the file does not exist.
+    """
+    records = {}
+    path = Path(path)
+    if not path.exists():
+        return records
+
+    with open(path, encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping unreadable checkpoint line {line_number} in {path}")
+                continue
+            if key_field in record and "error" not in record:
+                records[record[key_field]] = record
+
+    return records
+
+
+def append_record(handle, record: dict) -> None:
+    """
+    Append a single record to an open JSONL file and flush it so it survives interruption.
+
+    Args:
+        handle: A text file handle opened for appending.
+        record (dict): The JSON-serializable record to write.
+    """
+    handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+    handle.flush()
+
+
+@dataclass
+class BatchProgress:
+    """Progress and throughput of a batch run.
+
+    Attributes:
+        total: Number of unique entries in the batch.
+        completed: Entries processed during this run.
+        resumed: Entries restored from a checkpoint instead of being processed.
+        failed: Entries that raised an error during this run.
+        duplicates: Input entries that were collapsed into an earlier identical entry.
+        started_at: Monotonic timestamp at which the run started.
+    """
+
+    total: int
+    completed: int = 0
+    resumed: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds elapsed since the run started."""
+        return time.monotonic() - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Entries processed per second during this run."""
+        elapsed = self.elapsed
+        return (self.completed + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def remaining(self) -> int:
+        """Entries still waiting to be processed."""
+        return self.total - self.completed - self.resumed - self.failed
+
+    def __str__(self) -> str:
+        done = self.completed + self.resumed + self.failed
+        return (
+            f"{done}/{self.total} done ({self.resumed} resumed, {self.failed} failed, "
+            f"{self.duplicates} duplicates) in {self.elapsed:.1f}s - {self.throughput:.2f}/s"
+        )
@@ -0,0 +1,276 @@
+import argparse
+import csv
+import json
+import logging
+import sys
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from promptpal.batch import BatchProgress, append_record, load_checkpoint, normalize_prompt, prompt_key
+from promptpal.promptpal import Promptpal, PromptRefinementType
+from promptpal.server import PromptpalServer
+from promptpal.usage import Usage, track_usage
+
+logger = logging.getLogger(__name__)
+
+# Promptpal instance used by the current worker (the shared instance for threads, one per worker process)
+_worker_promptpal = None
+
+
+def read_batch_records(path: str | Path) -> Iterator[dict]:
+    """
+    Read batch job records from a JSONL or CSV file.
+
+    Each record has a ``message`` and either a ``role`` (answered with message()) or a
+    ``refinement_type`` (refined with refine_prompt()). An optional ``id`` identifies the record in the
+    output; otherwise a key is derived from its contents.
+
+    Args:
+        path (str | Path): The input file. Files ending in .csv are read as CSV, anything else as JSONL.
+
+    Yields:
+        dict: The records, each with a ``key`` field added.
+
+    Raises:
+        ValueError: If a record is missing required fields.
+    """
+    path = Path(path)
+    with open(path, encoding="utf-8", newline="") as handle:
+        if path.suffix.lower() == ".csv":
+            rows = ({k: v for k, v in row.items() if v not in (None, "")} for row in csv.DictReader(handle))
+        else:
+            rows = (json.loads(line) for line in handle if line.strip())
+
+        for number, row in enumerate(rows, start=1):
+            if not row.get("message"):
+                raise ValueError(f"Record {number} in {path} has no 'message'.")
+            if not row.get("role") and not row.get("refinement_type"):
+                raise ValueError(f"Record {number} in {path} needs a 'role' or a 'refinement_type'.")
+
+            key = row.get("id")
+            if key is None:
+                key = prompt_key(normalize_prompt(row["message"]), row.get("role", ""), row.get("refinement_type", ""))
+            yield {**row, "key": str(key)}
+
+
+def _init_worker(promptpal_kwargs: dict, roles_file: str | None) -> None:
+    """Create the Promptpal instance for a worker process."""
+    global _worker_promptpal
+    _worker_promptpal = _create_promptpal(promptpal_kwargs, roles_file)
+
+
+def _create_promptpal(promptpal_kwargs: dict, roles_file: str | None) -> Promptpal:
+    promptpal = Promptpal(**promptpal_kwargs)
+    if roles_file:
+        with open(roles_file, encoding="utf-8") as file:
+            promptpal.add_roles_from_file(file)
+    return promptpal
+
+
+def process_record(record: dict, structured: bool = False) -> tuple[dict, Usage]:
+    """
+    Run a single batch record against the worker's Promptpal instance.
+
+    Args:
+        record (dict): The record to process.
+        structured (bool): Whether refinements use structured output. Defaults to False.
+
+    Returns:
+        tuple[dict, Usage]: The output record and the token usage of the record.
+    """
+    result = {key: record[key] for key in ("key", "id", "role", "refinement_type") if key in record}
+    with track_usage() as usage:
+        try:
+            if record.get("refinement_type"):
+                refinement_type = PromptRefinementType(record["refinement_type"])
+                result["response"] = _worker_promptpal.refine_prompt(record["message"], refinement_type, structured)
+            else:
+                result["response"] = _worker_promptpal.message(record["role"], record["message"])
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e!s}"
+    result["tokens"] = usage.total_tokens
+    return result, usage
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    promptpal_kwargs: dict,
+    roles_file: str | None = None,
+    workers: int = 4,
+    executor: str = "thread",
+    resume: bool = True,
+    structured: bool = False,
+    log_every: int = 100,
+) -> tuple[BatchProgress, Usage]:
+    """
+    Process a batch file, appending results to a JSONL file as they complete.
+
+    Records already present in the output file are skipped when resuming. At most a few records per
+    worker are in flight at a time, so arbitrarily large inputs are streamed rather than loaded up front.
+
+    Args:
+        input_path (str): The JSONL or CSV file of records.
+        output_path (str): The JSONL file to append results to.
+        promptpal_kwargs (dict): Keyword arguments used to construct Promptpal.
+        roles_file (str, optional): Additional roles YAML file to load. Defaults to None.
+        workers (int): Number of worker threads or processes. Defaults to 4.
+        executor (str): "thread" or "process". Defaults to "thread".
+        resume (bool): Whether to skip records already in the output file. Defaults to True.
+        structured (bool): Whether refinements use structured output. Defaults to False.
+        log_every (int): Log progress every this many records. Defaults to 100.
+
+    Returns:
+        tuple[BatchProgress, Usage]: The final progress and the total token usage of this run.
+    """
+    global _worker_promptpal
+
+    done = set(load_checkpoint(output_path)) if resume else set()
+
+    # A first pass only collects keys, so the records themselves are never all held in memory
+    record_count = 0
+    unique_keys = set()
+    for record in read_batch_records(input_path):
+        record_count += 1
+        unique_keys.add(record["key"])
+    progress = BatchProgress(total=len(unique_keys), duplicates=record_count - len(unique_keys))
+    progress.resumed = len(done & unique_keys)
+    total_usage = Usage()
+
+    if executor == "process":
+        pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(promptpal_kwargs, roles_file)
+        )
+    elif executor == "thread":
+        # message() and refine_prompt() hold no per-call state, so threads share one instance
+        _worker_promptpal = _create_promptpal(promptpal_kwargs, roles_file)
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unknown executor '{executor}'. Expected 'thread' or 'process'.")
+
+    max_in_flight = workers * 4
+    in_flight = set()
+    seen = set(done)
+
+    with pool, open(output_path, "a", encoding="utf-8") as output_file:
+
+        def collect(futures):
+            for future in futures:
+                result, usage = future.result()
+                total_usage.merge(usage)
+                if "error" in result:
+                    logger.error(f"Record {result['key']} failed: {result['error']}")
+                    progress.failed += 1
+                else:
+                    progress.completed += 1
+                append_record(output_file, result)
+                if log_every and (progress.completed + progress.failed) % log_every == 0:
+                    logger.info(f"Batch progress: {progress}")
+
+        for record in read_batch_records(input_path):
+            if record["key"] in seen:
+                continue
+            seen.add(record["key"])
+
+            if len(in_flight) >= max_in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            in_flight.add(pool.submit(process_record, record, structured))
+
+        collect(wait(in_flight).done)
+
+    return progress, total_usage
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser for the promptpal command."""
+    parser = argparse.ArgumentParser(prog="promptpal", description="Command-line tools for Promptpal.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Options for constructing Promptpal, shared by all subcommands
+    connection = argparse.ArgumentParser(add_help=False)
+    connection.add_argument("--roles-file", help="Additional roles YAML file to load.")
+    connection.add_argument("--no-vertexai", action="store_true", help="Use the Gemini API with GEMINI_API_KEY.")
+    connection.add_argument("--project", default="", help="Vertex AI project.")
+    connection.add_argument("--location", default="", help="Vertex AI location.")
+
+    batch = subparsers.add_parser(
+        "batch", parents=[connection], help="Process a JSONL or CSV file of messages and refinements."
+    )
+    batch.add_argument("input", help="JSONL or CSV file with message, role and/or refinement_type fields.")
+    batch.add_argument("-o", "--output", required=True, help="JSONL file to append results to.")
+    batch.add_argument("-w", "--workers", type=int, default=4, help="Number of concurrent workers (default: 4).")
+    batch.add_argument(
+        "--executor", choices=["thread", "process"], default="thread", help="Worker pool type (default: thread)."
+    )
+    batch.add_argument("--no-resume", action="store_true", help="Reprocess records already in the output file.")
+    batch.add_argument("--structured", action="store_true", help="Use structured output for refinements.")
+    batch.add_argument("--log-every", type=int, default=100, help="Report progress every N records (default: 100).")
+
+    serve = subparsers.add_parser("serve", parents=[connection], help="Serve chat, message and refine over HTTP.")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1).")
+    serve.add_argument("--port", type=int, default=8080, help="Port to bind (default: 8080).")
+    serve.add_argument("--max-sessions", type=int, default=1000, help="Maximum chat sessions kept (default: 1000).")
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Entry point for the promptpal command.
+
+    Args:
+        argv (list[str], optional): Command-line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit status.
+    """
+    args = build_parser().parse_args(argv)
+    promptpal_kwargs = {
+        "vertexai": not args.no_vertexai,
+        "project": args.project,
+        "location": args.location,
+    }
+
+    if args.command == "serve":
+        server = PromptpalServer(
+            _create_promptpal(promptpal_kwargs, args.roles_file),
+            host=args.host,
+            port=args.port,
+            max_sessions=args.max_sessions,
+        )
+        print(f"Serving Promptpal on http://{args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    if args.command == "batch":
+        if args.workers < 1:
+            print("--workers must be at least 1.", file=sys.stderr)
+            return 2
+
+        progress, usage = run_batch(
+            args.input,
+            args.output,
+            promptpal_kwargs,
+            roles_file=args.roles_file,
+            workers=args.workers,
+            executor=args.executor,
+            resume=not args.no_resume,
+            structured=args.structured,
+            log_every=args.log_every,
+        )
+
+        print(f"Processed {progress}")
+        print(
+            f"Tokens: {usage.total_tokens} total ({usage.prompt_tokens} prompt, {usage.output_tokens} output) "
+            f"over {usage.calls} calls"
+        )
+        return 1 if progress.failed else 0
+
+    return 0
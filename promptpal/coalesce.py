@@ -0,0 +1,100 @@
+import hashlib
+import json
+import threading
+from collections.abc import Callable
+from typing import Any
+
+
+def request_key(*parts: Any) -> str:
+    """
+    Build a key identifying a model request from its role, model, config and contents.
+
+    Args:
+        *parts: JSON-serializable request components. Other values are keyed by their string form.
+
+    Returns:
+        str: A hex SHA-256 digest of the request.
+    """
+    encoded = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    """An in-flight call that followers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into a single execution.
+
+    The first caller for a key (the leader) runs the function. Callers that arrive with the same key
+    while it is running wait for the leader and receive its result, or its exception. Once the call
+    finishes the key is released, so later calls run again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._requests = 0
+        self._executed = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn, or wait for an identical call that is already in flight.
+
+        Args:
+            key (str): Identifies identical calls.
+            fn (Callable): The call to run if none is in flight for key.
+
+        Returns:
+            Any: The result of the call.
+
+        Raises:
+            Exception: Whatever the call raised, re-raised in every waiting caller.
+        """
+        with self._lock:
+            self._requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        """
+        Get coalescing statistics.
+
+        Returns:
+            dict: The number of requests, the calls actually executed, the requests that were collapsed
+                into an in-flight call, and the number of calls currently in flight.
+        """
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "executed": self._executed,
+                "coalesced": self._requests - self._executed,
+                "in_flight": len(self._calls),
+            }
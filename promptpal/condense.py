@@ -0,0 +1,143 @@
+import re
+from collections import Counter
+
+# Common words that carry little information when scoring sentences
+STOPWORDS = frozenset(
+    """
+    a about above after again all also am an and any are as at be because been before being below between both
+    but by can could did do does doing down during each few for from further had has have having he her here
+    hers him his how i if in into is it its itself just me more most my no nor not now of off on once only or
+    other our ours out over own same she should so some such than that the their theirs them then there these
+    they this those through to too under until up very was we were what when where which while who whom why
+    will with would you your yours
+    """.split()
+)
+
+_FENCE = re.compile(r"^\s*```")
+_HEADING = re.compile(r"^\s*#{1,6}\s+\S")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[*`])")
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def _split_blocks(text: str) -> list[tuple[str, str]]:
+    """Split markdown text into ("heading" | "code" | "text", content) blocks."""
+    blocks = []
+    paragraph = []
+    code = None
+
+    def flush_paragraph():
+        if paragraph:
+            blocks.append(("text", "\n".join(paragraph)))
+            paragraph.clear()
+
+    for line in text.split("\n"):
+        if code is not None:
+            code.append(line)
+            if _FENCE.match(line):
+                blocks.append(("code", "\n".join(code)))
+                code = None
+        elif _FENCE.match(line):
+            flush_paragraph()
+            code = [line]
+        elif _HEADING.match(line):
+            flush_paragraph()
+            blocks.append(("heading", line.strip()))
+        elif not line.strip():
+            flush_paragraph()
+        else:
+            paragraph.append(line.strip())
+
+    flush_paragraph()
+    if code is not None:
+        # Unterminated fence; keep what was received
+        blocks.append(("code", "\n".join(code)))
+
+    return blocks
+
+
+def _truncate_code(block: str, max_lines: int) -> str:
+    lines = block.split("\n")
+    fence, body = lines[0], lines[1:]
+    closing = body.pop() if body and _FENCE.match(body[-1]) else "```"
+    if len(body) > max_lines:
+        omitted = len(body) - max_lines
+        body = [*body[:max_lines], f"... ({omitted} more lines)"]
+    return "\n".join([fence, *body, closing])
+
+
+def condense(text: str, max_sentences: int = 5, max_code_lines: int = 8, max_code_blocks: int = 2) -> str:
+    """
+    Condense a response locally by keeping its most informative sentences.
+
+    Sentences are scored by the frequency of their content words across the whole response, with a
+    bonus for sentences that open a paragraph. The top sentences are kept in their original order,
+    headings are kept only for sections that still have content, and code blocks are truncated rather
+    than summarized.
+
+    Args:
+        text (str): The text to condense.
+        max_sentences (int): Maximum number of prose sentences to keep. Defaults to 5.
+        max_code_lines (int): Maximum number of lines to keep from each code block. Defaults to 8.
+        max_code_blocks (int): Maximum number of code blocks to keep. Defaults to 2.
+
+    Returns:
+        str: The condensed text.
+    """
+    blocks = _split_blocks(text)
+
+    # Break prose blocks into sentences, remembering where each came from
+    sentences = []
+    for index, (kind, content) in enumerate(blocks):
+        if kind == "text":
+            lines = content.split("\n")
+            # List items are treated as sentences of their own
+            parts = (
+                lines
+                if all(re.match(r"^([-*+]|\d+[.)])\s", line) for line in lines)
+                else _SENTENCE_SPLIT.split(" ".join(lines))
+            )
+            for position, sentence in enumerate(parts):
+                if sentence.strip():
+                    sentences.append((index, position, sentence.strip()))
+
+    frequencies = Counter(
+        word for _, _, sentence in sentences for word in _WORD.findall(sentence.lower()) if word not in STOPWORDS
+    )
+    top_frequency = max(frequencies.values(), default=1)
+
+    def score(entry):
+        _, position, sentence = entry
+        words = [word for word in _WORD.findall(sentence.lower()) if word not in STOPWORDS]
+        if not words:
+            return 0.0
+        value = sum(frequencies[word] / top_frequency for word in words) / len(words) ** 0.5
+        return value * (1.5 if position == 0 else 1.0)
+
+    selected = {(index, position) for index, position, _ in sorted(sentences, key=score, reverse=True)[:max_sentences]}
+
+    output = []
+    pending_heading = None
+    code_blocks = 0
+    for index, (kind, content) in enumerate(blocks):
+        if kind == "heading":
+            pending_heading = content
+            continue
+
+        if kind == "code":
+            if code_blocks >= max_code_blocks:
+                continue
+            code_blocks += 1
+            kept = _truncate_code(content, max_code_lines)
+        else:
+            kept_sentences = [s for i, p, s in sentences if i == index and (i, p) in selected]
+            if not kept_sentences:
+                continue
+            separator = "\n" if re.match(r"^([-*+]|\d+[.)])\s", kept_sentences[0]) else " "
+            kept = separator.join(kept_sentences)
+
+        if pending_heading:
+            output.append(pending_heading)
+            pending_heading = None
+        output.append(kept)
+
+    return "\n\n".join(output)
@@ -0,0 +1,134 @@
+import contextvars
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any
+
+
+class PromptpalTimeoutError(TimeoutError):
+    """Raised when a call does not finish before its deadline."""
+
+
+class CallCancelledError(Exception):
+    """Raised when a call is cancelled through its Deadline."""
+
+
+class Deadline:
+    """
+    A time limit for a call that can also be cancelled from another thread.
+
+    Pass a Deadline (or a number of seconds) as the ``deadline`` of chat() or message(). The same
+    deadline covers every stage of the call: file scanning and uploads, the model request and
+    post-processing. Blocking requests cannot be interrupted, so a request that runs past the deadline
+    keeps running in the background and its result is discarded.
+
+    Example:
+        deadline = Deadline(timeout=30)
+        threading.Timer(5, deadline.cancel).start()
+        promptpal.chat("assistant", "Hello", deadline=deadline)
+    """
+
+    def __init__(self, timeout: float | None = None):
+        """
+        Initialize the deadline.
+
+        Args:
+            timeout (float, optional): Seconds from now until the deadline. Defaults to None (no time limit).
+        """
+        self._expires_at = time.monotonic() + timeout if timeout is not None else None
+        self._cancelled = False
+        self._condition = threading.Condition()
+
+    @classmethod
+    def coerce(cls, deadline: "Deadline | float | None") -> "Deadline | None":
+        """
+        Convert a number of seconds to a Deadline, passing Deadline objects and None through.
+
+        Args:
+            deadline (Deadline | float, optional): A deadline or a timeout in seconds.
+
+        Returns:
+            Deadline | None: The deadline.
+        """
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        return cls(timeout=deadline)
+
+    def cancel(self) -> None:
+        """Cancel the call, waking it if it is waiting on a request."""
+        with self._condition:
+            self._cancelled = True
+            self._condition.notify_all()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancel() has been called."""
+        return self._cancelled
+
+    @property
+    def exceeded(self) -> bool:
+        """Whether the call was cancelled or the deadline has passed."""
+        return self._cancelled or (self._expires_at is not None and time.monotonic() >= self._expires_at)
+
+    def remaining(self) -> float | None:
+        """
+        Get the time left.
+
+        Returns:
+            float | None: Seconds until the deadline (never negative), or None if there is no time limit.
+        """
+        if self._expires_at is None:
+            return None
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def check(self, stage: str) -> None:
+        """
+        Raise if the call was cancelled or the deadline has passed.
+
+        Args:
+            stage (str): What the call is doing, used in the error message.
+
+        Raises:
+            CallCancelledError: If the call was cancelled.
+            PromptpalTimeoutError: If the deadline has passed.
+        """
+        if self._cancelled:
+            raise CallCancelledError(f"Call cancelled during {stage}.")
+        if self.exceeded:
+            raise PromptpalTimeoutError(f"Deadline exceeded during {stage}.")
+
+    def run(self, fn: Callable[[], Any], stage: str) -> Any:
+        """
+        Run a blocking call, giving up when the deadline passes or the call is cancelled.
+
+        Args:
+            fn (Callable): The blocking call.
+            stage (str): What the call is doing, used in error messages.
+
+        Returns:
+            Any: The result of the call.
+
+        Raises:
+            CallCancelledError: If the call was cancelled.
+            PromptpalTimeoutError: If the deadline passed first.
+        """
+        self.check(stage)
+        future = Future()
+        context = contextvars.copy_context()
+
+        def target() -> None:
+            try:
+                future.set_result(context.run(fn))
+            except BaseException as e:
+                future.set_exception(e)
+            with self._condition:
+                self._condition.notify_all()
+
+        # A daemon thread, so requests abandoned after the deadline never block interpreter exit
+        threading.Thread(target=target, name="promptpal-deadline", daemon=True).start()
+        with self._condition:
+            while not future.done():
+                self.check(stage)
+                self._condition.wait(self.remaining())
+        return future.result()
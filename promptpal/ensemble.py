@@ -0,0 +1,247 @@
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from promptpal.usage import Usage, track_usage
+
+if TYPE_CHECKING:
+    from promptpal.promptpal import Promptpal
+
+logger = logging.getLogger(__name__)
+
+JUDGE_PROMPT = (
+    "Several answers were given to the question below. Reply with only the number of the best answer.\n\n"
+    "Question:\n{prompt}\n\n{answers}"
+)
+
+
+@dataclass
+class EnsembleMember:
+    """A role, optionally with a different model, taking part in an ensemble.
+
+    Attributes:
+        role: The role to send the prompt to.
+        model: The model to use instead of the role's model. Defaults to None.
+    """
+
+    role: str
+    model: str | None = None
+
+    @property
+    def label(self) -> str:
+        return self.role if self.model is None else f"{self.role}@{self.model}"
+
+
+@dataclass
+class MemberResult:
+    """The answer of one ensemble member.
+
+    Attributes:
+        member: The member.
+        output: The answer, or None if the member failed or was not waited for.
+        latency: Seconds until the member answered.
+        usage: Tokens used by the member.
+        error: The error raised by the member, if any.
+        cancelled: Whether the ensemble finished before the member answered.
+    """
+
+    member: EnsembleMember
+    output: str | None = None
+    latency: float | None = None
+    usage: Usage = field(default_factory=Usage)
+    error: Exception | None = None
+    cancelled: bool = False
+
+
+@dataclass
+class EnsembleResult:
+    """The aggregated answer of an ensemble.
+
+    Attributes:
+        answer: The aggregated answer.
+        members: The result of every member, in the order they were given.
+        stopped_early: Whether the ensemble finished before every member answered.
+        judge_usage: Tokens used by the judge role, if one was asked.
+    """
+
+    answer: str | None
+    members: list[MemberResult]
+    stopped_early: bool = False
+    judge_usage: Usage = field(default_factory=Usage)
+
+    @property
+    def usage(self) -> Usage:
+        """Tokens used by all members that answered, plus the judge."""
+        total = Usage()
+        total.merge(self.judge_usage)
+        for result in self.members:
+            total.merge(result.usage)
+        return total
+
+
+def normalize_answer(answer: str) -> str:
+    """
+    Normalize an answer so that answers differing only in whitespace or case count as the same vote.
+
+    Args:
+        answer (str): The answer.
+
+    Returns:
+        str: The answer with whitespace collapsed and stripped, casefolded.
+    """
+    return " ".join(answer.split()).casefold()
+
+
+def majority_vote(results: list[MemberResult]) -> str | None:
+    """
+    Pick the most common answer, comparing answers with whitespace and case normalized.
+
+    Args:
+        results (list[MemberResult]): Member results, in the order they completed. Ties go to the earliest.
+
+    Returns:
+        str | None: The winning answer, or None if no member answered.
+    """
+    answered = [result.output for result in results if result.output is not None]
+    if not answered:
+        return None
+    votes = Counter(normalize_answer(output) for output in answered)
+    winner, _ = votes.most_common(1)[0]
+    return next(output for output in answered if normalize_answer(output) == winner)
+
+
+class Ensemble:
+    """
+    Send one prompt to several roles or models concurrently and aggregate their answers.
+
+    Answers are aggregated by majority vote, by a judge role that picks the best answer, or by a custom
+    callback. The ensemble can finish early, once ``quorum`` members agree or once an answer passes the
+    ``accept`` check; members still running are then not waited for.
+
+    Example:
+        ensemble = Ensemble(["analyst", EnsembleMember("analyst", model="gemini-2.0-flash")], quorum=2)
+        result = promptpal.run_ensemble(ensemble, "Is this variant pathogenic?")
+    """
+
+    def __init__(
+        self,
+        members: list[str | EnsembleMember],
+        aggregate: str | Callable[[list[MemberResult]], str | None] = "majority",
+        judge_role: str | None = None,
+        quorum: int | None = None,
+        accept: Callable[[str], bool] | None = None,
+    ):
+        """
+        Initialize the ensemble.
+
+        Args:
+            members (list[str | EnsembleMember]): Role names or members to send the prompt to.
+            aggregate (str | Callable): "majority", "judge", or a callable taking the member results in
+                completion order and returning the answer. Defaults to "majority".
+            judge_role (str, optional): The role that picks the best answer when aggregate is "judge".
+            quorum (int, optional): Finish as soon as this many members give the same answer. Defaults to None.
+            accept (Callable, optional): Finish as soon as an answer passes this check. Defaults to None.
+
+        Raises:
+            ValueError: If there are no members or the aggregation is unknown.
+        """
+        if not members:
+            raise ValueError("An ensemble needs at least one member.")
+        if aggregate == "judge" and judge_role is None:
+            raise ValueError("A judge_role is required to aggregate with a judge.")
+        if not callable(aggregate) and aggregate not in ("majority", "judge"):
+            raise ValueError(f"Unknown aggregation '{aggregate}'. Expected 'majority', 'judge' or a callable.")
+
+        self.members = [member if isinstance(member, EnsembleMember) else EnsembleMember(member) for member in members]
+        self._aggregate = aggregate
+        self._judge_role = judge_role
+        self._quorum = quorum
+        self._accept = accept
+
+    def run(self, promptpal: "Promptpal", prompt: str) -> EnsembleResult:
+        """
+        Send the prompt to every member concurrently and aggregate the answers.
+
+        Args:
+            promptpal (Promptpal): The instance to send the prompt with.
+            prompt (str): The prompt.
+
+        Returns:
+            EnsembleResult: The aggregated answer and every member's result.
+        """
+        results = [MemberResult(member) for member in self.members]
+        completed = []
+        early_answer = None
+
+        executor = ThreadPoolExecutor(max_workers=len(self.members), thread_name_prefix="promptpal-ensemble")
+        try:
+            # Members keep the caller's request priority and usage trackers
+            pending = {
+                executor.submit(contextvars.copy_context().run, self._ask, promptpal, result, prompt): result
+                for result in results
+            }
+            while pending and early_answer is None:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = pending.pop(future)
+                    completed.append(result)
+                    if result.output is not None:
+                        early_answer = self._early_answer(completed, result.output)
+                        if early_answer is not None:
+                            break
+            for future, result in pending.items():
+                result.cancelled = not future.done()
+        finally:
+            # Members still running after an early finish are not waited for
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if early_answer is not None:
+            return EnsembleResult(early_answer, results, stopped_early=any(r.cancelled for r in results))
+        with track_usage() as judge_usage:
+            answer = self._aggregate_answers(promptpal, prompt, completed)
+        return EnsembleResult(answer, results, judge_usage=judge_usage)
+
+    def _ask(self, promptpal: "Promptpal", result: MemberResult, prompt: str) -> None:
+        started = time.perf_counter()
+        try:
+            with track_usage() as usage:
+                result.output = promptpal.message(result.member.role, prompt, model=result.member.model)
+        except Exception as e:
+            logger.warning(f"Ensemble member {result.member.label} failed: {e!s}")
+            result.error = e
+        result.latency = time.perf_counter() - started
+        result.usage = usage
+
+    def _early_answer(self, completed: list[MemberResult], output: str) -> str | None:
+        if self._accept is not None and self._accept(output):
+            return output
+        if self._quorum is not None:
+            agreeing = sum(
+                1 for r in completed if r.output is not None and normalize_answer(r.output) == normalize_answer(output)
+            )
+            if agreeing >= self._quorum:
+                return output
+        return None
+
+    def _aggregate_answers(self, promptpal: "Promptpal", prompt: str, completed: list[MemberResult]) -> str | None:
+        if callable(self._aggregate):
+            return self._aggregate(completed)
+        if self._aggregate == "majority":
+            return majority_vote(completed)
+
+        answered = [result for result in completed if result.output is not None]
+        if len(answered) <= 1:
+            return answered[0].output if answered else None
+        answers = "\n\n".join(f"Answer {i}:\n{result.output}" for i, result in enumerate(answered, start=1))
+        verdict = promptpal.message(self._judge_role, JUDGE_PROMPT.format(prompt=prompt, answers=answers))
+        match = re.search(r"\d+", verdict)
+        if match and 1 <= int(match.group()) <= len(answered):
+            return answered[int(match.group()) - 1].output
+        logger.warning("Judge did not pick an answer by number. Falling back to a majority vote.")
+        return majority_vote(answered)
@@ -0,0 +1,107 @@
+import difflib
+import hashlib
+import threading
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class _SentVersion:
+    digest: str
+    text: str
+
+
+class SentFileVersions:
+    """
+    The version of each text file last sent in a chat, so files referenced again can be sent as a diff.
+
+    Thread-safe.
+    """
+
+    def __init__(self, context_lines: int = 3):
+        """
+        Initialize the tracker.
+
+        Args:
+            context_lines (int): Unchanged lines shown around each change in a diff. Defaults to 3.
+        """
+        self._context_lines = context_lines
+        self._versions: dict[str, _SentVersion] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, path: str) -> bool:
+        with self._lock:
+            return path in self._versions
+
+    def resend(self, path: str, text: str) -> str | None:
+        """
+        Describe a file relative to the version sent earlier in the chat.
+
+        Args:
+            path (str): The file path, as referenced in the message.
+            text (str): The file's current text.
+
+        Returns:
+            str | None: A note that the file is unchanged, or a unified diff against the version sent
+                earlier, to send instead of the whole file. None if the file was not sent before or the
+                diff would not be smaller than the file.
+        """
+        with self._lock:
+            previous = self._versions.get(path)
+        if previous is None:
+            return None
+        if previous.digest == _digest(text):
+            return f"\n\n[{path} is unchanged since it was sent earlier in this chat.]\n"
+
+        diff = "".join(
+            difflib.unified_diff(
+                previous.text.splitlines(keepends=True),
+                text.splitlines(keepends=True),
+                fromfile=f"{path} (sent earlier)",
+                tofile=path,
+                n=self._context_lines,
+            )
+        )
+        if len(diff) >= len(text):
+            return None
+        return f"\n\nChanges to {path} since it was sent earlier in this chat:\n```diff\n{diff.rstrip()}\n```\n"
+
+    def record(self, versions: dict[str, str]) -> None:
+        """
+        Record the versions of files sent in a message.
+
+        Args:
+            versions (dict[str, str]): File paths and the text the model now has for them.
+        """
+        with self._lock:
+            for path, text in versions.items():
+                self._versions[path] = _SentVersion(_digest(text), text)
+
+    def copy(self) -> "SentFileVersions":
+        """
+        Copy the sent versions, e.g. for a copy of the chat.
+
+        Returns:
+            SentFileVersions: An independent copy.
+        """
+        copied = SentFileVersions(self._context_lines)
+        with self._lock:
+            copied._versions = dict(self._versions)
+        return copied
+
+    def forget(self, paths: list[str] | None = None) -> None:
+        """
+        Forget sent versions, e.g. because they were removed from the chat history.
+
+        Args:
+            paths (list[str], optional): The files to forget. Defaults to None (all files).
+        """
+        with self._lock:
+            if paths is None:
+                self._versions.clear()
+            else:
+                for path in paths:
+                    self._versions.pop(path, None)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,174 @@
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class HedgingPolicy:
+    """
+    Issue a duplicate request when a call is slower than usual and take whichever finishes first.
+
+    The hedge delay is the given percentile of recently observed latencies (or a fixed delay). If the
+    first attempt has not completed by then, a second attempt is started, optionally against a fallback
+    model, and the first result wins. The losing attempt is cancelled if it has not started yet;
+    otherwise its result is discarded when it completes. Extra requests are limited to a fraction of all
+    requests so hedging cannot more than slightly increase load.
+    """
+
+    def __init__(
+        self,
+        delay: float | None = None,
+        percentile: float = 95.0,
+        initial_delay: float = 2.0,
+        min_samples: int = 20,
+        window: int = 500,
+        fallback_model: str | None = None,
+        max_extra_ratio: float = 0.1,
+        max_workers: int = 32,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            delay (float, optional): Fixed hedge delay in seconds. If None, the delay is derived from the
+                observed latency percentile. Defaults to None.
+            percentile (float): Latency percentile used as the hedge delay. Defaults to 95.
+            initial_delay (float): Delay used until min_samples latencies have been observed. Defaults to 2.0.
+            min_samples (int): Number of observed latencies needed before using the percentile. Defaults to 20.
+            window (int): Number of recent latencies the percentile is computed over. Defaults to 500.
+            fallback_model (str, optional): Model for the hedged attempt. Defaults to None (the same model).
+            max_extra_ratio (float): Maximum number of hedged attempts as a fraction of requests. Defaults to 0.1.
+            max_workers (int): Maximum number of attempts running at once. Defaults to 32.
+        """
+        if not 0.0 < percentile < 100.0:
+            raise ValueError("percentile must be between 0 and 100.")
+        if max_extra_ratio < 0.0:
+            raise ValueError("max_extra_ratio must not be negative.")
+
+        self.fallback_model = fallback_model
+        self._delay = delay
+        self._percentile = percentile
+        self._initial_delay = initial_delay
+        self._min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._max_extra_ratio = max_extra_ratio
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self._requests = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._budget_denied = 0
+
+    def hedge_delay(self) -> float:
+        """
+        Get the current hedge delay.
+
+        Returns:
+            float: Seconds to wait for the first attempt before hedging.
+        """
+        if self._delay is not None:
+            return self._delay
+        with self._lock:
+            if len(self._latencies) < self._min_samples:
+                return self._initial_delay
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, math.ceil(self._percentile / 100.0 * len(ordered)) - 1)
+        return ordered[index]
+
+    def run(self, primary: Callable[[], Any], backup: Callable[[], Any]) -> Any:
+        """
+        Run a call, hedging it with a second attempt if it is slow.
+
+        Args:
+            primary (Callable): The call.
+            backup (Callable): The duplicate call, e.g. the same request against the fallback model.
+
+        Returns:
+            Any: The result of whichever attempt completed successfully first.
+
+        Raises:
+            Exception: The error of the first attempt if every attempt failed.
+        """
+        with self._lock:
+            self._requests += 1
+        delay = self.hedge_delay()
+        started = time.monotonic()
+
+        first = self._submit(primary)
+        done, _ = wait([first], timeout=delay)
+        if done or not self._take_budget():
+            result = first.result()
+            self._observe(time.monotonic() - started)
+            return result
+
+        logger.debug(f"Hedging request after {delay:.3f}s")
+        second = self._submit(backup)
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                with self._lock:
+                    if future is second:
+                        self._hedge_wins += 1
+                self._observe(time.monotonic() - started)
+                return future.result()
+        # Both attempts failed
+        raise first.exception()
+
+    def _submit(self, fn: Callable[[], Any]):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="promptpal-hedge")
+            executor = self._executor
+        # Run in a copy of the caller's context so usage tracking still applies
+        return executor.submit(contextvars.copy_context().run, fn)
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self._hedged + 1 > self._max_extra_ratio * self._requests:
+                self._budget_denied += 1
+                return False
+            self._hedged += 1
+            return True
+
+    def _observe(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def stats(self) -> dict:
+        """
+        Get hedging statistics.
+
+        Returns:
+            dict: Requests, hedged attempts issued, hedges that finished first, hedges skipped because the
+                budget was exhausted, and the current hedge delay.
+        """
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hedged": self._hedged,
+                "hedge_wins": self._hedge_wins,
+                "budget_denied": self._budget_denied,
+                "hedge_delay": delay,
+            }
+
+    def shutdown(self) -> None:
+        """Stop the worker threads without waiting for discarded attempts to finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
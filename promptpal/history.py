@@ -0,0 +1,121 @@
+from dataclasses import dataclass, field
+
+from google.genai import types
+
+from promptpal.usage import Usage
+
+
+@dataclass
+class TurnRecord:
+    """A compact record of a chat response: its text and token usage, without the SDK response object.
+
+    Attributes:
+        role_name: The role that produced the response.
+        text: The response text.
+        usage: The token usage of the call.
+    """
+
+    role_name: str
+    text: str
+    usage: Usage = field(default_factory=Usage)
+
+    @classmethod
+    def from_response(cls, role_name: str, response) -> "TurnRecord":
+        """
+        Build a record from a chat response.
+
+        Args:
+            role_name (str): The role that produced the response.
+            response: The send_message response.
+
+        Returns:
+            TurnRecord: The record.
+        """
+        usage = Usage()
+        if response.usage_metadata is not None:
+            usage.add(response.usage_metadata)
+        return cls(role_name=role_name, text=response.text, usage=usage)
+
+
+def content_size(content) -> int:
+    """
+    Estimate the memory held by a history entry.
+
+    Args:
+        content: A genai Content.
+
+    Returns:
+        int: The size of its text and inline data in bytes.
+    """
+    size = 0
+    for part in content.parts or []:
+        text = getattr(part, "text", None)
+        if isinstance(text, str):
+            size += len(text.encode("utf-8"))
+        inline_data = getattr(part, "inline_data", None)
+        data = getattr(inline_data, "data", None)
+        if isinstance(data, bytes | bytearray):
+            size += len(data)
+    return size
+
+
+def split_turns(history: list) -> list[list]:
+    """
+    Group a chat history into turns, each a user entry followed by the model entries answering it.
+
+    Args:
+        history (list): The chat history, oldest first.
+
+    Returns:
+        list[list]: The turns, oldest first.
+    """
+    turns = []
+    for content in history:
+        if content.role == "user" or not turns:
+            turns.append([content])
+        else:
+            turns[-1].append(content)
+    return turns
+
+
+def trim_history(history: list, max_turns: int | None = None, max_bytes: int | None = None) -> tuple[list, int]:
+    """
+    Drop the oldest turns of a chat history until it is within the limits. The latest turn is always kept.
+
+    Args:
+        history (list): The chat history, oldest first.
+        max_turns (int, optional): Maximum number of turns to keep. Defaults to None (no limit).
+        max_bytes (int, optional): Maximum total size of the kept entries. Defaults to None (no limit).
+
+    Returns:
+        tuple[list, int]: The trimmed history and the number of turns dropped.
+    """
+    turns = split_turns(history)
+    sizes = [sum(content_size(content) for content in turn) for turn in turns]
+    total = sum(sizes)
+
+    dropped = 0
+    while len(turns) - dropped > 1 and (
+        (max_turns is not None and len(turns) - dropped > max_turns) or (max_bytes is not None and total > max_bytes)
+    ):
+        total -= sizes[dropped]
+        dropped += 1
+
+    return [content for turn in turns[dropped:] for content in turn], dropped
+
+
+def strip_inlined_files(content, message: str, file_paths: list[str]):
+    """
+    Replace a user entry that had file contents inlined with the original message and a short note.
+
+    Args:
+        content: The user Content that was sent.
+        message (str): The message before file contents were appended.
+        file_paths (list[str]): The files whose contents were inlined.
+
+    Returns:
+        tuple: The replacement Content and the number of bytes removed.
+    """
+    note = f"{message}\n\n[Contents of {', '.join(file_paths)} were sent earlier and removed from the history.]"
+    stripped = types.Content(role=content.role, parts=[types.Part(text=note)])
+    return stripped, max(0, content_size(content) - content_size(stripped))
@@ -0,0 +1,388 @@
+import hashlib
+import logging
+import os
+import re
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from promptpal.attachments import attachment_mime_type, is_text_mime_type
+
+logger = logging.getLogger(__name__)
+
+# Ignored in every directory, in addition to .gitignore rules
+DEFAULT_IGNORE_PATTERNS = (
+    ".git/",
+    ".hg/",
+    ".svn/",
+    "__pycache__/",
+    "node_modules/",
+    ".venv/",
+    "venv/",
+    ".mypy_cache/",
+    ".pytest_cache/",
+    ".ruff_cache/",
+    "*.pyc",
+    ".DS_Store",
+)
+
+IGNORE_FILENAME = ".gitignore"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a text without calling the API.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: About one token per four characters.
+    """
+    return (len(text) + 3) // 4
+
+
+def _glob_to_regex(pattern: str) -> str:
+    regex = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex.append("(?:/.*)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            regex.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            regex.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1 :]:
+            end = pattern.index("]", i + 1)
+            regex.append("[" + pattern[i + 1 : end].replace("!", "^", 1) + "]")
+            i = end + 1
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(regex)
+
+
+@dataclass(frozen=True)
+class _IgnoreRule:
+    base: Path
+    regex: re.Pattern
+    negate: bool
+    dir_only: bool
+
+
+class IgnoreRules:
+    """
+    .gitignore-style ignore rules.
+
+    Supports comments, negation with "!", directory-only patterns ending in "/", patterns anchored to
+    their directory by a leading or inner "/", and the "*", "?", "[...]" and "**" wildcards. Rules from
+    a .gitignore file apply to its directory and everything below it, and later rules take precedence.
+    """
+
+    def __init__(self, rules: tuple[_IgnoreRule, ...] = ()):
+        self._rules = rules
+
+    def extend(self, base: str | Path, patterns: Iterable[str]) -> "IgnoreRules":
+        """
+        Create rules with additional patterns.
+
+        Args:
+            base (str | Path): The directory the patterns are relative to.
+            patterns (Iterable[str]): Lines in .gitignore syntax.
+
+        Returns:
+            IgnoreRules: The combined rules. These rules are unchanged.
+        """
+        rules = list(self._rules)
+        for line in patterns:
+            pattern = line.rstrip("\n").rstrip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negate = pattern.startswith("!")
+            pattern = pattern[1:] if negate else pattern
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            if not pattern:
+                continue
+            if "/" in pattern:
+                regex = _glob_to_regex(pattern.lstrip("/"))
+            else:
+                regex = "(?:.*/)?" + _glob_to_regex(pattern)
+            rules.append(_IgnoreRule(Path(base), re.compile(regex + "$"), negate, dir_only))
+        return IgnoreRules(tuple(rules))
+
+    def with_directory(self, directory: Path) -> "IgnoreRules":
+        """
+        Add the rules of a directory's .gitignore file, if it has one.
+
+        Args:
+            directory (Path): The directory.
+
+        Returns:
+            IgnoreRules: The rules that apply inside the directory.
+        """
+        ignore_file = directory / IGNORE_FILENAME
+        try:
+            with open(ignore_file, encoding="utf-8", errors="replace") as handle:
+                return self.extend(directory, handle.readlines())
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return self
+
+    def ignored(self, path: Path, is_dir: bool) -> bool:
+        """
+        Check whether a path is ignored.
+
+        Args:
+            path (Path): The path.
+            is_dir (bool): Whether the path is a directory.
+
+        Returns:
+            bool: Whether the last matching rule ignores the path.
+        """
+        ignored = False
+        for rule in self._rules:
+            if rule.dir_only and not is_dir:
+                continue
+            try:
+                relative = path.relative_to(rule.base).as_posix()
+            except ValueError:
+                continue
+            if rule.regex.match(relative):
+                ignored = not rule.negate
+        return ignored
+
+
+@dataclass
+class IngestedFile:
+    """A file included from a directory.
+
+    Attributes:
+        path: The file path.
+        size: The size in bytes.
+        sha256: The hex SHA-256 digest of the content.
+        tokens: The estimated number of tokens in the content.
+    """
+
+    path: Path
+    size: int
+    sha256: str
+    tokens: int
+
+
+@dataclass
+class DirectoryManifest:
+    """What was included from a directory and why anything else was left out.
+
+    Attributes:
+        root: The directory.
+        files: The included files, in walk order.
+        duplicates: Files skipped because an included file has the same content, mapped to that file.
+        skipped: Number of files skipped per reason ("ignored", "extension", "size", "binary", "unreadable").
+        truncated: Whether the token budget ran out before the walk finished.
+    """
+
+    root: Path
+    files: list[IngestedFile] = field(default_factory=list)
+    duplicates: dict[Path, Path] = field(default_factory=dict)
+    skipped: Counter = field(default_factory=Counter)
+    truncated: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        """Estimated tokens of all included files."""
+        return sum(file.tokens for file in self.files)
+
+    def summary(self) -> str:
+        """
+        Describe the manifest compactly, for inclusion in a prompt.
+
+        Returns:
+            str: One line with the totals, then one line per included file.
+        """
+        notes = [f"{len(self.files)} files", f"~{self.total_tokens} tokens"]
+        if self.duplicates:
+            notes.append(f"{len(self.duplicates)} duplicates skipped")
+        notes.extend(f"{count} {reason} skipped" for reason, count in sorted(self.skipped.items()))
+        if self.truncated:
+            notes.append("truncated at token budget")
+        lines = [f"Directory {self.root}: {', '.join(notes)}"]
+        lines.extend(f"- {file.path.relative_to(self.root).as_posix()} ({file.size} B)" for file in self.files)
+        return "\n".join(lines)
+
+
+def _scan_directory(directory: Path, rules: IgnoreRules) -> tuple[list[Path], list[tuple[Path, IgnoreRules]], int]:
+    """List a directory's files and subdirectories that are not ignored."""
+    rules = rules.with_directory(directory)
+    files, subdirectories, ignored = [], [], 0
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except OSError as e:
+        logger.warning(f"Cannot read directory {directory}: {e!s}")
+        return files, subdirectories, ignored
+
+    for entry in entries:
+        path = Path(entry.path)
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if rules.ignored(path, is_dir):
+            ignored += 1
+        elif is_dir:
+            subdirectories.append((path, rules))
+        elif entry.is_file():
+            files.append(path)
+    return files, subdirectories, ignored
+
+
+def walk_directory(
+    root: str | Path,
+    ignore_patterns: Iterable[str] = DEFAULT_IGNORE_PATTERNS,
+    max_workers: int = 8,
+    manifest: DirectoryManifest | None = None,
+) -> Iterator[Path]:
+    """
+    Walk a directory tree level by level, scanning the directories of each level concurrently.
+
+    Files are yielded in a deterministic order: by depth, then by path. Directories and files matching
+    the ignore patterns or a .gitignore file are skipped, and ignored directories are not descended into.
+    Stopping the iteration early stops the walk.
+
+    Args:
+        root (str | Path): The directory to walk.
+        ignore_patterns (Iterable[str]): Patterns ignored everywhere. Defaults to DEFAULT_IGNORE_PATTERNS.
+        max_workers (int): Maximum number of directories scanned at once. Defaults to 8.
+        manifest (DirectoryManifest, optional): Counts ignored entries in its "ignored" reason.
+
+    Yields:
+        Path: The files that are not ignored.
+    """
+    root = Path(root)
+    level = [(root, IgnoreRules().extend(root, ignore_patterns))]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="promptpal-walk") as executor:
+        while level:
+            next_level = []
+            for files, subdirectories, ignored in executor.map(lambda item: _scan_directory(*item), level):
+                if manifest is not None and ignored:
+                    manifest.skipped["ignored"] += ignored
+                yield from files
+                next_level.extend(subdirectories)
+            level = next_level
+
+
+def _read_text(path: Path) -> tuple[str | None, str]:
+    """Read a text file, returning its content and SHA-256 digest, or None and the reason it was skipped."""
+    try:
+        if not is_text_mime_type(attachment_mime_type(path)):
+            return None, "binary"
+        data = path.read_bytes()
+        return data.decode("utf-8", errors="replace"), hashlib.sha256(data).hexdigest()
+    except OSError:
+        return None, "unreadable"
+
+
+def ingest_directory(
+    root: str | Path,
+    max_tokens: int = 100_000,
+    max_file_bytes: int = 1024 * 1024,
+    extensions: Iterable[str] | None = None,
+    exclude_extensions: Iterable[str] = (),
+    ignore_patterns: Iterable[str] = DEFAULT_IGNORE_PATTERNS,
+    max_workers: int = 8,
+) -> tuple[list[tuple[IngestedFile, str]], DirectoryManifest]:
+    """
+    Collect the text files of a directory tree until a token budget is reached.
+
+    The walk, filters, reads and deduplication form a lazy pipeline, so files beyond the token budget
+    are never read and directories beyond it are never scanned.
+
+    Args:
+        root (str | Path): The directory.
+        max_tokens (int): Stop once the included files reach this many estimated tokens. Defaults to 100,000.
+        max_file_bytes (int): Skip files larger than this. Defaults to 1 MiB.
+        extensions (Iterable[str], optional): Only include files with these extensions, e.g. [".py", ".md"].
+            Defaults to None (all extensions).
+        exclude_extensions (Iterable[str]): Skip files with these extensions. Defaults to ().
+        ignore_patterns (Iterable[str]): Patterns ignored everywhere. Defaults to DEFAULT_IGNORE_PATTERNS.
+        max_workers (int): Maximum number of files read, or directories scanned, at once. Defaults to 8.
+
+    Returns:
+        tuple[list[tuple[IngestedFile, str]], DirectoryManifest]: The included files with their content, and
+            the manifest of what was included and skipped.
+    """
+    root = Path(root)
+    extensions = {ext.lower() for ext in extensions} if extensions is not None else None
+    exclude_extensions = {ext.lower() for ext in exclude_extensions}
+    manifest = DirectoryManifest(root=root)
+
+    def candidates() -> Iterator[tuple[Path, int]]:
+        for path in walk_directory(root, ignore_patterns, max_workers, manifest):
+            suffix = path.suffix.lower()
+            if (extensions is not None and suffix not in extensions) or suffix in exclude_extensions:
+                manifest.skipped["extension"] += 1
+                continue
+            try:
+                size = path.stat().st_size
+            except OSError:
+                manifest.skipped["unreadable"] += 1
+                continue
+            if size > max_file_bytes:
+                manifest.skipped["size"] += 1
+                continue
+            yield path, size
+
+    included = []
+    seen = {}
+    tokens = 0
+    pending = candidates()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="promptpal-ingest") as executor:
+        while True:
+            # Read files in small concurrent batches, so little is read past the budget
+            batch = [item for _, item in zip(range(max_workers), pending, strict=False)]
+            if not batch:
+                break
+            for (path, size), (text, digest) in zip(
+                batch, executor.map(lambda item: _read_text(item[0]), batch), strict=True
+            ):
+                if text is None:
+                    manifest.skipped[digest] += 1  # The digest is the reason the file was skipped
+                elif digest in seen:
+                    manifest.duplicates[path] = seen[digest]
+                else:
+                    file_tokens = estimate_tokens(text)
+                    if tokens + file_tokens > max_tokens:
+                        manifest.truncated = True
+                        pending.close()
+                        return included, manifest
+                    seen[digest] = path
+                    tokens += file_tokens
+                    ingested = IngestedFile(path=path, size=size, sha256=digest, tokens=file_tokens)
+                    included.append((ingested, text))
+                    manifest.files.append(ingested)
+
+    return included, manifest
+
+
+def format_directory(files: list[tuple[IngestedFile, str]], manifest: DirectoryManifest) -> str:
+    """
+    Render ingested files as text to include in a message.
+
+    Args:
+        files (list[tuple[IngestedFile, str]]): The files and their content, from ingest_directory().
+        manifest (DirectoryManifest): The manifest, from ingest_directory().
+
+    Returns:
+        str: The manifest summary followed by the content of each file.
+    """
+    sections = [f"\n\n{manifest.summary()}\n"]
+    for file, text in files:
+        sections.append(f"\nContents of {file.path.as_posix()}:\n```\n{text}\n```\n")
+    return "".join(sections)
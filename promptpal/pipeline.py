@@ -0,0 +1,230 @@
+import contextvars
+import logging
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from promptpal.coalesce import request_key
+from promptpal.usage import Usage, track_usage
+
+if TYPE_CHECKING:
+    from promptpal.promptpal import Promptpal
+
+logger = logging.getLogger(__name__)
+
+# Placeholders such as {developer} in step prompts refer to pipeline inputs or to earlier steps' outputs
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+@dataclass
+class Step:
+    """A pipeline step that sends a prompt to a role.
+
+    Attributes:
+        name: The step name. Other steps refer to its output as {name}.
+        role: The role to send the prompt to.
+        prompt: The prompt template. {name} placeholders are filled with pipeline inputs and the outputs of
+            other steps; placeholders naming other steps make this step depend on them.
+        depends_on: Additional steps that must finish first, even if their output is not used.
+    """
+
+    name: str
+    role: str
+    prompt: str
+    depends_on: list[str] = field(default_factory=list)
+
+    def dependencies(self, step_names: set[str]) -> set[str]:
+        """The steps this step depends on, explicitly or through its prompt placeholders."""
+        return set(self.depends_on) | (set(_PLACEHOLDER.findall(self.prompt)) & step_names)
+
+
+@dataclass
+class StepResult:
+    """The outcome of a pipeline step.
+
+    Attributes:
+        name: The step name.
+        output: The role's response.
+        latency: Seconds the step took.
+        usage: Tokens used by the step. Zero for cached steps.
+        cached: Whether the output was reused from an earlier run.
+    """
+
+    name: str
+    output: str
+    latency: float
+    usage: Usage = field(default_factory=Usage)
+    cached: bool = False
+
+
+def render_prompt(template: str, values: dict[str, str]) -> str:
+    """
+    Fill {name} placeholders in a prompt template. Unknown placeholders and other braces are left as is.
+
+    Args:
+        template (str): The prompt template.
+        values (dict[str, str]): Values by placeholder name.
+
+    Returns:
+        str: The rendered prompt.
+    """
+    return _PLACEHOLDER.sub(lambda match: values.get(match.group(1), match.group(0)), template)
+
+
+class Pipeline:
+    """
+    A DAG of role steps that runs independent branches concurrently.
+
+    Step outputs are memoized by a hash of the role and the rendered prompt, so running the pipeline
+    again only re-runs steps whose input changed, plus the steps downstream of them whose input changes
+    as a result.
+
+    Example:
+        pipeline = Pipeline()
+        pipeline.add_step("code", "developer", "Write a function that {task}")
+        pipeline.add_step("tests", "unit_tester", "Write unit tests for:\\n{code}")
+        pipeline.add_step("docs", "editor", "Document this code:\\n{code}")
+        results = promptpal.run_pipeline(pipeline, {"task": "parses FASTA files"})
+    """
+
+    def __init__(self, steps: list[Step] | None = None, max_workers: int = 4):
+        """
+        Initialize the pipeline.
+
+        Args:
+            steps (list[Step], optional): The steps of the pipeline. Defaults to None.
+            max_workers (int): Maximum number of steps running at once. Defaults to 4.
+        """
+        self._steps = {}
+        self._max_workers = max_workers
+        self._memo = {}
+        self._memo_lock = threading.Lock()
+        for step in steps or []:
+            self._add(step)
+
+    def add_step(self, name: str, role: str, prompt: str, depends_on: list[str] | None = None) -> "Pipeline":
+        """
+        Add a step to the pipeline.
+
+        Args:
+            name (str): The step name.
+            role (str): The role to send the prompt to.
+            prompt (str): The prompt template.
+            depends_on (list[str], optional): Additional steps that must finish first. Defaults to None.
+
+        Returns:
+            Pipeline: The pipeline, so calls can be chained.
+        """
+        self._add(Step(name=name, role=role, prompt=prompt, depends_on=list(depends_on or [])))
+        return self
+
+    def _add(self, step: Step) -> None:
+        if step.name in self._steps:
+            raise ValueError(f"Step '{step.name}' is already in the pipeline.")
+        self._steps[step.name] = step
+
+    def order(self) -> list[str]:
+        """
+        Get the steps in an order that respects their dependencies.
+
+        Returns:
+            list[str]: Step names in topological order.
+
+        Raises:
+            ValueError: If a step depends on an unknown step or the dependencies form a cycle.
+        """
+        names = set(self._steps)
+        dependencies = {name: step.dependencies(names) for name, step in self._steps.items()}
+        for name, deps in dependencies.items():
+            unknown = set(deps) - names
+            if unknown:
+                raise ValueError(f"Step '{name}' depends on unknown steps: {', '.join(sorted(unknown))}.")
+
+        ordered = []
+        remaining = dict(dependencies)
+        while remaining:
+            ready = sorted(name for name, deps in remaining.items() if not deps - set(ordered))
+            if not ready:
+                raise ValueError(f"Pipeline steps form a cycle: {', '.join(sorted(remaining))}.")
+            ordered.extend(ready)
+            for name in ready:
+                del remaining[name]
+        return ordered
+
+    def run(self, promptpal: "Promptpal", inputs: dict[str, str] | None = None) -> dict[str, StepResult]:
+        """
+        Run the pipeline, starting each step as soon as the steps it depends on have finished.
+
+        Steps are sent with Promptpal.message(), so they do not share or change any chat history.
+
+        Args:
+            promptpal (Promptpal): The instance to send the steps with.
+            inputs (dict[str, str], optional): Values for placeholders that are not step names. Defaults to None.
+
+        Returns:
+            dict[str, StepResult]: The result of every step, in topological order.
+
+        Raises:
+            ValueError: If the pipeline is invalid or a step uses an unknown role.
+            Exception: The error of the first step that failed. Steps that have not started are skipped.
+        """
+        order = self.order()
+        names = set(order)
+        dependencies = {name: self._steps[name].dependencies(names) for name in order}
+        values = dict(inputs or {})
+        results = {}
+
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="promptpal-pipeline") as executor:
+            running = {}
+            error = None
+            while len(results) < len(order) and error is None:
+                for name in order:
+                    if name not in results and name not in running.values() and dependencies[name] <= set(results):
+                        prompt = render_prompt(self._steps[name].prompt, values)
+                        # Steps keep the caller's request priority and usage trackers
+                        future = executor.submit(
+                            contextvars.copy_context().run, self._run_step, promptpal, self._steps[name], prompt
+                        )
+                        running[future] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+                    results[name] = future.result()
+                    values[name] = results[name].output
+            if error is not None:
+                for future in running:
+                    future.cancel()
+                raise error
+
+        return {name: results[name] for name in order}
+
+    def _run_step(self, promptpal: "Promptpal", step: Step, prompt: str) -> StepResult:
+        role = promptpal._roles.get(step.role)
+        if role is None:
+            raise ValueError(f"Role '{step.role}' not found.")
+
+        key = request_key(role.name, role.model, role.system_instruction, role.temperature, prompt)
+        started = time.perf_counter()
+        with self._memo_lock:
+            output = self._memo.get(key)
+        if output is not None:
+            return StepResult(step.name, output, time.perf_counter() - started, cached=True)
+
+        with track_usage() as usage:
+            output = promptpal.message(step.role, prompt)
+        latency = time.perf_counter() - started
+        logger.debug(f"Pipeline step '{step.name}' finished in {latency:.2f}s")
+        with self._memo_lock:
+            self._memo[key] = output
+        return StepResult(step.name, output, latency, usage)
+
+    def clear_cache(self) -> None:
+        """Forget memoized step outputs so the next run re-runs every step."""
+        with self._memo_lock:
+            self._memo.clear()
@@ -1,8 +1,16 @@
-import hashlib
+import contextvars
+import copy
+import dataclasses
+import functools
+import json
 import logging
 import os
 import re
+import threading
 from collections import defaultdict
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from enum import Enum
 from importlib import resources
 from pathlib import Path
@@ -10,8 +18,39 @@ from pathlib import Path
 import yaml
 from google import genai
 
+from promptpal.artifacts import Artifact, ArtifactStore, artifact_filename
+from promptpal.attachments import (
+    DEFAULT_INLINE_THRESHOLD,
+    MAX_INLINE_BYTES,
+    attachment_mime_type,
+    inline_part,
+    is_text_mime_type,
+)
+from promptpal.batch import BatchProgress, append_record, load_checkpoint, normalize_prompt, prompt_key
+from promptpal.coalesce import SingleFlight, request_key
+from promptpal.condense import condense
+from promptpal.deadline import CallCancelledError, Deadline, PromptpalTimeoutError
+from promptpal.ensemble import Ensemble, EnsembleResult
+from promptpal.file_versions import SentFileVersions
+from promptpal.hedging import HedgingPolicy
+from promptpal.history import TurnRecord, content_size, split_turns, strip_inlined_files, trim_history
+from promptpal.ingest import estimate_tokens, format_directory, ingest_directory
+from promptpal.pipeline import Pipeline, StepResult
+from promptpal.retrieval import RETRIEVAL_MIN_BYTES, RetrievalIndex, format_chunks
 from promptpal.roles import Role
 from promptpal.roles.role_schema import validate_role
+from promptpal.routing import RoutingPolicy, timed_request
+from promptpal.scheduler import Priority, RequestScheduler, current_priority, request_priority
+from promptpal.semantic_cache import GeminiEmbedder, SemanticCache
+from promptpal.sessions import append_session_records, read_session
+from promptpal.speculative import SpeculationStats, prompt_similarity
+from promptpal.structured import (
+    REFINED_PROMPT_SCHEMA,
+    IncrementalJSONParser,
+    StructuredOutputError,
+    parse_json_response,
+)
+from promptpal.usage import record_usage, track_usage
 
 
 class PromptRefinementType(Enum):
@@ -25,6 +64,9 @@ class PromptRefinementType(Enum):
     KEYWORD = "keyword"
 
 
+# Model used for chat sessions
+DEFAULT_CHAT_MODEL = "gemini-2.0-flash-001"
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -61,6 +103,68 @@ def find_existing_files(message: str) -> list[str]:
     return file_paths
 
 
+def find_existing_directories(message: str, allowed_roots: list[str | Path] | None = None) -> list[str]:
+    """
+    Detect directory paths within a message.
+
+    Only words containing a "/" are considered, e.g. "src/" or "./data", so that ordinary words which
+    happen to name a directory are not mistaken for references. Only directories within the working
+    directory or one of the allowed roots count, and never a filesystem root or the home directory, so
+    that a stray "/" (as in "A / B") cannot pull in the whole filesystem.
+
+    Args:
+        message: The message to search for directory references.
+        allowed_roots: Directories outside the working directory whose subdirectories may be referenced.
+            Defaults to None.
+
+    Returns:
+        A list of directory paths found in the message.
+    """
+    roots = [Path.cwd().resolve(), *(Path(root).expanduser().resolve() for root in allowed_roots or ())]
+    home = Path.home().resolve()
+    directories = []
+    for word in message.split():
+        word = word.rstrip(".,;:!?")
+        if "/" not in word or word in directories:
+            continue
+        try:
+            path = Path(word)
+            if not path.is_dir():
+                continue
+            resolved = path.resolve()
+        except (OSError, ValueError, RuntimeError):
+            continue
+
+        if resolved == Path(resolved.anchor) or resolved == home:
+            logger.warning(f"Not reading directory {word}: it is a filesystem root or the home directory.")
+        elif not any(resolved.is_relative_to(root) for root in roots):
+            logger.warning(f"Not reading directory {word}: it is outside the working directory.")
+        else:
+            directories.append(word)
+
+    return directories
+
+
+def _per_thread(method):
+    """Run a chat-state method on the calling thread's own session when the instance is thread-safe."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._thread_sessions is not None:
+            return method(self._thread_session(), *args, **kwargs)
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+@dataclass
+class _StreamedResponse:
+    """The assembled result of a streamed model response."""
+
+    text: str
+    usage_metadata: object = None
+
+
 class Promptpal:
     """
     A class for managing and interacting with AI roles and agents.
@@ -73,6 +177,22 @@ class Promptpal:
         vertexai: bool = True,
         project: str = "",
         location: str = "",
+        quiet_mode: str = "local",
+        coalesce_requests: bool = False,
+        semantic_cache: SemanticCache | None = None,
+        hedging: HedgingPolicy | None = None,
+        max_history_turns: int | None = None,
+        max_history_bytes: int | None = None,
+        evict_attachments: bool = False,
+        thread_safe: bool = False,
+        inline_attachment_bytes: int = DEFAULT_INLINE_THRESHOLD,
+        directory_token_budget: int = 100_000,
+        directory_roots: list[str] | None = None,
+        retrieval_top_k: int | None = None,
+        keep_retrieval_index: bool = False,
+        diff_file_resends: bool = True,
+        routing: RoutingPolicy | None = None,
+        scheduler: RequestScheduler | None = None,
     ):
         """
         Initialize the Promptpal instance.
@@ -85,7 +205,55 @@ class Promptpal:
                 GEMINI_API_KEY to be set. If set to true, expects a project and location to be set.
             project: The project to use for Vertex AI. Defaults to "".
             location: The location to use for Vertex AI. Defaults to "".
+            quiet_mode: How responses from roles with quiet=True are condensed. "local" uses a fast
+                extractive condenser with no extra API calls; "llm" asks the summarizer role for a summary.
+                Defaults to "local".
+            coalesce_requests: Whether concurrent identical message() requests (same role, model, config
+                and contents) share a single in-flight API call. Streaming requests are never coalesced.
+                Defaults to False.
+            semantic_cache: A cache that answers message() requests whose prompt is similar to an earlier
+                prompt for the same role with the earlier response. Only plain text requests (no response
+                schema or streaming) are cached. Uses the text-embedding-004 model on this client if the
+                cache has no embedder. Defaults to None.
+            hedging: A policy that sends a duplicate of a slow message() request, optionally to a fallback
+                model, and uses whichever response arrives first. Streaming requests are never hedged.
+                Defaults to None.
+            max_history_turns: Maximum number of turns kept in the chat history. The oldest turns are
+                dropped first. Defaults to None (no limit).
+            max_history_bytes: Maximum size of the text and inline data kept in the chat history.
+                Defaults to None (no limit).
+            evict_attachments: Whether file contents inlined into a chat message (on Vertex AI) are removed
+                from the chat history once the message has been sent. Defaults to False.
+            thread_safe: Whether the instance may be shared by many threads. Each thread then gets its own
+                chat history, while chat statistics are accumulated across all threads. Defaults to False.
+            inline_attachment_bytes: Files referenced in a chat message up to this size are sent inline with
+                the message; larger files are uploaded with the Files API. On Vertex AI, which has no Files
+                API, text files are always included in the message and other files are sent inline.
+                Defaults to 1 MiB.
+            directory_token_budget: Maximum estimated tokens of file contents included from the directories
+                referenced in a chat message, e.g. "src/". Directories are walked honoring .gitignore files,
+                binary and duplicate files are skipped, and a manifest of the included files is sent along.
+                Defaults to 100,000.
+            directory_roots: Directories outside the working directory whose subdirectories may be read when
+                referenced in a chat message. Directories elsewhere, the filesystem root and the home directory
+                are never read. Defaults to None (only the working directory).
+            retrieval_top_k: Enables retrieval mode: text files of 8 KiB or more referenced in a chat message
+                are split into chunks and indexed locally with BM25, and only this many chunks most
+                relevant to the message are sent instead of the whole files. Defaults to None (send whole files).
+            keep_retrieval_index: Whether files indexed in earlier turns of the chat stay searchable, so
+                later messages get relevant chunks without referencing the files again. Defaults to False.
+            diff_file_resends: Whether a text file referenced again in the same chat is sent as a unified diff
+                against the version sent earlier, or as a short note if it is unchanged, instead of in full.
+                Versions are forgotten when their turn is trimmed or evicted from the history. Defaults to True.
+            routing: A policy that picks the model for each message() request by prompt size, latency
+                target, cost and observed latency, and falls back to a faster model when one is overloaded.
+                Requests that pass a model explicitly are not routed. Defaults to None.
+            scheduler: A scheduler that limits concurrent model calls and shares them between priority
+                classes. chat() calls are INTERACTIVE, message() calls NORMAL and refine_prompts() calls
+                BATCH, unless set otherwise with request_priority(). Defaults to None.
         """
+        if quiet_mode not in ("local", "llm"):
+            raise ValueError(f"Unknown quiet mode '{quiet_mode}'. Expected 'local' or 'llm'.")
 
         if not vertexai:
             # Check if the GEMINI_API_KEY environment variable is set
@@ -103,20 +271,33 @@ class Promptpal:
                 http_options={"api_version": "v1"},
             )
 
-        # Create a chat instance
-        self._chat = self._client.chats.create(model="gemini-2.0-flash-001")
-
+        self._chat_model = DEFAULT_CHAT_MODEL
         self._roles = {}  # Store roles by name
-        self._last_response = None  # Store the last response
         self._output_dir = output_dir  # Directory for writing code and image files
 
         self._vertexai = vertexai
-
-        # Initialize trackers for chat statistics
-        self._token_count = 0
-        self._message_count = 0
-        self._files_written = {"code": 0, "images": 0}
-        self._role_message_count = {}
+        self._quiet_mode = quiet_mode
+        self._single_flight = SingleFlight() if coalesce_requests else None
+        self._semantic_cache = semantic_cache
+        self._hedging = hedging
+        self._max_history_turns = max_history_turns
+        self._max_history_bytes = max_history_bytes
+        self._evict_attachments = evict_attachments
+        self._thread_sessions = threading.local() if thread_safe else None
+        self._inline_attachment_bytes = inline_attachment_bytes
+        self._directory_token_budget = directory_token_budget
+        self._directory_roots = list(directory_roots or [])
+        self._retrieval_top_k = retrieval_top_k
+        self._keep_retrieval_index = keep_retrieval_index
+        self._diff_file_resends = diff_file_resends
+        self._routing = routing
+        self._scheduler = scheduler
+        self._speculation = SpeculationStats()
+        if semantic_cache is not None and semantic_cache.embedder is None:
+            semantic_cache.embedder = GeminiEmbedder(self._client)
+
+        # Create a chat instance and its statistics
+        self._init_chat_state()
 
         # Load default roles if specified
         if load_default_roles:
@@ -131,6 +312,89 @@ class Promptpal:
             self._output_dir = "./generated_files"
         Path(self._output_dir).mkdir(parents=True, exist_ok=True)
 
+        # Content-addressed store for generated files
+        self._artifacts = ArtifactStore(self._output_dir)
+
+    def _init_chat_state(self) -> None:
+        """Create a fresh chat instance and reset everything tracked per chat session."""
+        self._chat = self._client.chats.create(model=self._chat_model)
+        self._chat_generation = 0  # Incremented whenever the chat history is replaced
+        self._last_response = None  # TurnRecord of the last response
+        self._history_evictions = {"turns": 0, "attachment_bytes": 0}
+        self._retrieval_index = RetrievalIndex()  # Chunks of files referenced in retrieval mode
+        self._sent_files = SentFileVersions()  # Text file versions already sent in this chat
+
+        # Initialize trackers for chat statistics. Sessions created for worker threads of a thread-safe
+        # instance also add their counts to the instance's statistics.
+        self._stats_lock = threading.Lock()
+        self._stats_parent = None
+        self._token_count = 0
+        self._message_count = 0
+        self._files_written = {"code": 0, "images": 0}
+        self._role_message_count = {}
+        self._last_role_name = None
+
+        # Path, chat generation and number of turns of the last save_session() call
+        self._session_checkpoint = (None, None, 0)
+
+        # Background post-processing for chat(background=True)
+        self._postprocess_executor = None
+        self._pending_summary = None
+        self._pending_artifacts = None
+
+    def session(self) -> "Promptpal":
+        """
+        Create an independent chat session that shares this instance's client, roles and caches.
+
+        The returned Promptpal has its own chat history and statistics, so many sessions can be held
+        at once (e.g. one per user of a server) without creating a client or loading roles for each.
+        Roles added to either instance are visible to both.
+
+        Returns:
+            Promptpal: A new session.
+        """
+        session = copy.copy(self)
+        session._thread_sessions = None
+        session._init_chat_state()
+        return session
+
+    def _thread_session(self) -> "Promptpal":
+        """Get the calling thread's session of a thread-safe instance, creating it on first use."""
+        session = getattr(self._thread_sessions, "session", None)
+        if session is None:
+            session = self.session()
+            session._stats_parent = self
+            self._thread_sessions.session = session
+        return session
+
+    def _record_chat_message(self, role_name: str, tokens: int) -> int:
+        """
+        Count a chat message in the statistics.
+
+        Args:
+            role_name (str): The role the message was sent to.
+            tokens (int): The tokens used by the message.
+
+        Returns:
+            int: The number of the message within this chat session.
+        """
+        with self._stats_lock:
+            self._token_count += tokens
+            self._message_count += 1
+            self._role_message_count[role_name] = self._role_message_count.get(role_name, 0) + 1
+            self._last_role_name = role_name
+            message_number = self._message_count
+        if self._stats_parent is not None:
+            self._stats_parent._record_chat_message(role_name, tokens)
+        return message_number
+
+    def _record_file_written(self, kind: str) -> None:
+        """Count a file written in the statistics."""
+        with self._stats_lock:
+            self._files_written[kind] += 1
+        if self._stats_parent is not None:
+            self._stats_parent._record_file_written(kind)
+
     def list_roles(self) -> None:
         """
         List the available roles with their descriptions in a formatted output.
@@ -196,12 +460,14 @@ class Promptpal:
                 top_k=role_info.get("top_k"),
                 max_output_tokens=role_info.get("max_output_tokens"),
                 seed=role_info.get("seed"),
+                quiet=role_info.get("quiet", False),
             )
             roles.append(role)
 
         # Add roles to internal storage
         self.add_roles(roles)
 
+    @_per_thread
     def chat(
         self,
         role_name: str,
@@ -209,6 +475,9 @@ class Promptpal:
         write_output: bool = True,
         write_code: bool = True,
         token_threshold: int = 10000,
+        background: bool = False,
+        on_chunk: Callable[[str], None] | None = None,
+        deadline: Deadline | float | None = None,
     ) -> str:
         """
         Send a chat message to the given role and get a response.
@@ -216,20 +485,37 @@ class Promptpal:
         Args:
             role_name (str): The name of the role to use for the chat.
             message (str): The user's message to send.
+            write_output (bool): If True, print the response.
             write_code (bool): If True, write any code from the response to a file.
             token_threshold (int): The threshold for prompt_token_count.
+            background (bool): If True, return the response text as soon as it is available and run
+                summarization, code extraction, file writes and printing on a background thread.
+                Use wait_for_artifacts() or pending_artifacts to collect the written files. Defaults to False.
+            on_chunk (Callable, optional): Streams the response and calls this with each chunk of text
+                as it arrives. Defaults to None.
+            deadline (Deadline | float, optional): A timeout in seconds, or a Deadline that can also be
+                cancelled from another thread. Covers file uploads, the model call and post-processing done
+                before returning. If it passes during a model call, the chat history is left as it was
+                before that call. Defaults to None.
 
         Returns:
             str: The response from the LLM.
 
         Raises:
             ValueError: If the role is not found.
+            PromptpalTimeoutError: If the deadline passes.
+            CallCancelledError: If the deadline is cancelled.
         """
+        deadline = Deadline.coerce(deadline)
+
         # Find the role
         role = self._roles.get(role_name)
         if role is None:
             raise ValueError(f"Role '{role_name}' not found.")
 
+        # Make sure a background summarization of the previous turn has finished with the chat history
+        self._wait_for_pending_summary()
+
         # Check if the role should use web search
         tools = None
         if role.search_web:
@@ -274,15 +560,45 @@ class Promptpal:
         # Parse the message and look for references to files. If found, upload them to the client.
         # vertexai doesn't support file uploads, so we skip this step if vertexai is True
         file_references = find_existing_files(message)
+        inlined_files = []
+        if deadline is not None:
+            deadline.check("file scanning")
+
+        # In retrieval mode, large text files are indexed and only their relevant chunks are sent
+        retrieved_files = []
+        if self._retrieval_top_k is not None:
+            retrieved_files = [path for path in file_references if self._use_retrieval(path)]
+            file_references = [path for path in file_references if path not in retrieved_files]
+
+        # Text files sent earlier in this chat are sent as a diff, or noted as unchanged
+        resends = {}
+        sent_versions = {}  # Recorded once the message has been sent
+        if self._diff_file_resends:
+            for file_path in file_references:
+                text = self._read_text_file(file_path)
+                if text is None:
+                    continue
+                sent_versions[file_path] = text
+                resend = self._sent_files.resend(file_path, text)
+                if resend is not None:
+                    resends[file_path] = resend
+            file_references = [path for path in file_references if path not in resends]
 
         if file_references:
             if not self._vertexai:
-                # For non-vertexai, upload files to the client
-                uploaded_files = {}
+                # For non-vertexai, send small files inline and upload larger ones to the client
+                attachments = {}
                 for file_path in file_references:
                     try:
-                        uploaded_file = self._client.files.upload(file=file_path)
-                        uploaded_files[file_path] = uploaded_file
+                        if Path(file_path).stat().st_size <= self._inline_attachment_bytes:
+                            attachments[file_path] = inline_part(file_path)
+                            inlined_files.append(file_path)
+                        elif deadline is None:
+                            attachments[file_path] = self._client.files.upload(file=file_path)
+                        else:
+                            attachments[file_path] = deadline.run(
+                                lambda file_path=file_path: self._client.files.upload(file=file_path), "file upload"
+                            )
                     except FileNotFoundError:
                         logger.warning(f"File path detected in prompt but not found: {file_path}")
                         continue
@@ -291,18 +607,29 @@ class Promptpal:
                 message_parts = message.split()
                 contents = []
                 for part in message_parts:
-                    if part in uploaded_files:
-                        contents.append(uploaded_files[part])
+                    if part in attachments:
+                        contents.append(attachments[part])
                     else:
                         contents.append(part)
             else:
-                # For vertexai, we can't upload files directly, so we'll read the file contents
-                # and include them in the message
+                # For vertexai, we can't upload files directly, so we'll include text file contents in the
+                # message and send other files as inline data
                 file_contents = {}
+                binary_parts = {}
                 for file_path in file_references:
+                    if deadline is not None:
+                        deadline.check("file reading")
                     try:
-                        with open(file_path) as f:
-                            file_contents[file_path] = f.read()
+                        mime_type = attachment_mime_type(file_path)
+                        if file_path in sent_versions:
+                            file_contents[file_path] = sent_versions[file_path]
+                        elif is_text_mime_type(mime_type):
+                            with open(file_path) as f:
+                                file_contents[file_path] = f.read()
+                        elif Path(file_path).stat().st_size <= MAX_INLINE_BYTES:
+                            binary_parts[file_path] = inline_part(file_path, mime_type)
+                        else:
+                            logger.warning(f"File {file_path} is too large to send inline with Vertex AI. Skipping.")
                     except FileNotFoundError:
                         logger.warning(f"File path detected in prompt but not found: {file_path}")
                         continue
@@ -311,69 +638,369 @@ class Promptpal:
                         continue
 
                 # If we have file contents, modify the message to include them
-                if file_contents:
+                if file_contents or binary_parts:
+                    inlined_files = [*file_contents, *binary_parts]
                     modified_message = message
                     for file_path, content in file_contents.items():
                         file_info = f"\n\nContents of {file_path}:\n```\n{content}\n```\n"
                         modified_message += file_info
-                    contents = modified_message
+                    contents = [modified_message, *binary_parts.values()] if binary_parts else modified_message
                 else:
                     contents = message
         else:
             contents = message
 
+        # Include the text files of referenced directories, up to the token budget
+        directory_references = find_existing_directories(message, self._directory_roots)
+        if directory_references:
+            directory_text = self._read_directories(directory_references, deadline)
+            contents = [*contents, directory_text] if isinstance(contents, list) else contents + directory_text
+            inlined_files.extend(directory_references)
+
+        if self._retrieval_top_k is not None:
+            retrieved_text = self._retrieve_chunks(message, retrieved_files, deadline)
+            if retrieved_text:
+                contents = [*contents, retrieved_text] if isinstance(contents, list) else contents + retrieved_text
+                inlined_files.extend(retrieved_files)
+
+        if resends:
+            resent_text = "".join(resends.values())
+            contents = [*contents, resent_text] if isinstance(contents, list) else contents + resent_text
+            inlined_files.extend(resends)
+
         # Send the message using the chat instance
-        response = self._chat.send_message(
-            contents,
-            config={
-                "temperature": role.temperature,
-                "system_instruction": role.system_instruction,
-                "max_output_tokens": role.max_output_tokens,
-                "tools": tools,
-            },
-        )
+        config = {
+            "temperature": role.temperature,
+            "system_instruction": role.system_instruction,
+            "max_output_tokens": role.max_output_tokens,
+            "tools": tools,
+        }
+        if on_chunk is not None:
+            on_chunk = self._until_deadline(on_chunk, deadline)
+            response = self._send_chat_message(
+                lambda chat: self._collect_stream(chat.send_message_stream(contents, config=config), on_chunk),
+                deadline,
+            )
+        else:
+            response = self._send_chat_message(lambda chat: chat.send_message(contents, config=config), deadline)
 
-        # Store the response
-        self._last_response = response
-
-        # Check the usage metadata of the last response
-        if self._last_response:
-            usage_metadata = self._last_response.usage_metadata
-            if usage_metadata.total_token_count and usage_metadata.total_token_count > token_threshold:
-                # Summarize the chat
-                summary_role = self._roles.get("summarizer")
-                if summary_role:
-                    summary_response = self._chat.send_message(["Summarize the previous chat."])
-                    summary = summary_response.text
-
-                    # Start a new chat with the summary
-                    self.new_chat()
-                    self._chat.send_message(["Here is a summary of the previous chat:", summary])
-                else:
-                    logger.error("Summarizer role not found. Use the default roles or add a summarizer role.")
+        # Store a compact record of the response rather than the SDK response object
+        self._last_response = TurnRecord.from_response(role_name, response)
+        record_usage(response.usage_metadata)
 
         # Update token count and message count
-        self._token_count += response.usage_metadata.total_token_count
-        self._message_count += 1
-        self._role_message_count[role_name] = self._role_message_count.get(role_name, 0) + 1
+        tokens = 0
+        if response.usage_metadata is not None:
+            tokens = response.usage_metadata.total_token_count or 0
+        message_number = self._record_chat_message(role_name, tokens)
+
+        self._sent_files.record(sent_versions)
+        self._compact_history(message, inlined_files)
+
+        if background:
+            # Hand the response off to the post-processing thread and return the text right away.
+            # Tasks run in submission order, so summarization always finishes before artifacts are written.
+            # The deadline bounds the call that has just returned, not the work it leaves behind.
+            executor = self._get_postprocess_executor()
+            self._pending_summary = executor.submit(self._summarize_if_needed, response, token_threshold)
+            self._pending_artifacts = executor.submit(
+                self._postprocess_response, role_name, response.text, message_number, write_code, write_output
+            )
+        else:
+            self._summarize_if_needed(response, token_threshold, deadline)
+            if deadline is not None:
+                deadline.check("post-processing")
+            self._postprocess_response(role_name, response.text, message_number, write_code, write_output)
+
+        return response.text
+
+    def _read_directories(self, directories: list[str], deadline: Deadline | None) -> str:
+        """
+        Read the text files of directories referenced in a chat message.
+
+        Args:
+            directories (list[str]): The directories.
+            deadline (Deadline, optional): Checked before each directory is read.
+
+        Returns:
+            str: Each directory's manifest and file contents, sharing one token budget.
+        """
+        sections = []
+        budget = self._directory_token_budget
+        for directory in directories:
+            if deadline is not None:
+                deadline.check("directory reading")
+            files, manifest = ingest_directory(directory, max_tokens=budget)
+            budget -= manifest.total_tokens
+            logger.info(manifest.summary().splitlines()[0])
+            sections.append(format_directory(files, manifest))
+        return "".join(sections)
+
+    def _read_text_file(self, file_path: str) -> str | None:
+        """Read a referenced file if it holds text, returning None for binary or unreadable files."""
+        try:
+            if not is_text_mime_type(attachment_mime_type(file_path)):
+                return None
+            with open(file_path, encoding="utf-8") as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _use_retrieval(self, file_path: str) -> bool:
+        """Check whether a referenced file is indexed rather than sent whole in retrieval mode."""
+        try:
+            return Path(file_path).stat().st_size >= RETRIEVAL_MIN_BYTES and is_text_mime_type(
+                attachment_mime_type(file_path)
+            )
+        except OSError:
+            return False
+
+    def _retrieve_chunks(self, message: str, file_paths: list[str], deadline: Deadline | None) -> str:
+        """
+        Index referenced files and render the chunks most relevant to a chat message.
+
+        Args:
+            message (str): The chat message, used as the query.
+            file_paths (list[str]): The referenced files to index.
+            deadline (Deadline, optional): Checked before each file is indexed.
+
+        Returns:
+            str: The relevant excerpts, or an empty string if there are none.
+        """
+        for file_path in file_paths:
+            if deadline is not None:
+                deadline.check("file indexing")
+            try:
+                self._retrieval_index.add_file(file_path)
+            except OSError as e:
+                logger.warning(f"Error indexing file {file_path}: {e}")
+
+        # Without a persistent index, only the files referenced in this message are searched
+        if not self._keep_retrieval_index and not file_paths:
+            return ""
+        paths = None if self._keep_retrieval_index else file_paths
+        results = self._retrieval_index.search(message, top_k=self._retrieval_top_k, paths=paths)
+        logger.debug(f"Retrieved {len(results)} chunks for the message.")
+        return format_chunks([chunk for chunk, _ in results])
+
+    def _compact_history(self, message: str, inlined_files: list[str]) -> None:
+        """
+        Apply the history limits and attachment eviction after a chat turn.
+
+        Args:
+            message (str): The message sent, without inlined file contents.
+            inlined_files (list[str]): The files whose contents were inlined into the message.
+        """
+        evict = self._evict_attachments and inlined_files
+        if not evict and self._max_history_turns is None and self._max_history_bytes is None:
+            return
+
+        history = list(self._chat.get_history(curated=False))
+        changed = False
+        if evict:
+            # The latest user entry is the message that was just sent
+            for index in range(len(history) - 1, -1, -1):
+                if history[index].role == "user":
+                    history[index], freed = strip_inlined_files(history[index], message, inlined_files)
+                    self._history_evictions["attachment_bytes"] += freed
+                    self._sent_files.forget(inlined_files)
+                    changed = True
+                    break
+
+        history, dropped = trim_history(history, self._max_history_turns, self._max_history_bytes)
+        if dropped:
+            logger.debug(f"Dropped {dropped} turns from the chat history.")
+            self._history_evictions["turns"] += dropped
+            self._sent_files.forget()  # The dropped turns may hold file versions later diffs refer to
+            changed = True
+
+        if changed:
+            self._reset_chat(history=history)
+
+    @_per_thread
+    def get_memory_usage(self) -> dict:
+        """
+        Report the memory held by this chat session.
+
+        Returns:
+            dict: The number of turns and bytes in the chat history, the size of the last response, and
+                the turns and inlined file bytes evicted so far.
+        """
+        history = self._chat.get_history(curated=False)
+        return {
+            "history_turns": len(split_turns(history)),
+            "history_bytes": sum(content_size(content) for content in history),
+            "last_response_bytes": len((self._last_response.text or "").encode("utf-8")) if self._last_response else 0,
+            "evicted_turns": self._history_evictions["turns"],
+            "evicted_attachment_bytes": self._history_evictions["attachment_bytes"],
+        }
+
+    def _send_chat_message(self, send: Callable, deadline: Deadline | None, stage: str = "model call"):
+        """
+        Send a message on the chat through the request scheduler, restoring the chat history if the deadline
+        passes first.
+
+        Args:
+            send (Callable): Sends the message on the chat passed to it and returns the response.
+            deadline (Deadline, optional): The deadline of the call.
+            stage (str): What the call is doing, used in error messages. Defaults to "model call".
+
+        Returns:
+            The response.
+        """
+
+        def scheduled_send(chat):
+            return self._scheduled(lambda: send(chat), Priority.INTERACTIVE, deadline)
+
+        if deadline is None:
+            return scheduled_send(self._chat)
+
+        chat = self._chat
+        history = list(chat.get_history(curated=False))
+        try:
+            return deadline.run(lambda: scheduled_send(chat), stage)
+        except (PromptpalTimeoutError, CallCancelledError):
+            # The abandoned request may still add to the old chat, so continue from a copy of its history
+            self._reset_chat(history=history)
+            raise
+
+    @staticmethod
+    def _until_deadline(callback: Callable[[str], None], deadline: Deadline | None) -> Callable[[str], None]:
+        """Wrap a chunk callback so chunks from a request abandoned at its deadline are dropped."""
+        if deadline is None:
+            return callback
+
+        def guarded(text: str) -> None:
+            if not deadline.exceeded:
+                callback(text)
+
+        return guarded
+
+    def _summarize_if_needed(self, response, token_threshold: int, deadline: Deadline | None = None) -> None:
+        """
+        Summarize the chat into a new chat when the last response exceeded the token threshold.
+
+        Args:
+            response: The last response from the chat.
+            token_threshold (int): The token count above which the chat is summarized.
+            deadline (Deadline, optional): The deadline of the chat call. Defaults to None.
+        """
+        usage_metadata = response.usage_metadata
+        if usage_metadata and usage_metadata.total_token_count and usage_metadata.total_token_count > token_threshold:
+            # Summarize the chat
+            summary_role = self._roles.get("summarizer")
+            if summary_role:
+                summary_response = self._send_chat_message(
+                    lambda chat: chat.send_message(["Summarize the previous chat."]), deadline, "summarization"
+                )
+                summary = summary_response.text
+
+                # Start a new chat with the summary
+                self._reset_chat()
+                self._send_chat_message(
+                    lambda chat: chat.send_message(["Here is a summary of the previous chat:", summary]),
+                    deadline,
+                    "summarization",
+                )
+            else:
+                logger.error("Summarizer role not found. Use the default roles or add a summarizer role.")
+
+    def _postprocess_response(
+        self,
+        role_name: str,
+        text: str,
+        message_number: int,
+        write_code: bool,
+        write_output: bool,
+    ) -> list[Artifact]:
+        """
+        Extract and store code snippets from a chat response and print it.
+
+        Args:
+            role_name (str): The role that produced the response.
+            text (str): The response text.
+            message_number (int): The message number of the response.
+            write_code (bool): Whether to store code snippets as artifacts.
+            write_output (bool): Whether to print the response.
+
+        Returns:
+            list[Artifact]: The artifacts recorded for the response.
+        """
+        artifacts = []
 
-        # If write_code is True, extract code snippets and write them to files
+        # If write_code is True, extract code snippets and store them as artifacts
         if write_code:
-            code_snippets = self.extract_code_snippets(response.text)
-            if code_snippets and not self._output_dir:
-                self._output_dir = "./generated_files"
-            Path(self._output_dir).mkdir(parents=True, exist_ok=True)
+            code_snippets = self.extract_code_snippets(text)
             for lang, code in code_snippets.items():
-                filename = self.determine_filename(lang, code)
-                file_path = Path(self._output_dir) / filename
-                with open(file_path, "w") as code_file:
-                    code_file.write(code)
+                artifact, written = self._artifacts.put(code, lang, role=role_name, message_number=message_number)
+                artifacts.append(artifact)
+                if written:
+                    self._record_file_written("code")
 
         if write_output:
-            for line in response.text.split("\n"):
+            # Roles marked as quiet print a condensed version of the response
+            role = self._roles.get(role_name)
+            output = self._quiet_response(text) if role is not None and role.quiet else text
+            for line in output.split("\n"):
                 print(line)
 
-    def message(self, role_name: str, message: str):
+        return artifacts
+
+    def _get_postprocess_executor(self) -> ThreadPoolExecutor:
+        """Create the single post-processing thread on first use."""
+        if self._postprocess_executor is None:
+            self._postprocess_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="promptpal-postprocess")
+        return self._postprocess_executor
+
+    def _wait_for_pending_summary(self) -> None:
+        """Block until background summarization of the previous turn has updated the chat history."""
+        if self._pending_summary is not None:
+            try:
+                self._pending_summary.result()
+            except Exception as e:
+                logger.error(f"Background chat summarization failed: {e!s}")
+            self._pending_summary = None
+
+    @property
+    @_per_thread
+    def pending_artifacts(self) -> Future | None:
+        """
+        The future for the most recent background post-processing started by chat(background=True).
+
+        Resolves to the list of Artifact objects recorded for that response, or None if chat() has not
+        been called in background mode.
+        """
+        return self._pending_artifacts
+
+    @_per_thread
+    def wait_for_artifacts(self, timeout: float | None = None) -> list[Artifact]:
+        """
+        Wait for background post-processing of the most recent chat response to finish.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait. Defaults to None (no limit).
+
+        Returns:
+            list[Artifact]: The artifacts recorded for the response. Empty if nothing is pending.
+
+        Raises:
+            TimeoutError: If post-processing does not finish within the timeout.
+        """
+        if self._pending_artifacts is None:
+            return []
+        return self._pending_artifacts.result(timeout=timeout)
+
+    def message(
+        self,
+        role_name: str,
+        message: str,
+        response_schema: dict | None = None,
+        on_partial: Callable[[dict | list], None] | None = None,
+        on_chunk: Callable[[str], None] | None = None,
+        deadline: Deadline | float | None = None,
+        model: str | None = None,
+        latency_slo: float | None = None,
+    ):
         """
         Write a message and get a response from the role. Messages are independent and do not
         get saved to a chat history like chat does. Message also does not have the fancy features
@@ -381,30 +1008,211 @@ class Promptpal:
 
         This method operates completely independently from the _chat instance used by the chat method.
         Each call to this method is a standalone request with no conversation history.
+
+        Args:
+            role_name (str): The name of the role to use.
+            message (str): The message to send.
+            response_schema (dict, optional): A JSON schema for structured output. When given, the model
+                is asked for a JSON response matching the schema and the decoded value is returned
+                instead of text. Defaults to None.
+            on_partial (Callable, optional): Only used with response_schema. Streams the response and
+                calls this with the partially decoded value as each chunk arrives. Defaults to None.
+            on_chunk (Callable, optional): Streams the response and calls this with each chunk of text
+                as it arrives. Defaults to None.
+            deadline (Deadline | float, optional): A timeout in seconds, or a Deadline that can also be
+                cancelled from another thread. Defaults to None.
+            model (str, optional): The model to use instead of the role's model. Defaults to None.
+            latency_slo (float, optional): The latency target in seconds used to pick a model when the
+                instance has a routing policy. Defaults to None (the policy's target).
+
+        Returns:
+            str | dict | list: The response text, or the decoded JSON value if response_schema is given.
+
+        Raises:
+            ValueError: If the role is not found.
+            StructuredOutputError: If response_schema is given and the response is not valid JSON.
+            PromptpalTimeoutError: If the deadline passes.
+            CallCancelledError: If the deadline is cancelled.
         """
+        deadline = Deadline.coerce(deadline)
         role = self._roles.get(role_name)
         if role is None:
             raise ValueError(f"Role '{role_name}' not found.")
-
-        try:
+        if model is not None and model != role.model:
+            role = dataclasses.replace(role, model=model)
+        # Answers from other models are cached separately
+        cache_partition = role.name if model is None else f"{role.name}@{model}"
+
+        config = {
+            "temperature": role.temperature,
+            "system_instruction": role.system_instruction,
+            "max_output_tokens": role.max_output_tokens,
+        }
+        if response_schema is not None:
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = response_schema
+
+        streaming = on_chunk is not None or (response_schema is not None and on_partial is not None)
+
+        def generate(role: Role):
+            if streaming:
+                # Stream the response, surfacing text chunks and partially decoded JSON as they arrive
+                parser = IncrementalJSONParser() if response_schema is not None and on_partial is not None else None
+
+                def handle_chunk(text: str) -> None:
+                    if on_chunk is not None:
+                        on_chunk(text)
+                    if parser is not None:
+                        previous = parser.partial
+                        partial = parser.feed(text)
+                        if partial is not None and partial != previous:
+                            on_partial(partial)
+
+                response = self._scheduled(
+                    lambda: timed_request(
+                        lambda: self._collect_stream(
+                            self._client.models.generate_content_stream(
+                                model=role.model, contents=message, config=config
+                            ),
+                            self._until_deadline(handle_chunk, deadline),
+                        )
+                    ),
+                    Priority.NORMAL,
+                    deadline,
+                )
+                record_usage(response.usage_metadata)
+                return response
             # Generate content with the model directly (not using _chat)
-            response = self._client.models.generate_content(
-                model=role.model,
-                contents=message,
-                config={
-                    "temperature": role.temperature,
-                    "system_instruction": role.system_instruction,
-                    "max_output_tokens": role.max_output_tokens,
-                },
+            return self._generate_content(role, message, config, deadline)
+
+        def route_and_generate():
+            if self._routing is None or model is not None:
+                return generate(role)
+            prompt_tokens = estimate_tokens(f"{role.system_instruction or ''}{message}")
+            return self._routing.run(
+                role.model,
+                prompt_tokens,
+                lambda routed: generate(role if routed == role.model else dataclasses.replace(role, model=routed)),
+                latency_slo,
             )
 
+        def answer():
+            if streaming or response_schema is not None or self._semantic_cache is None:
+                return route_and_generate()
+            # Answer from the semantic cache when a similar prompt was already sent to this role. The cache
+            # is checked before routing, so cached answers do not count as calls served by a model.
+            vector = self._semantic_cache.embed(message)
+            cached = self._semantic_cache.lookup(cache_partition, vector)
+            if cached is not None:
+                return _StreamedResponse(cached)
+            response = route_and_generate()
+            if response.text:
+                # Routed models answer in the role's cache partition, like the role's own model
+                self._semantic_cache.put(cache_partition, vector, message, response.text)
+            return response
+
+        try:
+            response = answer() if deadline is None else deadline.run(answer, "model call")
+
+            if response_schema is not None:
+                return parse_json_response(response.text)
             return response.text
+        except (StructuredOutputError, PromptpalTimeoutError, CallCancelledError):
+            raise
         except Exception as e:
             logger.error(f"Error in message method: {e!s}")
             # Log more detailed error information
             logger.error(f"Error details: {type(e).__name__}, {e!s}")
             raise
 
+    def _generate_content(self, role: Role, contents, config: dict, deadline: Deadline | None = None):
+        """
+        Call the model for a stateless request, coalescing identical in-flight requests and hedging slow
+        requests when enabled.
+
+        Args:
+            role (Role): The role making the request.
+            contents: The request contents.
+            config (dict): The generation config.
+            deadline (Deadline, optional): The deadline of the request. Defaults to None.
+
+        Returns:
+            The model response.
+        """
+        # A coalesced call also answers callers with other deadlines, so one caller's deadline must not drop it
+        queue_deadline = deadline if self._single_flight is None else None
+
+        def call_model(model: str):
+            response = self._scheduled(
+                lambda: timed_request(
+                    lambda: self._client.models.generate_content(model=model, contents=contents, config=config)
+                ),
+                Priority.NORMAL,
+                queue_deadline,
+            )
+            # Only the caller that actually made the request is charged for it
+            record_usage(response.usage_metadata)
+            return response
+
+        def call():
+            if self._hedging is None:
+                return call_model(role.model)
+            fallback_model = self._hedging.fallback_model or role.model
+            return self._hedging.run(lambda: call_model(role.model), lambda: call_model(fallback_model))
+
+        if self._single_flight is None:
+            return call()
+        return self._single_flight.do(request_key(role.name, role.model, config, contents), call)
+
+    def _scheduled(self, call: Callable, default_priority: Priority, deadline: Deadline | None = None):
+        """
+        Run a model call through the request scheduler, if the instance has one.
+
+        Args:
+            call (Callable): The model call.
+            default_priority (Priority): The call's priority unless one was set with request_priority().
+            deadline (Deadline, optional): The deadline of the request. A call still queued when the
+                deadline passes or the request is cancelled is dropped. Defaults to None.
+
+        Returns:
+            The result of the call.
+        """
+        if self._scheduler is None:
+            return call()
+        return self._scheduler.run(call, current_priority(default_priority), deadline=deadline)
+
+    def get_coalescing_stats(self) -> dict:
+        """
+        Get statistics on coalesced message() requests.
+
+        Returns:
+            dict: The number of requests, API calls executed, requests collapsed into an identical in-flight
+                call, and calls currently in flight. Empty if coalescing is disabled.
+        """
+        return self._single_flight.stats() if self._single_flight is not None else {}
+
+    def _collect_stream(self, chunks, on_chunk: Callable[[str], None]) -> "_StreamedResponse":
+        """
+        Consume a streamed response, passing each chunk of text to a callback.
+
+        Args:
+            chunks: The stream returned by generate_content_stream or send_message_stream.
+            on_chunk (Callable): Called with the text of each chunk.
+
+        Returns:
+            _StreamedResponse: The full response text and the final usage metadata.
+        """
+        parts = []
+        usage_metadata = None
+        for chunk in chunks:
+            # Usage is cumulative, so only the last reported value is kept
+            usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+            text = chunk.text or ""
+            if text:
+                parts.append(text)
+                on_chunk(text)
+        return _StreamedResponse(text="".join(parts), usage_metadata=usage_metadata)
+
     def extract_code_snippets(self, text: str) -> dict:
         """
         Extract code snippets from the response text.
@@ -434,59 +1242,183 @@ class Promptpal:
         Returns:
             str: The determined filename with extension.
         """
-        # Use a hash of the code to ensure unique filenames
-        code_hash = hashlib.md5(code.encode()).hexdigest()[:8]
-        extension = {
-            "python": ".py",
-            "javascript": ".js",
-            "java": ".java",
-            "c++": ".cpp",
-            "html": ".html",
-            "css": ".css",
-            "bash": ".sh",
-        }.get(lang, ".txt")  # Default to .txt if language is unknown
+        # Use the full hash of the code so filenames are content-addressed
+        return artifact_filename(lang, code)
+
+    def get_artifacts(
+        self,
+        role_name: str | None = None,
+        message_number: int | None = None,
+        language: str | None = None,
+    ) -> list[Artifact]:
+        """
+        Look up generated files by the role and message that produced them, or by language.
 
-        return f"code_snippet_{code_hash}{extension}"
+        Args:
+            role_name (str, optional): Only return files produced by this role.
+            message_number (int, optional): Only return files produced by this message number.
+            language (str, optional): Only return files with this language tag.
 
+        Returns:
+            list[Artifact]: The matching artifacts, oldest first.
+        """
+        return self._artifacts.find(role=role_name, message_number=message_number, language=language)
+
+    @_per_thread
     def get_last_response(self) -> str:
         """
         Get the last response from the chat.
         """
         return self._last_response.text
 
-    def _quiet_response(self, text):
-        """Create condensed responses to avoid walls of text"""
-        role = self._roles.get("summarizer")
-        prompt = role.system_instruction.replace("<user_prompt>", text)
+    def _quiet_response(self, text: str) -> str:
+        """
+        Create condensed responses to avoid walls of text.
 
-        # Use the LLM to summarize the previous response
-        response = self._client.models.generate_content(
-            model="gpt-4o-mini",
-            prompt=prompt,
-        )
-        # Return the summarized text
-        return response
+        By default the response is condensed locally with an extractive summary, which adds no latency
+        or API calls. With quiet_mode="llm" the summarizer role is used instead, falling back to the
+        local condenser if that role is unavailable or the request fails.
 
+        Args:
+            text (str): The response text to condense.
+
+        Returns:
+            str: The condensed text.
+        """
+        if self._quiet_mode == "llm":
+            if "summarizer" in self._roles:
+                try:
+                    return self.message("summarizer", f"Summarize this response concisely:\n\n{text}")
+                except Exception as e:
+                    logger.warning(f"LLM quiet summary failed, condensing locally instead: {e!s}")
+            else:
+                logger.warning("Summarizer role not found. Condensing response locally instead.")
+
+        return condense(text)
+
+    @_per_thread
     def new_chat(self):
         """
         Reset the chat by creating a new chat instance.
         """
-        self._chat = self._client.chats.create(model="gemini-2.0-flash-001")
+        self._wait_for_pending_summary()
+        self._reset_chat()
+        self._retrieval_index = RetrievalIndex()
+
+    def _reset_chat(self, history: list | None = None):
+        """
+        Replace the chat instance with a fresh one.
+
+        Args:
+            history (list, optional): Content to seed the new chat's history with. Defaults to None, which
+                also forgets the files sent earlier in the chat.
+        """
+        if history:
+            self._chat = self._client.chats.create(model=self._chat_model, history=history)
+        else:
+            self._chat = self._client.chats.create(model=self._chat_model)
+            self._forget_sent_files()
+        self._chat_generation += 1
+
+    def _forget_sent_files(self) -> None:
+        """Forget the files sent in the chat once its history is replaced, so they are sent whole again."""
+        self._sent_files.forget()
+        if not self._keep_retrieval_index:
+            self._retrieval_index = RetrievalIndex()
+
+    @_per_thread
+    def save_session(self, path: str) -> None:
+        """
+        Save the chat session so it can be resumed later, possibly in another process.
+
+        Sessions are stored as a JSONL file. Saving repeatedly to the same path only appends the turns
+        added since the last save, plus a snapshot of the chat statistics; once the history has been
+        replaced (e.g. summarized or trimmed), the file is rewritten instead. Only the text of each turn is
+        stored; uploaded file references are not.
+
+        Args:
+            path (str): The session file to write.
+        """
+        self._wait_for_pending_summary()
+
+        history = []
+        for content in self._chat.get_history(curated=True):
+            text = "".join(part.text for part in content.parts or [] if getattr(part, "text", None))
+            if text:
+                history.append((content.role, text))
+
+        # Append only new turns, unless the history was replaced (e.g. summarized) since the last save
+        saved_path, saved_generation, saved_turns = self._session_checkpoint
+        resumed = saved_path == str(path) and saved_generation == self._chat_generation
+        reset = not resumed or saved_turns > len(history)
+        new_turns = history if reset else history[saved_turns:]
+
+        append_session_records(
+            path,
+            model=self._chat_model,
+            history=new_turns,
+            stats={
+                "role": self._last_role_name,
+                "tokens": self._token_count,
+                "messages": self._message_count,
+                "per_role": self._role_message_count,
+            },
+            reset=reset,
+        )
+        self._session_checkpoint = (str(path), self._chat_generation, len(history))
+
+    @_per_thread
+    def load_session(self, path: str, tail: int | None = None) -> str | None:
+        """
+        Resume a chat session saved with save_session().
+
+        The chat history is restored locally, so no turns are replayed through the API. Chat statistics
+        are restored as well.
+
+        Args:
+            path (str): The session file to load.
+            tail (int, optional): Only restore the most recent number of history turns, which keeps
+                very long sessions cheap to load and to continue. Defaults to None (full history).
+
+        Returns:
+            str | None: The role used for the most recent message in the session, if any.
+        """
+        self._wait_for_pending_summary()
+        session = read_session(path, tail=tail)
+
+        self._chat_model = session.model
+        self._reset_chat(
+            [genai.types.Content(role=role, parts=[genai.types.Part(text=text)]) for role, text in session.history]
+        )
+        self._forget_sent_files()
+        self._token_count = session.token_count
+        self._message_count = session.message_count
+        self._role_message_count = dict(session.role_message_count)
+        self._last_role_name = session.role_name
+
+        # Subsequent saves to the same file append after the restored turns
+        self._session_checkpoint = (str(path), self._chat_generation, len(session.history))
+
+        if session.truncated:
+            logger.info(f"Loaded the last {len(session.history)} turns of session {path}.")
+
+        return session.role_name
 
     def get_chat_stats(self) -> dict:
         """
-        Get the current chat statistics.
+        Get the current chat statistics. For a thread-safe instance, these are totals across all threads.
 
         Returns:
             dict: A dictionary containing the number of tokens used, number of messages sent,
                   a summary of code and image files written, and number of messages per role.
         """
-        return {
-            "tokens_used": self._token_count,
-            "messages_sent": self._message_count,
-            "files_written": self._files_written,
-            "messages_per_role": self._role_message_count,
-        }
+        with self._stats_lock:
+            return {
+                "tokens_used": self._token_count,
+                "messages_sent": self._message_count,
+                "files_written": dict(self._files_written),
+                "messages_per_role": dict(self._role_message_count),
+            }
 
     def _extract_refined_prompt(self, text: str) -> str:
         """
@@ -523,14 +1455,73 @@ class Promptpal:
 
         return text.strip()
 
-    def refine_prompt(self, prompt: str, refinement_type: PromptRefinementType = None) -> str:
+    def _run_refinement(
+        self,
+        role_name: str,
+        message: str,
+        structured: bool = False,
+        on_partial: Callable[[str], None] | None = None,
+        deadline: Deadline | float | None = None,
+    ) -> str:
+        """
+        Send a refinement request to a role and return only the refined prompt.
+
+        Args:
+            role_name (str): The refinement role to use.
+            message (str): The refinement request.
+            structured (bool): Whether to request structured JSON output. Defaults to False.
+            on_partial (Callable, optional): Called with the partial refined prompt while streaming.
+            deadline (Deadline | float, optional): A timeout in seconds, or a cancellable Deadline.
+
+        Returns:
+            str: The refined prompt.
+        """
+        if not structured:
+            return self._extract_refined_prompt(self.message(role_name, message, deadline=deadline))
+
+        def report_partial(partial):
+            if isinstance(partial, dict) and isinstance(partial.get("refined_prompt"), str):
+                on_partial(partial["refined_prompt"])
+
+        try:
+            result = self.message(
+                role_name,
+                message,
+                response_schema=REFINED_PROMPT_SCHEMA,
+                on_partial=report_partial if on_partial else None,
+                deadline=deadline,
+            )
+        except StructuredOutputError as e:
+            logger.warning("Structured refinement response was not valid JSON. Falling back to text extraction.")
+            return self._extract_refined_prompt(e.text)
+
+        if isinstance(result, dict) and isinstance(result.get("refined_prompt"), str):
+            return result["refined_prompt"].strip()
+
+        logger.warning("Structured refinement response is missing 'refined_prompt'. Falling back to text extraction.")
+        return self._extract_refined_prompt(json.dumps(result) if not isinstance(result, str) else result)
+
+    def refine_prompt(
+        self,
+        prompt: str,
+        refinement_type: PromptRefinementType = None,
+        structured: bool = False,
+        on_partial: Callable[[str], None] | None = None,
+        deadline: Deadline | float | None = None,
+    ) -> str:
         """
         Refine a prompt using different methods.
 
         Args:
             prompt (str): The prompt to refine.
             refinement_type (PromptRefinementType, optional): The type of refinement to apply. Defaults to None.
-            keyword (str, optional): The keyword to use for keyword-based refinement. Defaults to None.
+            structured (bool): If True, request the refined prompt as structured JSON output instead of
+                scraping it from free-form text. Falls back to text extraction if the response is not
+                valid JSON. Ignored for keyword refinement. Defaults to False.
+            on_partial (Callable, optional): Only used with structured=True. Streams the response and calls
+                this with the partial refined prompt as it is generated. Defaults to None.
+            deadline (Deadline | float, optional): A timeout in seconds, or a Deadline that can also be
+                cancelled from another thread. Defaults to None.
 
         Returns:
             str: The refined prompt.
@@ -550,8 +1541,9 @@ class Promptpal:
                 return prompt
 
             # Generate the refined prompt using the prompt_engineer role
-            response = self.message("prompt_engineer", f"Refine this prompt: {prompt}")
-            return self._extract_refined_prompt(response)
+            return self._run_refinement(
+                "prompt_engineer", f"Refine this prompt: {prompt}", structured, on_partial, deadline
+            )
 
         elif refinement_type == PromptRefinementType.REFINE_PROMPT:
             # Use the refine_prompt role to refine the prompt
@@ -561,8 +1553,9 @@ class Promptpal:
                 return prompt
 
             # Generate the refined prompt using the refine_prompt role
-            response = self.message("refine_prompt", f"Refine this prompt: {prompt}")
-            return self._extract_refined_prompt(response)
+            return self._run_refinement(
+                "refine_prompt", f"Refine this prompt: {prompt}", structured, on_partial, deadline
+            )
 
         elif refinement_type == PromptRefinementType.GLYPH:
             # Use the glyph_prompt role to refine the prompt
@@ -571,8 +1564,7 @@ class Promptpal:
                 logger.warning("Glyph prompt role not found. Returning original prompt.")
                 return prompt
 
-            response = self.message("glyph_prompt", prompt)
-            return self._extract_refined_prompt(response)
+            return self._run_refinement("glyph_prompt", prompt, structured, on_partial, deadline)
 
         elif refinement_type == PromptRefinementType.CHAIN_OF_THOUGHT:
             # Use the chain_of_thought role to refine the prompt
@@ -581,8 +1573,9 @@ class Promptpal:
                 logger.warning("Chain of thought role not found. Returning original prompt.")
                 return prompt
 
-            response = self.message("chain_of_thought", f"Refine this prompt: {prompt}")
-            return self._extract_refined_prompt(response)
+            return self._run_refinement(
+                "chain_of_thought", f"Refine this prompt: {prompt}", structured, on_partial, deadline
+            )
 
         elif refinement_type == PromptRefinementType.CHAIN_OF_DRAFT:
             # Use the chain_of_draft role to refine the prompt
@@ -591,8 +1584,9 @@ class Promptpal:
                 logger.warning("Chain of draft role not found. Returning original prompt.")
                 return prompt
 
-            response = self.message("chain_of_draft", f"Refine this prompt: {prompt}")
-            return self._extract_refined_prompt(response)
+            return self._run_refinement(
+                "chain_of_draft", f"Refine this prompt: {prompt}", structured, on_partial, deadline
+            )
 
         elif refinement_type == PromptRefinementType.KEYWORD:
             # Apply keyword-based refinement
@@ -637,3 +1631,267 @@ class Promptpal:
 
         else:
             raise ValueError(f"Unknown refinement type: {refinement_type}")
+
+    def refine_prompts(
+        self,
+        prompts: Iterable[str],
+        refinement_type: PromptRefinementType,
+        output_path: str | None = None,
+        max_workers: int = 4,
+        resume: bool = True,
+        progress_callback: Callable[[BatchProgress], None] | None = None,
+        log_every: int = 100,
+        structured: bool = False,
+    ) -> dict[str, str]:
+        """
+        Refine a corpus of prompts, deduplicating identical prompts and refining them concurrently.
+
+        Prompts are normalized (whitespace collapsed, casefolded) so that each distinct prompt is only
+        refined once; prompts that differ only in case share the first one's refined prompt. Keyword
+        refinement keeps the prompt's own text, so there only whitespace is normalized. LLM-based
+        refinement types run on a bounded thread pool; keyword refinement is local and runs inline.
+        When output_path is given, each result is appended to that JSONL file
+        as soon as it completes, and a later call with resume=True skips prompts already recorded there.
+
+        Args:
+            prompts (Iterable[str]): The prompts to refine.
+            refinement_type (PromptRefinementType): The type of refinement to apply.
+            output_path (str, optional): JSONL file to stream results to and resume from. Defaults to None.
+            max_workers (int): Maximum number of concurrent refinement requests. Defaults to 4.
+            resume (bool): Whether to reuse results already present in output_path. Defaults to True.
+            progress_callback (Callable, optional): Called with a BatchProgress after every processed prompt.
+            log_every (int): Log progress and throughput every this many processed prompts. Defaults to 100.
+            structured (bool): Request refined prompts as structured JSON output. Defaults to False.
+
+        Returns:
+            dict[str, str]: Refined prompts keyed by the original prompt. Prompts that failed are omitted.
+
+        Raises:
+            ValueError: If refinement_type is None or max_workers is less than 1.
+        """
+        if refinement_type is None:
+            raise ValueError("A refinement type is required for batch refinement.")
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+
+        # Group the input prompts by normalized key, keeping the first occurrence as representative
+        originals = defaultdict(list)
+        unique = {}
+        casefold = refinement_type != PromptRefinementType.KEYWORD
+        for prompt in prompts:
+            key = prompt_key(normalize_prompt(prompt, casefold), refinement_type.value)
+            originals[key].append(prompt)
+            unique.setdefault(key, prompt)
+
+        progress = BatchProgress(total=len(unique), duplicates=sum(len(v) for v in originals.values()) - len(unique))
+        refined = {}
+
+        # Restore finished work from a previous run
+        if output_path and resume:
+            for key, record in load_checkpoint(output_path).items():
+                if key in unique:
+                    refined[key] = record["refined_prompt"]
+            progress.resumed = len(refined)
+            if progress.resumed:
+                logger.info(f"Resuming batch refinement: {progress.resumed} prompts already refined.")
+
+        pending = [(key, prompt) for key, prompt in unique.items() if key not in refined]
+        output_file = open(output_path, "a", encoding="utf-8") if output_path else None
+
+        def record_result(key: str, prompt: str, result: str | None, error: Exception | None) -> None:
+            record = {"key": key, "prompt": prompt, "refinement_type": refinement_type.value}
+            if error is None:
+                refined[key] = result
+                record["refined_prompt"] = result
+                progress.completed += 1
+            else:
+                logger.error(f"Failed to refine prompt {key[:8]}: {error!s}")
+                record["error"] = str(error)
+                progress.failed += 1
+
+            if output_file:
+                append_record(output_file, record)
+            if progress_callback:
+                progress_callback(progress)
+            if log_every and (progress.completed + progress.failed) % log_every == 0:
+                logger.info(f"Batch refinement progress: {progress}")
+
+        try:
+            if refinement_type == PromptRefinementType.KEYWORD:
+                # Keyword refinement is local, so there is nothing to gain from a thread pool
+                for key, prompt in pending:
+                    try:
+                        record_result(key, prompt, self.refine_prompt(prompt, refinement_type), None)
+                    except Exception as e:
+                        record_result(key, prompt, None, e)
+            else:
+
+                def refine(prompt: str) -> str:
+                    # Bulk work yields to interactive requests when there is a scheduler
+                    with request_priority(Priority.BATCH):
+                        return self.refine_prompt(prompt, refinement_type, structured)
+
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = {executor.submit(refine, prompt): (key, prompt) for key, prompt in pending}
+                    # Results are recorded from this thread only, so the output file needs no lock
+                    for future in as_completed(futures):
+                        key, prompt = futures[future]
+                        try:
+                            record_result(key, prompt, future.result(), None)
+                        except Exception as e:
+                            record_result(key, prompt, None, e)
+        finally:
+            if output_file:
+                output_file.close()
+
+        logger.info(f"Batch refinement finished: {progress}")
+
+        return {prompt: refined[key] for key, group in originals.items() if key in refined for prompt in group}
+
+    def run_pipeline(self, pipeline: Pipeline, inputs: dict[str, str] | None = None) -> dict[str, StepResult]:
+        """
+        Run a multi-role pipeline, running steps that do not depend on each other concurrently.
+
+        Args:
+            pipeline (Pipeline): The pipeline to run.
+            inputs (dict[str, str], optional): Values for the pipeline's input placeholders. Defaults to None.
+
+        Returns:
+            dict[str, StepResult]: The output, latency and token usage of every step.
+        """
+        return pipeline.run(self, inputs)
+
+    @_per_thread
+    def refine_and_chat(
+        self,
+        role_name: str,
+        prompt: str,
+        refinement_type: PromptRefinementType = PromptRefinementType.PROMPT_ENGINEER,
+        similarity_threshold: float = 0.85,
+        write_output: bool = True,
+        write_code: bool = True,
+    ) -> str:
+        """
+        Refine a prompt and chat with the result, answering the original prompt speculatively meanwhile.
+
+        The original prompt is sent on a copy of the chat while the refinement runs. If the refined prompt
+        is similar enough to the original, the speculative answer is kept and the copy becomes the chat, so
+        the answer arrives without waiting for refinement first. Otherwise the speculative answer is
+        discarded and the refined prompt is sent with chat(). Use get_speculation_stats() to see how often
+        speculation paid off.
+
+        Args:
+            role_name (str): The role to chat with.
+            prompt (str): The prompt to refine and answer.
+            refinement_type (PromptRefinementType): How to refine the prompt. Defaults to PROMPT_ENGINEER.
+            similarity_threshold (float): Minimum prompt_similarity() between the original and refined
+                prompts for the speculative answer to be kept. Defaults to 0.85.
+            write_output (bool): If True, print the response.
+            write_code (bool): If True, write any code from the response to a file.
+
+        Returns:
+            str: The response from the LLM.
+
+        Raises:
+            ValueError: If the role or refinement type is not found.
+        """
+        if role_name not in self._roles:
+            raise ValueError(f"Role '{role_name}' not found.")
+        self._wait_for_pending_summary()
+
+        # Answer the original prompt on a copy of the chat, so a discarded answer leaves no trace
+        fork = self.session()
+        fork._reset_chat(history=list(self._chat.get_history(curated=False)))
+        fork._sent_files = self._sent_files.copy()
+        # The index is thread-safe and keyed by file content, so the copy can add to it directly
+        fork._retrieval_index = self._retrieval_index
+        fork_generation = fork._chat_generation
+
+        def speculate() -> tuple[str, int]:
+            with track_usage() as usage:
+                text = fork.chat(role_name, prompt, write_output=False, write_code=False)
+            return text, usage.total_tokens
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="promptpal-speculative")
+        speculative = executor.submit(contextvars.copy_context().run, speculate)
+        executor.shutdown(wait=False)
+
+        try:
+            refined = self.refine_prompt(prompt, refinement_type)
+        except Exception:
+            speculative.cancel()
+            raise
+
+        similarity = prompt_similarity(prompt, refined)
+        if similarity >= similarity_threshold:
+            try:
+                text, _ = speculative.result()
+            except Exception as e:
+                logger.warning(f"Speculative answer failed, sending the refined prompt instead: {e!s}")
+            else:
+                self._speculation.record(accepted=True)
+                self._chat = fork._chat
+                if fork._chat_generation != fork_generation:
+                    # The copy was summarized, so its history no longer extends the saved one
+                    self._chat_generation += 1
+                self._last_response = fork._last_response
+                self._sent_files = fork._sent_files
+                self._retrieval_index = fork._retrieval_index
+                message_number = self._record_chat_message(role_name, fork._token_count)
+                self._postprocess_response(role_name, text, message_number, write_code, write_output)
+                return text
+
+        logger.debug(f"Discarding speculative answer (prompt similarity {similarity:.2f})")
+        self._speculation.record(accepted=False)
+
+        def record_wasted(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                self._speculation.add_wasted_tokens(future.result()[1])
+
+        # The answer may still be running; its tokens are counted as wasted once it finishes
+        speculative.cancel()
+        speculative.add_done_callback(record_wasted)
+        return self.chat(role_name, refined, write_output=write_output, write_code=write_code)
+
+    def get_speculation_stats(self) -> dict:
+        """
+        Get statistics on speculative answers from refine_and_chat().
+
+        Returns:
+            dict: Attempts, accepted and rejected speculative answers, the acceptance rate and the tokens
+                spent on rejected answers.
+        """
+        return self._speculation.as_dict()
+
+    def get_scheduler_stats(self) -> dict:
+        """
+        Get queue statistics from the request scheduler.
+
+        Returns:
+            dict: The calls in flight and, per priority class, queue lengths, counts and queue times.
+                Empty if the instance has no scheduler.
+        """
+        return self._scheduler.stats() if self._scheduler is not None else {}
+
+    def get_routing_stats(self) -> dict:
+        """
+        Get statistics on the models picked by the routing policy.
+
+        Returns:
+            dict: Calls served per model, overload errors per model, the number of fallbacks, and each
+                model's current latency estimate. Empty if the instance has no routing policy.
+        """
+        return self._routing.stats() if self._routing is not None else {}
+
+    def run_ensemble(self, ensemble: Ensemble, prompt: str) -> EnsembleResult:
+        """
+        Send a prompt to several roles or models concurrently and aggregate their answers.
+
+        Args:
+            ensemble (Ensemble): The members and how to aggregate their answers.
+            prompt (str): The prompt.
+
+        Returns:
+            EnsembleResult: The aggregated answer, with the answer, latency and token usage of every member.
+        """
+        return ensemble.run(self, prompt)
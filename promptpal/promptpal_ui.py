@@ -1,13 +1,42 @@
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_for_futures
+
 import ipywidgets as widgets
 from IPython.display import display
 
+from .deadline import CallCancelledError, Deadline
 from .promptpal import Promptpal, PromptRefinementType
+from .usage import track_usage
+
+# Seconds between updates of the elapsed time shown while an action runs
+ELAPSED_REFRESH_SECONDS = 0.2
+
+
+class _ComparisonPane:
+    """The output of one refinement method in the comparison panel."""
+
+    def __init__(self, method: str, on_use: Callable[[str], None]):
+        self.method = method
+        self.label = widgets.Label(f"{method}: running...")
+        self.output = widgets.Textarea(layout=widgets.Layout(width="290px", height="200px"))
+        self.use_button = widgets.Button(description="Use", disabled=True, layout=widgets.Layout(width="80px"))
+        self.use_button.on_click(lambda button: on_use(self.output.value))
+        self.box = widgets.VBox((self.label, self.output, self.use_button))
 
 
 class PromptpalUI:
     def __init__(self, vertexai: bool = True, project: str = "", location: str = ""):
         self.promptpal = Promptpal(vertexai=vertexai, project=project, location=location)
 
+        # Model calls run on a background thread so the notebook kernel stays responsive
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="promptpal-ui")
+        self._action = None  # Future of the in-flight action
+        self._deadline = None  # Cancels the in-flight action
+        self._status_lock = threading.Lock()
+
         self.refine_method_select = widgets.RadioButtons(
             options=[
                 "Prompt Engineer",
@@ -38,6 +67,25 @@ class PromptpalUI:
 
         self.clear_button.on_click(self.clear)
 
+        self.cancel_button = widgets.Button(description="Cancel", disabled=True, layout=widgets.Layout(width="150px"))
+
+        self.cancel_button.on_click(self.cancel)
+
+        self.status = widgets.Label(value="")
+
+        self.compare_methods_select = widgets.SelectMultiple(
+            options=self.refine_method_select.options,
+            value=self.refine_method_select.options,
+            layout=widgets.Layout(width="200px", height="150px"),
+        )
+
+        self.compare_button = widgets.Button(description="Compare Methods", layout=widgets.Layout(width="150px"))
+
+        self.compare_button.on_click(self.compare_refinements)
+
+        # One pane per compared method, filled as each refinement completes
+        self.comparison_panes = widgets.GridBox(layout=widgets.Layout(grid_template_columns="repeat(3, 300px)"))
+
         self.prompt_input = widgets.Textarea(
             value="",
             placeholder="Enter your prompt here",
@@ -70,8 +118,10 @@ class PromptpalUI:
                                 self.update_prompt_button,
                                 self.get_advice_button,
                                 self.clear_button,
+                                self.cancel_button,
                             )
                         ),
+                        self.status,
                         widgets.HBox(
                             (
                                 widgets.VBox(
@@ -88,6 +138,18 @@ class PromptpalUI:
                                 ),
                             )
                         ),
+                        widgets.HBox(
+                            (
+                                widgets.VBox(
+                                    (
+                                        widgets.Label("Compare Methods"),
+                                        self.compare_methods_select,
+                                        self.compare_button,
+                                    )
+                                ),
+                                self.comparison_panes,
+                            )
+                        ),
                     )
                 ),
             )
@@ -107,9 +169,102 @@ class PromptpalUI:
         }
         return method_mapping.get(method_name)
 
+    def _run_in_background(
+        self, label: str, work: Callable[[Deadline], object], on_done: Callable[[object, float], None], error: str
+    ) -> None:
+        """
+        Run an action on the background executor while showing its elapsed time.
+
+        The action buttons are disabled and Cancel is enabled until the action finishes, so repeated
+        clicks do not queue duplicate requests.
+
+        Args:
+            label (str): Shown with the elapsed time while the action runs.
+            work (Callable): Does the work, given a Deadline that Cancel cancels.
+            on_done (Callable): Called with the result and the elapsed seconds if the work succeeds.
+            error (str): Prefix of the message shown in the tool output if the work fails.
+        """
+        if self._action is not None and not self._action.done():
+            return
+
+        deadline = Deadline()
+        started = time.monotonic()
+        finished = threading.Event()
+        self._deadline = deadline
+        self._set_busy(True)
+
+        def show_elapsed():
+            while not finished.wait(ELAPSED_REFRESH_SECONDS):
+                with self._status_lock:
+                    if not finished.is_set():
+                        self.status.value = f"{label}... {time.monotonic() - started:.1f}s"
+
+        def run():
+            try:
+                result = work(deadline)
+                status = None
+            except CallCancelledError:
+                status = "Cancelled"
+            except Exception as e:
+                self.tool_output.value = f"{error}: {e!s}"
+                status = "Failed"
+
+            try:
+                with self._status_lock:
+                    finished.set()
+                    elapsed = time.monotonic() - started
+                    if status is None:
+                        try:
+                            on_done(result, elapsed)
+                            status = "Done"
+                        except Exception as e:
+                            self.tool_output.value = f"{error}: {e!s}"
+                            status = "Failed"
+                    self.status.value = f"{status} after {elapsed:.1f}s."
+            finally:
+                # Otherwise the buttons would stay disabled for good
+                self._set_busy(False)
+
+        threading.Thread(target=show_elapsed, daemon=True).start()
+        self._action = self._executor.submit(run)
+
+    def _set_busy(self, busy: bool) -> None:
+        """Enable Cancel and disable the action buttons while an action runs, and the reverse afterwards."""
+        self.refine_button.disabled = busy
+        self.get_advice_button.disabled = busy
+        self.update_prompt_button.disabled = busy
+        self.compare_button.disabled = busy
+        self.cancel_button.disabled = not busy
+
+    @property
+    def busy(self) -> bool:
+        """Whether an action is in flight."""
+        return self._action is not None and not self._action.done()
+
+    def wait(self, timeout: float | None = None) -> None:
+        """
+        Wait for the in-flight action to finish, e.g. in a script or test.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. Defaults to None (no limit).
+        """
+        if self._action is not None:
+            wait_for_futures([self._action], timeout=timeout)
+
+    def cancel(self, button):
+        """Cancel the in-flight action. A request already sent keeps running, but its result is discarded."""
+        if self._deadline is not None and self.busy:
+            self._deadline.cancel()
+            self.status.value = "Cancelling..."
+
     def refine_prompt(self, button):
-        """Refine the current prompt using the selected refinement method."""
-        self.tool_output.value = "Refining prompt..."
+        """
+        Refine the current prompt using the selected refinement method, in the background.
+
+        The refined prompt is streamed into the refined prompt box as it is generated.
+        """
+        if self.busy:
+            return
 
         # Get the selected refinement method and current prompt
         refine_method = self.refine_method_select.value
@@ -119,25 +274,110 @@ class PromptpalUI:
             self.tool_output.value = "Error: Please enter a prompt to refine."
             return
 
-        try:
-            # Convert UI method name to PromptRefinementType enum
-            refinement_type = self._get_refinement_type(refine_method)
+        # Convert UI method name to PromptRefinementType enum
+        refinement_type = self._get_refinement_type(refine_method)
 
-            if refinement_type is None:
-                self.tool_output.value = f"Error: Unknown refinement method '{refine_method}'."
-                return
+        if refinement_type is None:
+            self.tool_output.value = f"Error: Unknown refinement method '{refine_method}'."
+            return
+
+        self.tool_output.value = "Refining prompt..."
+        self.refined_prompt_output.value = ""
 
-            # Call the Promptpal refine_prompt method
-            refined_prompt = self.promptpal.refine_prompt(current_prompt, refinement_type)
+        def show_partial(partial: str) -> None:
+            self.refined_prompt_output.value = partial
 
-            # Update the refined prompt output
+        def refine(deadline: Deadline) -> str:
+            # Structured output is what lets the refined prompt be streamed on its own
+            return self.promptpal.refine_prompt(
+                current_prompt, refinement_type, structured=True, on_partial=show_partial, deadline=deadline
+            )
+
+        def show_refined(refined_prompt: str, elapsed: float) -> None:
             self.refined_prompt_output.value = refined_prompt
+            self.tool_output.value = f"Prompt refined using {refine_method} in {elapsed:.1f}s."
+
+        self._run_in_background("Refining prompt", refine, show_refined, "Error refining prompt")
+
+    def compare_refinements(self, button):
+        """
+        Refine the current prompt with every selected method concurrently, in the background.
+
+        Each method's refined prompt is streamed into its own pane, which then shows the method's latency
+        and token usage. A pane's Use button copies its refined prompt into the refined prompt box.
+        """
+        if self.busy:
+            return
+
+        current_prompt = self.prompt_input.value
+        methods = list(self.compare_methods_select.value)
+
+        if not current_prompt:
+            self.tool_output.value = "Error: Please enter a prompt to refine."
+            return
+
+        if not methods:
+            self.tool_output.value = "Error: Please select at least one refinement method to compare."
+            return
+
+        panes = [_ComparisonPane(method, self._use_compared_prompt) for method in methods]
+        self.comparison_panes.children = [pane.box for pane in panes]
+        self.tool_output.value = f"Comparing {len(methods)} refinement methods..."
 
-            # Update the tool output
-            self.tool_output.value = f"Prompt refined using {refine_method}."
+        def refine_with(pane: _ComparisonPane, deadline: Deadline) -> tuple[float, int] | None:
+            started = time.monotonic()
 
-        except Exception as e:
-            self.tool_output.value = f"Error refining prompt: {e!s}"
+            def show_partial(partial: str) -> None:
+                pane.output.value = partial
+
+            try:
+                with track_usage() as usage:
+                    refined_prompt = self.promptpal.refine_prompt(
+                        current_prompt,
+                        self._get_refinement_type(pane.method),
+                        structured=True,
+                        on_partial=show_partial,
+                        deadline=deadline,
+                    )
+            except CallCancelledError:
+                pane.label.value = f"{pane.method}: cancelled"
+                return None
+            except Exception as e:
+                pane.label.value = f"{pane.method}: failed"
+                pane.output.value = f"Error: {e!s}"
+                return None
+
+            latency = time.monotonic() - started
+            pane.output.value = refined_prompt
+            pane.label.value = f"{pane.method}: {latency:.1f}s, {usage.total_tokens} tokens"
+            pane.use_button.disabled = False
+            return latency, usage.total_tokens
+
+        def compare(deadline: Deadline) -> dict[str, tuple[float, int]]:
+            with ThreadPoolExecutor(max_workers=len(panes), thread_name_prefix="promptpal-compare") as executor:
+                outcomes = list(executor.map(lambda pane: refine_with(pane, deadline), panes))
+            if deadline.cancelled:
+                raise CallCancelledError("The comparison was cancelled.")
+            return {pane.method: outcome for pane, outcome in zip(panes, outcomes, strict=True) if outcome is not None}
+
+        def show_summary(results: dict[str, tuple[float, int]], elapsed: float) -> None:
+            if not results:
+                self.tool_output.value = "Error: Every refinement method failed."
+                return
+            fastest = min(results, key=lambda method: results[method][0])
+            cheapest = min(results, key=lambda method: results[method][1])
+            self.tool_output.value = (
+                f"Compared {len(results)} refinement methods in {elapsed:.1f}s. "
+                f"Fastest: {fastest} ({results[fastest][0]:.1f}s). "
+                f"Fewest tokens: {cheapest} ({results[cheapest][1]} tokens)."
+            )
+
+        self._run_in_background("Comparing refinement methods", compare, show_summary, "Error comparing methods")
+
+    def _use_compared_prompt(self, refined_prompt: str) -> None:
+        """Copy a refined prompt from the comparison panel into the refined prompt box."""
+        self.refined_prompt_output.value = refined_prompt
+        self.tool_output.value = "Refined prompt taken from the comparison."
 
     def update_prompt(self, button):
         """Update the current prompt with the refined prompt."""
@@ -157,27 +397,37 @@ class PromptpalUI:
         self.tool_output.value = "Current prompt updated with refined prompt."
 
     def get_advice(self, button):
-        """Get advice on the current prompt from the prompt_advisor role."""
+        """Get advice on the current prompt from the prompt_advisor role, streamed into the tool output."""
+        if self.busy:
+            return
+
         current_prompt = self.prompt_input.value
 
         if not current_prompt:
             self.tool_output.value = "Error: Please enter a prompt to get advice on."
             return
 
-        try:
-            # Call the prompt_advisor role
-            self.tool_output.value = "Getting advice on prompt..."
-            advice = self.promptpal.message("prompt_advisor", f"Analyze this prompt: {current_prompt}")
+        self.tool_output.value = "Getting advice on prompt..."
+        streamed = []
+
+        def show_chunk(chunk: str) -> None:
+            streamed.append(chunk)
+            self.tool_output.value = "".join(streamed)
+
+        def advise(deadline: Deadline) -> str:
+            return self.promptpal.message(
+                "prompt_advisor", f"Analyze this prompt: {current_prompt}", on_chunk=show_chunk, deadline=deadline
+            )
 
-            # Update the tool output with the advice
+        def show_advice(advice: str, elapsed: float) -> None:
             self.tool_output.value = advice
 
-        except Exception as e:
-            self.tool_output.value = f"Error getting advice: {e!s}"
+        self._run_in_background("Getting advice", advise, show_advice, "Error getting advice")
 
     def clear(self, button):
         """Clear all inputs and outputs."""
         self.tool_output.value = ""
         self.prompt_input.value = ""
         self.refined_prompt_output.value = ""
+        self.comparison_panes.children = []
         self.tool_output.value = "All fields cleared."
@@ -0,0 +1,192 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+# Referenced text files smaller than this are sent whole even in retrieval mode
+RETRIEVAL_MIN_BYTES = 8 * 1024
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase word tokens for BM25 scoring.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list[str]: The tokens.
+    """
+    return re.findall(r"\w+", text.casefold())
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A range of lines from a file.
+
+    Attributes:
+        path: The file path.
+        start_line: The first line, counting from 1.
+        end_line: The last line, inclusive.
+        text: The lines.
+    """
+
+    path: str
+    start_line: int
+    end_line: int
+    text: str
+
+
+def chunk_text(path: str, text: str, chunk_lines: int = 40, overlap: int = 5) -> list[Chunk]:
+    """
+    Split a file's text into overlapping chunks of lines.
+
+    Args:
+        path (str): The file path, recorded in each chunk.
+        text (str): The file's text.
+        chunk_lines (int): Lines per chunk. Defaults to 40.
+        overlap (int): Lines shared by consecutive chunks. Defaults to 5.
+
+    Returns:
+        list[Chunk]: The chunks, in file order.
+
+    Raises:
+        ValueError: If the overlap is not smaller than the chunk size.
+    """
+    if not 0 <= overlap < chunk_lines:
+        raise ValueError("The chunk overlap must be at least 0 and smaller than chunk_lines.")
+    lines = text.splitlines()
+    chunks = []
+    for start in range(0, max(len(lines), 1), chunk_lines - overlap):
+        end = min(start + chunk_lines, len(lines))
+        chunks.append(Chunk(path, start + 1, end, "\n".join(lines[start:end])))
+        if end >= len(lines):
+            break
+    return chunks
+
+
+@dataclass
+class _IndexedFile:
+    digest: str
+    chunks: list[Chunk]
+    term_counts: list[Counter]
+
+
+class RetrievalIndex:
+    """
+    A local BM25 index over chunks of files, so only the parts of a file relevant to a message are sent.
+
+    Files are indexed by content hash: adding a file whose content has not changed since it was last
+    indexed reuses the existing chunks, and a changed file replaces its old chunks. Thread-safe.
+    """
+
+    def __init__(self, chunk_lines: int = 40, overlap: int = 5, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize the index.
+
+        Args:
+            chunk_lines (int): Lines per chunk. Defaults to 40.
+            overlap (int): Lines shared by consecutive chunks. Defaults to 5.
+            k1 (float): BM25 term frequency saturation. Defaults to 1.5.
+            b (float): BM25 document length normalization. Defaults to 0.75.
+        """
+        self._chunk_lines = chunk_lines
+        self._overlap = overlap
+        self._k1 = k1
+        self._b = b
+        self._files: dict[str, _IndexedFile] = {}
+        self._lock = threading.Lock()
+        self.reindexed = 0  # Number of times a file's chunks were built
+
+    @property
+    def files(self) -> list[str]:
+        """The indexed file paths."""
+        with self._lock:
+            return list(self._files)
+
+    def add_file(self, path: str | Path) -> bool:
+        """
+        Index a text file, unless its current content is already indexed.
+
+        Args:
+            path (str | Path): The file.
+
+        Returns:
+            bool: Whether the file was (re)indexed.
+        """
+        data = Path(path).read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        path = str(path)
+        with self._lock:
+            indexed = self._files.get(path)
+            if indexed is not None and indexed.digest == digest:
+                return False
+
+        chunks = chunk_text(path, data.decode("utf-8", errors="replace"), self._chunk_lines, self._overlap)
+        term_counts = [Counter(tokenize(chunk.text)) for chunk in chunks]
+        with self._lock:
+            self._files[path] = _IndexedFile(digest, chunks, term_counts)
+            self.reindexed += 1
+        return True
+
+    def search(self, query: str, top_k: int = 5, paths: list[str] | None = None) -> list[tuple[Chunk, float]]:
+        """
+        Find the chunks most relevant to a query.
+
+        Args:
+            query (str): The query, usually the chat message.
+            top_k (int): Maximum number of chunks returned. Defaults to 5.
+            paths (list[str], optional): Only search these files. Defaults to None (all indexed files).
+
+        Returns:
+            list[tuple[Chunk, float]]: The chunks with a positive BM25 score and their scores, best first.
+        """
+        with self._lock:
+            documents = [
+                (chunk, counts)
+                for path, indexed in self._files.items()
+                if paths is None or path in paths
+                for chunk, counts in zip(indexed.chunks, indexed.term_counts, strict=True)
+            ]
+        terms = set(tokenize(query))
+        if not documents or not terms:
+            return []
+
+        average_length = sum(counts.total() for _, counts in documents) / len(documents) or 1
+        document_frequency = Counter(term for _, counts in documents for term in terms if term in counts)
+        idf = {term: math.log(1 + (len(documents) - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+        scored = []
+        for chunk, counts in documents:
+            length_norm = self._k1 * (1 - self._b + self._b * counts.total() / average_length)
+            score = sum(
+                weight * counts[term] * (self._k1 + 1) / (counts[term] + length_norm)
+                for term, weight in idf.items()
+                if term in counts
+            )
+            if score > 0:
+                scored.append((chunk, score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:top_k]
+
+
+def format_chunks(chunks: list[Chunk]) -> str:
+    """
+    Render retrieved chunks as text to include in a message.
+
+    Chunks are grouped by file and shown in file order, whatever their score.
+
+    Args:
+        chunks (list[Chunk]): The chunks.
+
+    Returns:
+        str: One fenced excerpt per chunk, labeled with its file and line range.
+    """
+    ordered = sorted(chunks, key=lambda chunk: (chunk.path, chunk.start_line))
+    return "".join(
+        f"\n\nExcerpt of {chunk.path} (lines {chunk.start_line}-{chunk.end_line}):\n```\n{chunk.text}\n```\n"
+        for chunk in ordered
+    )
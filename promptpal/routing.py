@@ -0,0 +1,360 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from promptpal.roles.role_schema import ROLE_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """What the router assumes about a model before it has observed it.
+
+    Attributes:
+        name: The model name.
+        context_tokens: Maximum input tokens.
+        quality: Relative answer quality; higher is better.
+        price_per_million: USD per million input tokens.
+        base_latency: Seconds for a request with a short prompt.
+        seconds_per_1k_tokens: Extra seconds per thousand prompt tokens.
+    """
+
+    name: str
+    context_tokens: int
+    quality: int
+    price_per_million: float
+    base_latency: float
+    seconds_per_1k_tokens: float
+
+    def cost(self, prompt_tokens: int) -> float:
+        """Estimated USD cost of the prompt tokens."""
+        return prompt_tokens * self.price_per_million / 1_000_000
+
+
+# Rough public prices and latencies of the generation models allowed by role_schema.yaml
+DEFAULT_MODEL_PROFILES = {
+    profile.name: profile
+    for profile in (
+        ModelProfile("gemini-1.5-pro", 2_097_152, 4, 1.25, 1.5, 0.012),
+        ModelProfile("gemini-2.0-flash", 1_048_576, 3, 0.10, 0.6, 0.004),
+        ModelProfile("gemini-1.5-flash", 1_048_576, 2, 0.075, 0.6, 0.004),
+        ModelProfile("gemini-2.0-flash-lite-preview-02-05", 1_048_576, 2, 0.075, 0.5, 0.003),
+        ModelProfile("gemini-1.5-flash-8b", 1_048_576, 1, 0.0375, 0.4, 0.002),
+    )
+}
+
+# Error text of responses that mean the model is overloaded or rate limited
+_OVERLOAD_MARKERS = ("429", "503", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "overloaded")
+
+# Durations of the model requests made for the routed call in the current context, first finished first
+_request_latencies: ContextVar[list[float] | None] = ContextVar("promptpal_request_latencies", default=None)
+
+
+def schema_models() -> list[str]:
+    """
+    Get the models a role may use, according to role_schema.yaml.
+
+    Returns:
+        list[str]: The model names.
+    """
+    return list(ROLE_SCHEMA["properties"]["agentname"]["properties"]["model"]["enum"])
+
+
+def is_overload_error(error: Exception) -> bool:
+    """
+    Check whether an API error means the model is overloaded or rate limited.
+
+    Args:
+        error (Exception): The error.
+
+    Returns:
+        bool: Whether retrying on another model may succeed.
+    """
+    code = getattr(error, "code", None)
+    if code in (429, 503):
+        return True
+    return any(marker in str(error) for marker in _OVERLOAD_MARKERS)
+
+
+def timed_request(request: Callable[[], Any]) -> Any:
+    """
+    Make a model request, recording its duration for the routing policy that picked the model.
+
+    Only the request itself is timed, so time spent waiting for a scheduler slot does not count
+    towards a model's observed latency.
+
+    Args:
+        request (Callable): Makes the request.
+
+    Returns:
+        Any: The result of the request.
+    """
+    latencies = _request_latencies.get()
+    if latencies is None:
+        return request()
+    started = time.monotonic()
+    result = request()
+    latencies.append(time.monotonic() - started)
+    return result
+
+
+@dataclass
+class RoutedCall:
+    """The model that served a call and why.
+
+    Attributes:
+        requested_model: The role's model.
+        model: The model that served the call.
+        prompt_tokens: The estimated prompt tokens.
+        latency: Seconds the model request of the successful attempt took, or None if the attempt made no
+            request of its own (e.g. it shared an identical request already in flight).
+        fallbacks: Number of overloaded models tried before this one.
+    """
+
+    requested_model: str | None
+    model: str | None
+    prompt_tokens: int
+    latency: float | None
+    fallbacks: int = 0
+
+
+class RoutingPolicy:
+    """
+    Pick the model for each request by prompt size, latency target, cost and observed latency.
+
+    A role's model is kept when it meets the request's constraints. Otherwise the best model that fits
+    the prompt, meets the latency SLO and stays within the cost limit is used, and if none does, the
+    fastest one. Latency estimates start from each model's profile and are replaced by observed
+    latencies once enough calls have been made. A model that answers with an overload or rate limit
+    error is avoided for a cooldown period, and the call is retried on the fastest remaining model.
+
+    Example:
+        promptpal = Promptpal(routing=RoutingPolicy(latency_slo=2.0))
+        promptpal.message("analyst", "Summarize this abstract", latency_slo=1.0)
+        print(promptpal.get_routing_stats())
+    """
+
+    def __init__(
+        self,
+        models: list[str] | None = None,
+        latency_slo: float | None = None,
+        max_cost_per_call: float | None = None,
+        profiles: dict[str, ModelProfile] | None = None,
+        percentile: float = 90.0,
+        min_samples: int = 10,
+        window: int = 200,
+        overload_cooldown: float = 30.0,
+        max_fallbacks: int = 2,
+        history: int = 1000,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            models (list[str], optional): Models to route between. Defaults to None (every generation
+                model allowed by role_schema.yaml).
+            latency_slo (float, optional): Default latency target in seconds. Defaults to None (none).
+            max_cost_per_call (float, optional): Maximum estimated USD cost of a prompt. Defaults to None.
+            profiles (dict[str, ModelProfile], optional): Model profiles. Defaults to DEFAULT_MODEL_PROFILES.
+            percentile (float): Observed latency percentile used as a model's estimate. Defaults to 90.
+            min_samples (int): Observed calls needed before a model's profile latency is replaced.
+                Defaults to 10.
+            window (int): Number of recent latencies kept per model. Defaults to 200.
+            overload_cooldown (float): Seconds an overloaded model is avoided. Defaults to 30.
+            max_fallbacks (int): Maximum number of other models tried after overload errors. Defaults to 2.
+            history (int): Number of recent RoutedCall records kept. Defaults to 1000.
+
+        Raises:
+            ValueError: If a model has no profile, or the percentile is out of range.
+        """
+        if not 0.0 < percentile <= 100.0:
+            raise ValueError("percentile must be between 0 and 100.")
+        self._profiles = dict(profiles or DEFAULT_MODEL_PROFILES)
+        if models is None:
+            models = [model for model in schema_models() if model in self._profiles]
+        unknown = [model for model in models if model not in self._profiles]
+        if unknown:
+            raise ValueError(f"No profile for models: {', '.join(unknown)}.")
+
+        self.models = list(models)
+        self.latency_slo = latency_slo
+        self.max_cost_per_call = max_cost_per_call
+        self._percentile = percentile
+        self._min_samples = min_samples
+        self._overload_cooldown = overload_cooldown
+        self._max_fallbacks = max_fallbacks
+
+        self._lock = threading.Lock()
+        self._overheads = {model: deque(maxlen=window) for model in self.models}
+        self._overloaded_until = {}
+        self._served = Counter()
+        self._overloads = Counter()
+        self._fallbacks = 0
+        self.calls: deque[RoutedCall] = deque(maxlen=history)
+
+    def estimate_latency(self, model: str, prompt_tokens: int) -> float:
+        """
+        Estimate how long a model takes to answer a prompt.
+
+        Args:
+            model (str): The model.
+            prompt_tokens (int): The estimated prompt tokens.
+
+        Returns:
+            float: Seconds. The profile's latency until enough calls have been observed, then the observed
+                latency percentile, both adjusted for the prompt size.
+        """
+        profile = self._profiles[model]
+        size_latency = prompt_tokens / 1000 * profile.seconds_per_1k_tokens
+        with self._lock:
+            overheads = sorted(self._overheads.get(model, ()))
+        if len(overheads) < self._min_samples:
+            return profile.base_latency + size_latency
+        index = min(len(overheads) - 1, math.ceil(self._percentile / 100.0 * len(overheads)) - 1)
+        return overheads[index] + size_latency
+
+    def route(
+        self,
+        requested_model: str | None,
+        prompt_tokens: int,
+        latency_slo: float | None = None,
+        exclude: list[str] | tuple[str, ...] = (),
+    ) -> str | None:
+        """
+        Pick the model for a request.
+
+        Args:
+            requested_model (str, optional): The role's model, if it has one.
+            prompt_tokens (int): The estimated prompt tokens.
+            latency_slo (float, optional): Latency target in seconds. Defaults to the policy's.
+            exclude (list[str]): Models not to use, e.g. ones that just failed. When given, the fastest
+                remaining model is picked.
+
+        Returns:
+            str | None: The model. The requested model if no model fits the prompt.
+        """
+        latency_slo = self.latency_slo if latency_slo is None else latency_slo
+        now = time.monotonic()
+        with self._lock:
+            overloaded = {model for model, until in self._overloaded_until.items() if until > now}
+        candidates = [
+            model
+            for model in self.models
+            if model not in exclude
+            and model not in overloaded
+            and prompt_tokens <= self._profiles[model].context_tokens
+        ]
+        if not candidates:
+            # Every model is excluded or cooling down; try the least recently overloaded one
+            remaining = [model for model in self.models if model not in exclude]
+            if not remaining:
+                return requested_model
+            with self._lock:
+                return min(remaining, key=lambda model: self._overloaded_until.get(model, 0.0))
+
+        estimates = {model: self.estimate_latency(model, prompt_tokens) for model in candidates}
+        if exclude:
+            return min(candidates, key=estimates.get)
+
+        def acceptable(model: str) -> bool:
+            within_slo = latency_slo is None or estimates[model] <= latency_slo
+            within_cost = (
+                self.max_cost_per_call is None or self._profiles[model].cost(prompt_tokens) <= self.max_cost_per_call
+            )
+            return within_slo and within_cost
+
+        if requested_model in candidates and acceptable(requested_model):
+            return requested_model
+        unconstrained = latency_slo is None and self.max_cost_per_call is None
+        if requested_model is not None and requested_model not in self._profiles and unconstrained:
+            return requested_model  # Nothing is known about the model to route away from
+        acceptable_models = [model for model in candidates if acceptable(model)]
+        if acceptable_models:
+            return max(
+                acceptable_models,
+                key=lambda model: (self._profiles[model].quality, -self._profiles[model].price_per_million),
+            )
+        return min(candidates, key=estimates.get)
+
+    def run(
+        self,
+        requested_model: str | None,
+        prompt_tokens: int,
+        call: Callable[[str], Any],
+        latency_slo: float | None = None,
+    ) -> Any:
+        """
+        Route a call, falling back to faster models while the chosen ones are overloaded.
+
+        Args:
+            requested_model (str, optional): The role's model, if it has one.
+            prompt_tokens (int): The estimated prompt tokens.
+            call (Callable): Makes the request, given the model to use. The model request itself should be
+                made through timed_request(), so that only its duration counts as the model's latency.
+            latency_slo (float, optional): Latency target in seconds. Defaults to the policy's.
+
+        Returns:
+            Any: The result of the call.
+
+        Raises:
+            Exception: The error of the last attempt if it was not an overload, or no fallbacks remain.
+        """
+        tried = []
+        while True:
+            model = self.route(requested_model, prompt_tokens, latency_slo, exclude=tried)
+            latencies = []
+            token = _request_latencies.set(latencies)
+            try:
+                result = call(model)
+            except Exception as e:
+                if not is_overload_error(e) or len(tried) >= self._max_fallbacks or model in tried:
+                    raise
+                logger.warning(f"Model {model} is overloaded. Falling back to a faster model: {e!s}")
+                self._mark_overloaded(model)
+                tried.append(model)
+                continue
+            finally:
+                _request_latencies.reset(token)
+
+            latency = latencies[0] if latencies else None
+            self._observe(RoutedCall(requested_model, model, prompt_tokens, latency, len(tried)))
+            return result
+
+    def _mark_overloaded(self, model: str) -> None:
+        with self._lock:
+            self._overloaded_until[model] = time.monotonic() + self._overload_cooldown
+            self._overloads[model] += 1
+
+    def _observe(self, routed: RoutedCall) -> None:
+        profile = self._profiles.get(routed.model)
+        with self._lock:
+            self.calls.append(routed)
+            self._served[routed.model] += 1
+            self._fallbacks += routed.fallbacks
+            if profile is not None and routed.model in self._overheads and routed.latency is not None:
+                size_latency = routed.prompt_tokens / 1000 * profile.seconds_per_1k_tokens
+                self._overheads[routed.model].append(max(0.0, routed.latency - size_latency))
+
+    def stats(self) -> dict:
+        """
+        Get routing statistics.
+
+        Returns:
+            dict: Calls served per model, overload errors per model, the number of fallbacks, and the
+                current latency estimate of each model for a short prompt.
+        """
+        with self._lock:
+            served, overloads, fallbacks = dict(self._served), dict(self._overloads), self._fallbacks
+        return {
+            "served": served,
+            "overloads": overloads,
+            "fallbacks": fallbacks,
+            "estimated_latency": {model: self.estimate_latency(model, 0) for model in self.models},
+        }
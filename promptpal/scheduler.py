@@ -0,0 +1,289 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from typing import Any
+
+from promptpal.deadline import Deadline, PromptpalTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(Enum):
+    """Priority classes of model requests."""
+
+    INTERACTIVE = "interactive"
+    NORMAL = "normal"
+    BATCH = "batch"
+
+
+# Share of the model call slots each class gets while all classes have requests waiting
+DEFAULT_WEIGHTS = {Priority.INTERACTIVE: 8, Priority.NORMAL: 4, Priority.BATCH: 1}
+
+# Maximum number of waiting requests per class; None means unbounded
+DEFAULT_MAX_QUEUED = {Priority.INTERACTIVE: None, Priority.NORMAL: 256, Priority.BATCH: 64}
+
+# Priority of the model calls made in the current context, if set with request_priority()
+_current_priority: ContextVar[Priority | None] = ContextVar("promptpal_request_priority", default=None)
+
+
+class QueueFullError(Exception):
+    """Raised when a priority class's queue stays full for longer than the scheduler allows."""
+
+
+@contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """
+    Give every model call made by Promptpal within the block the given priority.
+
+    Like usage tracking, the priority applies to the current thread (or asyncio task) and to the
+    threads Promptpal starts on its behalf.
+
+    Example:
+        with request_priority(Priority.BATCH):
+            promptpal.message("analyst", "Classify this abstract")
+
+    Args:
+        priority (Priority): The priority.
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority(default: Priority) -> Priority:
+    """
+    Get the priority of model calls made in the current context.
+
+    Args:
+        default (Priority): The priority if none was set with request_priority().
+
+    Returns:
+        Priority: The priority.
+    """
+    priority = _current_priority.get()
+    return default if priority is None else priority
+
+
+class _Ticket:
+    __slots__ = ("enqueued_at", "granted")
+
+    def __init__(self):
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class _ClassStats:
+    def __init__(self, window: int):
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.queue_times = deque(maxlen=window)
+
+
+class RequestScheduler:
+    """
+    Limit concurrent model calls and share the slots between priority classes by weighted fair queuing.
+
+    Calls beyond ``max_concurrency`` wait in one queue per priority class. When a slot frees up, it goes
+    to the waiting class that has received the least service relative to its weight, so with the default
+    weights interactive requests get 8 slots for every slot of batch work while both are waiting, and
+    batch work uses every slot nobody else needs. Queues are bounded: a caller whose class queue is full
+    waits for space (backpressure) up to ``queue_full_timeout`` and then gets a QueueFullError.
+
+    Example:
+        scheduler = RequestScheduler(max_concurrency=4)
+        promptpal = Promptpal(scheduler=scheduler)
+        ...
+        print(scheduler.stats()["batch"]["queue_time_p95"])
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        weights: dict[Priority, float] | None = None,
+        max_queued: dict[Priority, int | None] | None = None,
+        queue_full_timeout: float | None = None,
+        window: int = 1000,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrency (int): Maximum number of model calls running at once. Defaults to 8.
+            weights (dict[Priority, float], optional): Relative share of slots per class. Defaults to
+                DEFAULT_WEIGHTS.
+            max_queued (dict[Priority, int | None], optional): Maximum waiting calls per class, None for
+                unbounded. Defaults to DEFAULT_MAX_QUEUED.
+            queue_full_timeout (float, optional): Seconds to wait for space in a full queue before raising
+                QueueFullError. Defaults to None (wait as long as it takes).
+            window (int): Number of recent queue times kept per class. Defaults to 1000.
+
+        Raises:
+            ValueError: If max_concurrency is less than 1 or a weight is not positive.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        if any(weight <= 0 for weight in weights.values()):
+            raise ValueError("Priority weights must be positive.")
+
+        self.max_concurrency = max_concurrency
+        self._weights = weights
+        self._max_queued = {**DEFAULT_MAX_QUEUED, **(max_queued or {})}
+        self._queue_full_timeout = queue_full_timeout
+
+        self._condition = threading.Condition()
+        self._queues = {priority: deque() for priority in Priority}
+        self._passes = dict.fromkeys(Priority, 0.0)  # Service received by each class, divided by its weight
+        self._virtual_time = 0.0
+        self._in_flight = 0
+        self._stats = {priority: _ClassStats(window) for priority in Priority}
+
+    def run(
+        self,
+        call: Callable[[], Any],
+        priority: Priority = Priority.NORMAL,
+        timeout: float | None = None,
+        deadline: Deadline | None = None,
+    ) -> Any:
+        """
+        Run a model call once a slot is free.
+
+        Args:
+            call (Callable): The model call.
+            priority (Priority): The call's priority class. Defaults to NORMAL.
+            timeout (float, optional): Maximum seconds to wait in the queue. Defaults to None (no limit).
+            deadline (Deadline, optional): The deadline of the request the call belongs to. The call waits
+                in the queue no longer than the deadline allows, and is dropped instead of run if the
+                deadline passes or the request is cancelled before it gets a slot. Defaults to None.
+
+        Returns:
+            Any: The result of the call.
+
+        Raises:
+            QueueFullError: If the class's queue stays full for longer than queue_full_timeout.
+            PromptpalTimeoutError: If the call waits in the queue for longer than the timeout, or its
+                deadline passes first.
+            CallCancelledError: If the request is cancelled while the call waits in the queue.
+        """
+        if deadline is not None and deadline.remaining() is not None:
+            timeout = deadline.remaining() if timeout is None else min(timeout, deadline.remaining())
+        self._acquire(priority, timeout, deadline)
+        try:
+            return call()
+        finally:
+            self._release(priority)
+
+    def _acquire(self, priority: Priority, timeout: float | None, deadline: Deadline | None) -> None:
+        stats = self._stats[priority]
+        queue = self._queues[priority]
+        limit = self._max_queued.get(priority)
+        with self._condition:
+            stats.submitted += 1
+
+            # Backpressure: wait for space in a full queue
+            if limit is not None and len(queue) >= limit:
+                logger.debug(f"The {priority.value} queue is full ({limit} requests). Waiting for space.")
+                has_space = self._condition.wait_for(lambda: len(queue) < limit, timeout=self._queue_full_timeout)
+                if not has_space:
+                    stats.rejected += 1
+                    raise QueueFullError(f"The {priority.value} request queue is full ({limit} requests).")
+
+            ticket = _Ticket()
+            if not queue:
+                # A class that was idle does not get credit for the time it had nothing to send
+                self._passes[priority] = max(self._passes[priority], self._virtual_time)
+            queue.append(ticket)
+            self._dispatch()
+
+            # Cancellation is noticed whenever the scheduler wakes waiting callers
+            def ready() -> bool:
+                return ticket.granted or (deadline is not None and deadline.cancelled)
+
+            if not self._condition.wait_for(ready, timeout=timeout):
+                queue.remove(ticket)
+                stats.timed_out += 1
+                self._condition.notify_all()  # There is space in the queue again
+                raise PromptpalTimeoutError(f"Timed out after {timeout}s waiting for a {priority.value} request slot.")
+
+            if deadline is not None and deadline.exceeded:
+                # Nobody is waiting for the result any more, so do not spend a model call on it
+                if ticket.granted:
+                    self._in_flight -= 1
+                    self._dispatch()
+                else:
+                    queue.remove(ticket)
+                    self._condition.notify_all()
+                if deadline.cancelled:
+                    stats.cancelled += 1
+                else:
+                    stats.timed_out += 1
+                deadline.check(f"the wait for a {priority.value} request slot")
+            stats.queue_times.append(time.monotonic() - ticket.enqueued_at)
+
+    def _release(self, priority: Priority) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._stats[priority].completed += 1
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting tickets, the class with the least weighted service first."""
+        granted = False
+        while self._in_flight < self.max_concurrency:
+            waiting = [priority for priority in Priority if self._queues[priority]]
+            if not waiting:
+                break
+            # Ties go to the more important class, in the order Priority lists them
+            priority = min(waiting, key=lambda p: self._passes[p])
+            ticket = self._queues[priority].popleft()
+            ticket.granted = True
+            self._in_flight += 1
+            self._virtual_time = self._passes[priority]
+            self._passes[priority] += 1.0 / self._weights[priority]
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        """
+        Get queue statistics.
+
+        Returns:
+            dict: The calls in flight, and per priority class the calls waiting, submitted, completed,
+                rejected because the queue was full, timed out in the queue and cancelled in the queue,
+                and the mean, median, 95th percentile and maximum seconds spent waiting for a slot.
+        """
+        with self._condition:
+            result = {"in_flight": self._in_flight, "max_concurrency": self.max_concurrency}
+            for priority, stats in self._stats.items():
+                queue_times = sorted(stats.queue_times)
+                result[priority.value] = {
+                    "queued": len(self._queues[priority]),
+                    "submitted": stats.submitted,
+                    "completed": stats.completed,
+                    "rejected": stats.rejected,
+                    "timed_out": stats.timed_out,
+                    "cancelled": stats.cancelled,
+                    "queue_time_mean": sum(queue_times) / len(queue_times) if queue_times else 0.0,
+                    "queue_time_p50": _percentile(queue_times, 50.0),
+                    "queue_time_p95": _percentile(queue_times, 95.0),
+                    "queue_time_max": queue_times[-1] if queue_times else 0.0,
+                }
+            return result
+
+
+def _percentile(ordered: list[float], percentile: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, math.ceil(percentile / 100.0 * len(ordered)) - 1)]
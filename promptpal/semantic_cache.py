@@ -0,0 +1,284 @@
+import logging
+import os
+import tempfile
+import threading
+from collections.abc import Callable, Sequence
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without the optional dependency
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Embedding model listed in role_schema.yaml
+DEFAULT_EMBEDDING_MODEL = "text-embedding-004"
+
+
+class GeminiEmbedder:
+    """Embed text with a Gemini embedding model."""
+
+    def __init__(self, client, model: str = DEFAULT_EMBEDDING_MODEL):
+        """
+        Initialize the embedder.
+
+        Args:
+            client: The genai client to embed with.
+            model (str): The embedding model. Defaults to "text-embedding-004".
+        """
+        self._client = client
+        self._model = model
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        response = self._client.models.embed_content(model=self._model, contents=texts)
+        return [embedding.values for embedding in response.embeddings]
+
+
+class _Partition:
+    """The cached entries of a single role, stored as rows of a unit-normalized vector matrix."""
+
+    def __init__(self, dim: int, capacity: int, dtype, mmap_path: Path | None):
+        if mmap_path is not None:
+            # Preallocate the full capacity on disk so vectors live outside the Python heap
+            self.vectors = np.lib.format.open_memmap(mmap_path, mode="w+", dtype=dtype, shape=(capacity, dim))
+        else:
+            self.vectors = np.empty((min(capacity, 64), dim), dtype=dtype)
+        self.mmap_path = mmap_path
+        self.capacity = capacity
+        self.prompts = []
+        self.responses = []
+        self.last_used = []
+
+    @property
+    def size(self) -> int:
+        return len(self.responses)
+
+    def entry_bytes(self, index: int) -> int:
+        return self.vectors.itemsize * self.vectors.shape[1] + len(self.prompts[index]) + len(self.responses[index])
+
+    def append(self, vector, prompt: str, response: str, clock: int) -> None:
+        if self.size == len(self.vectors):
+            # Grow in-memory storage geometrically up to the partition capacity
+            grown = np.empty((min(self.capacity, len(self.vectors) * 2), self.vectors.shape[1]), self.vectors.dtype)
+            grown[: self.size] = self.vectors[: self.size]
+            self.vectors = grown
+        self.vectors[self.size] = vector
+        self.prompts.append(prompt)
+        self.responses.append(response)
+        self.last_used.append(clock)
+
+    def remove(self, index: int) -> int:
+        # Move the last row into the freed slot so the live rows stay contiguous
+        freed = self.entry_bytes(index)
+        last = self.size - 1
+        if index != last:
+            self.vectors[index] = self.vectors[last]
+            self.prompts[index] = self.prompts[last]
+            self.responses[index] = self.responses[last]
+            self.last_used[index] = self.last_used[last]
+        self.prompts.pop()
+        self.responses.pop()
+        self.last_used.pop()
+        return freed
+
+    def least_recently_used(self) -> int:
+        return min(range(self.size), key=self.last_used.__getitem__)
+
+    def release(self) -> None:
+        # Drop the mapping before deleting its file; on Windows a mapped file cannot be removed
+        self.vectors = None
+        if self.mmap_path is not None:
+            try:
+                self.mmap_path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"Could not delete semantic cache file {self.mmap_path}: {e!s}")
+
+
+class SemanticCache:
+    """
+    A response cache that matches prompts by embedding similarity instead of exact text.
+
+    Prompts are embedded and compared by cosine similarity against the cached prompts of the same role.
+    A cached response is returned when the best match is at or above the similarity threshold. Each role
+    has its own partition holding at most max_entries_per_role entries, and max_bytes optionally bounds
+    the total size of all partitions. The least recently used entries are evicted first.
+
+    Requires NumPy (``pip install promptpal[semantic]``).
+    """
+
+    def __init__(
+        self,
+        embedder: Callable[[list[str]], Sequence[Sequence[float]]] | None = None,
+        threshold: float = 0.92,
+        max_entries_per_role: int = 10000,
+        max_bytes: int | None = None,
+        mmap_dir: str | Path | None = None,
+        dtype: str = "float32",
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            embedder (Callable, optional): Maps a list of texts to a list of vectors. When used with
+                Promptpal, defaults to a GeminiEmbedder on the Promptpal client.
+            threshold (float): Minimum cosine similarity for a cache hit. Defaults to 0.92.
+            max_entries_per_role (int): Maximum number of entries per role. Defaults to 10000.
+            max_bytes (int, optional): Maximum total size of vectors, prompts and responses. Defaults to None.
+            mmap_dir (str | Path, optional): Directory for memory-mapped vector storage. Each role's
+                vectors are preallocated in a .npy file of their own there instead of held in memory, so
+                several caches can share the directory. The files are deleted by clear() and close().
+                Defaults to None.
+            dtype (str): Vector storage type. Defaults to "float32".
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        if np is None:
+            raise ImportError("SemanticCache requires NumPy. Install it with 'pip install promptpal[semantic]'.")
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1].")
+
+        self.embedder = embedder
+        self.threshold = threshold
+        self._max_entries = max_entries_per_role
+        self._max_bytes = max_bytes
+        self._mmap_dir = Path(mmap_dir) if mmap_dir is not None else None
+        self._dtype = np.dtype(dtype)
+        self._partitions = {}
+        self._bytes = 0
+        self._clock = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def embed(self, text: str):
+        """
+        Embed a prompt as a unit-normalized vector.
+
+        Args:
+            text (str): The prompt.
+
+        Returns:
+            numpy.ndarray: The normalized embedding.
+        """
+        if self.embedder is None:
+            raise ValueError("SemanticCache has no embedder configured.")
+        vector = np.asarray(self.embedder([text])[0], dtype=self._dtype)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, role: str, vector) -> str | None:
+        """
+        Find a cached response for a prompt embedding.
+
+        Args:
+            role (str): The role partition to search.
+            vector (numpy.ndarray): The normalized prompt embedding from embed().
+
+        Returns:
+            str | None: The cached response of the most similar prompt, or None if nothing is similar enough.
+        """
+        with self._lock:
+            partition = self._partitions.get(role)
+            if partition is None or partition.size == 0 or partition.vectors.shape[1] != vector.shape[0]:
+                self._misses += 1
+                return None
+
+            similarities = partition.vectors[: partition.size] @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self._misses += 1
+                return None
+
+            self._clock += 1
+            partition.last_used[best] = self._clock
+            self._hits += 1
+            return partition.responses[best]
+
+    def put(self, role: str, vector, prompt: str, response: str) -> None:
+        """
+        Cache a response.
+
+        Args:
+            role (str): The role partition to store the entry in.
+            vector (numpy.ndarray): The normalized prompt embedding from embed().
+            prompt (str): The prompt.
+            response (str): The response to cache.
+        """
+        with self._lock:
+            partition = self._partitions.get(role)
+            if partition is None or partition.vectors.shape[1] != vector.shape[0]:
+                if partition is not None:
+                    logger.warning(f"Embedding size changed for role '{role}'; clearing its cache partition.")
+                    self._drop(partition)
+                mmap_path = None
+                if self._mmap_dir is not None:
+                    self._mmap_dir.mkdir(parents=True, exist_ok=True)
+                    # A unique file per partition, so caches sharing the directory never overwrite each other
+                    fd, name = tempfile.mkstemp(dir=self._mmap_dir, prefix="semantic_", suffix=".npy")
+                    os.close(fd)
+                    mmap_path = Path(name)
+                partition = _Partition(vector.shape[0], self._max_entries, self._dtype, mmap_path)
+                self._partitions[role] = partition
+
+            if partition.size >= self._max_entries:
+                self._evict_from(partition)
+
+            self._clock += 1
+            partition.append(vector, prompt, response, self._clock)
+            self._bytes += partition.entry_bytes(partition.size - 1)
+
+            # Evict the least recently used entries across all roles until within the size budget
+            while self._max_bytes is not None and self._bytes > self._max_bytes and self._entry_count() > 1:
+                oldest = min(
+                    (p for p in self._partitions.values() if p.size),
+                    key=lambda p: p.last_used[p.least_recently_used()],
+                )
+                self._evict_from(oldest)
+
+    def _evict_from(self, partition: _Partition) -> None:
+        self._bytes -= partition.remove(partition.least_recently_used())
+        self._evictions += 1
+
+    def _drop(self, partition: _Partition) -> None:
+        self._bytes -= sum(partition.entry_bytes(i) for i in range(partition.size))
+        partition.release()
+
+    def _entry_count(self) -> int:
+        return sum(partition.size for partition in self._partitions.values())
+
+    def clear(self, role: str | None = None) -> None:
+        """
+        Remove cached entries, deleting their memory-mapped files.
+
+        Args:
+            role (str, optional): Only clear this role's partition. Defaults to None (clear everything).
+        """
+        with self._lock:
+            roles = [role] if role is not None else list(self._partitions)
+            for name in roles:
+                partition = self._partitions.pop(name, None)
+                if partition is not None:
+                    self._drop(partition)
+
+    def close(self) -> None:
+        """Remove every cached entry and delete the memory-mapped files."""
+        self.clear()
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Hits, misses, evictions, the number of entries per role and the approximate size in bytes.
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "entries": {role: partition.size for role, partition in self._partitions.items()},
+                "bytes": self._bytes,
+            }
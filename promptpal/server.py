@@ -0,0 +1,242 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from promptpal.promptpal import Promptpal, PromptRefinementType
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    """A chat session held by the server."""
+
+    def __init__(self, promptpal: Promptpal):
+        self.promptpal = promptpal
+        self.lock = threading.Lock()  # Requests to the same session are handled one at a time
+        self.last_used = time.monotonic()
+
+
+class SessionRegistry:
+    """
+    Chat sessions keyed by session id, all sharing one Promptpal's client, roles and caches.
+
+    The least recently used sessions are evicted once max_sessions is exceeded, and sessions idle for
+    longer than idle_timeout seconds are dropped when new sessions are created.
+    """
+
+    def __init__(self, promptpal: Promptpal, max_sessions: int = 1000, idle_timeout: float | None = 3600.0):
+        """
+        Initialize the registry.
+
+        Args:
+            promptpal (Promptpal): The shared instance sessions are created from.
+            max_sessions (int): Maximum number of sessions to keep. Defaults to 1000.
+            idle_timeout (float, optional): Seconds after which idle sessions are dropped. Defaults to 3600.
+        """
+        self._promptpal = promptpal
+        self._max_sessions = max_sessions
+        self._idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str | None) -> tuple[str, _Session]:
+        """
+        Get a session, creating it if it does not exist.
+
+        Args:
+            session_id (str, optional): The session id. A new id is generated if None.
+
+        Returns:
+            tuple[str, _Session]: The session id and the session.
+        """
+        with self._lock:
+            if session_id is None:
+                session_id = uuid.uuid4().hex
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._evict()
+                session = _Session(self._promptpal.session())
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            return session_id, session
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Delete a session.
+
+        Args:
+            session_id (str): The session id.
+
+        Returns:
+            bool: Whether the session existed.
+        """
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _evict(self) -> None:
+        if self._idle_timeout is not None:
+            cutoff = time.monotonic() - self._idle_timeout
+            for session_id in [sid for sid, s in self._sessions.items() if s.last_used < cutoff]:
+                del self._sessions[session_id]
+        while len(self._sessions) >= self._max_sessions:
+            self._sessions.popitem(last=False)
+
+
+class PromptpalRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler exposing chat, message and refine endpoints.
+
+    All endpoints take and return JSON. Passing ``"stream": true`` to /chat or /message returns
+    newline-delimited JSON instead: one ``{"chunk": ...}`` object per chunk of text, followed by a final
+    object with ``"done": true`` and the full response.
+    """
+
+    protocol_version = "HTTP/1.1"  # Needed for chunked streaming responses
+    server: "PromptpalServer"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok", "sessions": len(self.server.sessions)})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path '{self.path}'."})
+
+    def do_DELETE(self):
+        prefix = "/sessions/"
+        if self.path.startswith(prefix) and self.server.sessions.delete(self.path[len(prefix) :]):
+            self._send_json(HTTPStatus.OK, {"deleted": True})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Session not found."})
+
+    def do_POST(self):
+        routes = {"/chat": self._chat, "/message": self._message, "/refine": self._refine}
+        route = routes.get(self.path)
+        if route is None:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path '{self.path}'."})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object.")
+            route(body)
+        except (ValueError, KeyError) as e:
+            # Bad requests, unknown roles and unknown refinement types
+            message = f"Missing field {e!s}" if isinstance(e, KeyError) else str(e)
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": message})
+        except Exception as e:
+            logger.error(f"Error handling {self.path}: {e!s}")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e!s}"})
+
+    def _chat(self, body: dict) -> None:
+        session_id, session = self.server.sessions.get(body.get("session_id"))
+        kwargs = {"write_output": False, "write_code": bool(body.get("write_code", False))}
+        with session.lock:
+            if body.get("stream"):
+                self._stream(
+                    lambda on_chunk: session.promptpal.chat(body["role"], body["message"], on_chunk=on_chunk, **kwargs),
+                    {"session_id": session_id},
+                )
+            else:
+                response = session.promptpal.chat(body["role"], body["message"], **kwargs)
+                self._send_json(HTTPStatus.OK, {"session_id": session_id, "response": response})
+
+    def _message(self, body: dict) -> None:
+        promptpal = self.server.promptpal
+        if body.get("stream"):
+            self._stream(lambda on_chunk: promptpal.message(body["role"], body["message"], on_chunk=on_chunk), {})
+        else:
+            self._send_json(HTTPStatus.OK, {"response": promptpal.message(body["role"], body["message"])})
+
+    def _refine(self, body: dict) -> None:
+        refinement_type = PromptRefinementType(body["refinement_type"])
+        refined = self.server.promptpal.refine_prompt(body["prompt"], refinement_type, bool(body.get("structured")))
+        self._send_json(HTTPStatus.OK, {"refined_prompt": refined})
+
+    def _send_json(self, status: HTTPStatus, payload: dict) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, run, extra: dict) -> None:
+        """Run a streaming call, writing each chunk as a line of newline-delimited JSON."""
+        started = False
+
+        def write_line(payload: dict) -> None:
+            nonlocal started
+            if not started:
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                started = True
+            data = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            response = run(lambda text: write_line({"chunk": text}))
+        except Exception as e:
+            if not started:
+                raise
+            # Headers are already sent, so report the failure in the stream itself
+            logger.error(f"Error while streaming {self.path}: {e!s}")
+            write_line({"done": True, "error": f"{type(e).__name__}: {e!s}", **extra})
+        else:
+            write_line({"done": True, "response": response, **extra})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class PromptpalServer(ThreadingHTTPServer):
+    """
+    A local HTTP server sharing one Promptpal instance across many clients.
+
+    Each request is handled on its own thread. Stateless /message and /refine requests use the shared
+    instance directly, and /chat requests use per-session chats created from it, so every client shares
+    the same client connection pool, role registry and caches.
+
+    Example:
+        server = PromptpalServer(Promptpal(vertexai=False), port=8080)
+        server.serve_forever()
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        promptpal: Promptpal,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        max_sessions: int = 1000,
+        idle_timeout: float | None = 3600.0,
+    ):
+        """
+        Initialize the server and bind it to the given address.
+
+        Args:
+            promptpal (Promptpal): The shared instance.
+            host (str): Address to bind. Defaults to "127.0.0.1".
+            port (int): Port to bind, or 0 for any free port. Defaults to 8080.
+            max_sessions (int): Maximum number of chat sessions to keep. Defaults to 1000.
+            idle_timeout (float, optional): Seconds after which idle sessions are dropped. Defaults to 3600.
+        """
+        self.promptpal = promptpal
+        self.sessions = SessionRegistry(promptpal, max_sessions=max_sessions, idle_timeout=idle_timeout)
+        super().__init__((host, port), PromptpalRequestHandler)
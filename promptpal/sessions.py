@@ -0,0 +1,179 @@
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+
+SESSION_FORMAT_VERSION = 1
+
+# Record types in a session file. Keys are kept short because long sessions contain many records.
+META = "meta"  # {"t": "meta", "v": 1, "model": str}
+TURN = "turn"  # {"t": "turn", "r": "user" | "model", "x": str}
+STATS = "stats"  # {"t": "stats", "role": str | None, "tokens": int, "messages": int, "per_role": dict}
+RESET = "reset"  # {"t": "reset"} - the history recorded before this record was replaced (older files only)
+
+
+@dataclass
+class SessionData:
+    """The state restored from a session file.
+
+    Attributes:
+        model: The model of the saved chat.
+        history: The (role, text) turns of the chat history, oldest first.
+        role_name: The role used for the most recent chat message, if any.
+        token_count: Total tokens used in the session.
+        message_count: Number of chat messages sent in the session.
+        role_message_count: Number of chat messages sent per role.
+        truncated: Whether only the tail of the history was loaded.
+    """
+
+    model: str
+    history: list[tuple[str, str]] = field(default_factory=list)
+    role_name: str | None = None
+    token_count: int = 0
+    message_count: int = 0
+    role_message_count: dict[str, int] = field(default_factory=dict)
+    truncated: bool = False
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _loads(line: str) -> dict:
+    # An interrupted write can leave a truncated final line; treat it as absent
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return {"t": None}
+
+
+def append_session_records(
+    path: str | Path,
+    model: str,
+    history: list[tuple[str, str]],
+    stats: dict,
+    reset: bool = False,
+) -> None:
+    """
+    Append history turns and a stats snapshot to a session file, creating it if needed.
+
+    When the turns replace the recorded history, the file is rewritten atomically instead, so a chat whose
+    history is replaced on every turn (e.g. by history trimming) does not grow the file without bound.
+
+    Args:
+        path (str | Path): The session file.
+        model (str): The chat model, written to the header of a new file.
+        history (list[tuple[str, str]]): The (role, text) turns to append.
+        stats (dict): Counters to record, superseding earlier snapshots.
+        reset (bool): Whether the turns replace the history recorded so far. Defaults to False.
+    """
+    path = Path(path)
+    rewrite = reset or not path.exists() or path.stat().st_size == 0
+    records = [_dumps({"t": META, "v": SESSION_FORMAT_VERSION, "model": model})] if rewrite else []
+    records.extend(_dumps({"t": TURN, "r": role, "x": text}) for role, text in history)
+    records.append(_dumps({"t": STATS, **stats}))
+
+    if not rewrite:
+        with open(path, "a", encoding="utf-8") as handle:
+            handle.writelines(records)
+        return
+
+    # Write to a temporary file in the same directory, then rename it into place
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp_", suffix=path.suffix)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+            temp_file.writelines(records)
+        os.replace(temp_path, path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
+def _iter_lines_reversed(path: Path, block_size: int = 1 << 16):
+    """Yield the lines of a file from last to first without reading the whole file."""
+    with open(path, "rb") as handle:
+        handle.seek(0, os.SEEK_END)
+        position = handle.tell()
+        remainder = b""
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            handle.seek(position)
+            lines = (handle.read(read_size) + remainder).split(b"\n")
+            # The first piece may be the end of a line that starts in an earlier block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode("utf-8")
+        if remainder.strip():
+            yield remainder.decode("utf-8")
+
+
+def read_session(path: str | Path, tail: int | None = None) -> SessionData:
+    """
+    Read a session file.
+
+    Args:
+        path (str | Path): The session file.
+        tail (int, optional): Only load the most recent number of history turns. The file is then read
+            backwards from the end, so very long sessions load in time proportional to the tail.
+            Defaults to None (load the full history).
+
+    Returns:
+        SessionData: The restored session state.
+
+    Raises:
+        FileNotFoundError: If the session file does not exist.
+        ValueError: If the file is not a promptpal session file.
+    """
+    path = Path(path)
+    with open(path, encoding="utf-8") as handle:
+        header = json.loads(handle.readline() or "{}")
+    if header.get("t") != META:
+        raise ValueError(f"{path} is not a promptpal session file.")
+    if header.get("v", 0) > SESSION_FORMAT_VERSION:
+        raise ValueError(f"Session file {path} was written by a newer version of promptpal.")
+
+    session = SessionData(model=header["model"])
+    stats = None
+    turns = []
+
+    if tail is None:
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                record = _loads(line)
+                if record["t"] == TURN:
+                    turns.append((record["r"], record["x"]))
+                elif record["t"] == RESET:
+                    turns = []
+                elif record["t"] == STATS:
+                    stats = record
+    else:
+        # Walk backwards, collecting the latest stats and turns until the tail is full or a reset is hit
+        for line in _iter_lines_reversed(path):
+            record = _loads(line)
+            if record["t"] == STATS and stats is None:
+                stats = record
+            elif record["t"] == TURN:
+                if len(turns) == tail:
+                    session.truncated = True
+                    if stats is not None:
+                        break
+                    continue
+                turns.append((record["r"], record["x"]))
+            elif record["t"] in (RESET, META):
+                break
+        turns.reverse()
+        # A chat history has to start with a user turn
+        while turns and turns[0][0] != "user":
+            turns.pop(0)
+
+    session.history = turns
+    if stats is not None:
+        session.role_name = stats.get("role")
+        session.token_count = stats.get("tokens", 0)
+        session.message_count = stats.get("messages", 0)
+        session.role_message_count = dict(stats.get("per_role", {}))
+
+    return session
@@ -0,0 +1,75 @@
+import itertools
+import math
+import re
+import threading
+from collections import Counter
+
+
+def prompt_similarity(a: str, b: str) -> float:
+    """
+    Measure how similar two prompts are, locally and without any API calls.
+
+    Uses the cosine similarity of the prompts' word and word-bigram counts, so prompts with the same
+    wording score close to 1 and unrelated prompts close to 0.
+
+    Args:
+        a (str): The first prompt.
+        b (str): The second prompt.
+
+    Returns:
+        float: The similarity, between 0 and 1.
+    """
+    counts_a, counts_b = _features(a), _features(b)
+    if not counts_a or not counts_b:
+        return 1.0 if counts_a == counts_b else 0.0
+    dot = sum(count * counts_b[feature] for feature, count in counts_a.items())
+    norm = math.sqrt(sum(c * c for c in counts_a.values())) * math.sqrt(sum(c * c for c in counts_b.values()))
+    return dot / norm
+
+
+def _features(text: str) -> Counter:
+    words = re.findall(r"\w+", text.casefold())
+    return Counter(words) + Counter(itertools.pairwise(words))
+
+
+class SpeculationStats:
+    """Thread-safe counters for speculative answers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._attempts = 0
+        self._accepted = 0
+        self._wasted_tokens = 0
+
+    def record(self, accepted: bool) -> None:
+        """
+        Record the outcome of a speculative answer.
+
+        Args:
+            accepted (bool): Whether the speculative answer was kept.
+        """
+        with self._lock:
+            self._attempts += 1
+            self._accepted += int(accepted)
+
+    def add_wasted_tokens(self, tokens: int) -> None:
+        """Record the tokens spent on a discarded speculative answer."""
+        with self._lock:
+            self._wasted_tokens += tokens
+
+    def as_dict(self) -> dict:
+        """
+        Get the counters.
+
+        Returns:
+            dict: Attempts, accepted and rejected speculative answers, the acceptance rate and the tokens
+                spent on rejected answers.
+        """
+        with self._lock:
+            return {
+                "attempts": self._attempts,
+                "accepted": self._accepted,
+                "rejected": self._attempts - self._accepted,
+                "hit_rate": self._accepted / self._attempts if self._attempts else 0.0,
+                "wasted_tokens": self._wasted_tokens,
+            }
@@ -0,0 +1,151 @@
+import json
+import re
+
+# Response schema used when requesting refined prompts as structured output
+REFINED_PROMPT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "refined_prompt": {
+            "type": "string",
+            "description": "The refined prompt only, without any preamble, commentary or explanation.",
+        },
+    },
+    "required": ["refined_prompt"],
+}
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a structured response cannot be parsed as JSON.
+
+    Attributes:
+        text: The raw response text, so callers can fall back to free-form parsing.
+    """
+
+    def __init__(self, message: str, text: str):
+        super().__init__(message)
+        self.text = text
+
+
+def parse_json_response(text: str) -> dict | list:
+    """
+    Parse a JSON response from the model, tolerating a surrounding markdown code fence.
+
+    Args:
+        text (str): The response text.
+
+    Returns:
+        dict | list: The decoded JSON value.
+
+    Raises:
+        StructuredOutputError: If the text is not valid JSON.
+    """
+    stripped = text.strip()
+    fenced = re.fullmatch(r"```(?:json)?\s*\n?([\s\S]*?)\n?```", stripped)
+    if fenced:
+        stripped = fenced.group(1)
+
+    try:
+        return json.loads(stripped)
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"Response is not valid JSON: {e!s}", text) from None
+
+
+class IncrementalJSONParser:
+    """
+    Parse a JSON document as it is streamed in chunks.
+
+    After each chunk the parser closes any open strings, arrays and objects in the buffered text and
+    decodes the result, so callers can observe the partially generated value (e.g. a refined prompt
+    growing token by token) before the stream completes.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._stack = []  # Closing characters for the currently open arrays and objects
+        self._in_string = False
+        self._escape = False
+        self._partial = None
+
+    @property
+    def text(self) -> str:
+        """The text received so far."""
+        return "".join(self._buffer)
+
+    @property
+    def partial(self) -> dict | list | None:
+        """The most recent successfully decoded partial value, or None."""
+        return self._partial
+
+    def feed(self, chunk: str) -> dict | list | None:
+        """
+        Add a chunk of streamed text and return the best available partial value.
+
+        Args:
+            chunk (str): The next piece of the JSON document.
+
+        Returns:
+            dict | list | None: The partial value decoded so far, or None if nothing is decodable yet.
+        """
+        self._buffer.append(chunk)
+
+        # Track string and nesting state incrementally so each chunk is only scanned once
+        for char in chunk:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._stack.append("}")
+            elif char == "[":
+                self._stack.append("]")
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+
+        decoded = self._decode_partial()
+        if decoded is not None:
+            self._partial = decoded
+        return self._partial
+
+    def close(self) -> dict | list:
+        """
+        Finish parsing once the stream has ended.
+
+        Returns:
+            dict | list: The fully decoded value.
+
+        Raises:
+            StructuredOutputError: If the complete text is not valid JSON.
+        """
+        return parse_json_response(self.text)
+
+    def _decode_partial(self) -> dict | list | None:
+        text = self.text.lstrip()
+        if not text.startswith(("{", "[")):
+            # Skip anything before the document starts, e.g. an opening code fence
+            start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+            if start < 0:
+                return None
+            text = text[start:]
+
+        if self._in_string:
+            if self._escape:
+                text = text[:-1]
+            # Drop an incomplete unicode escape before closing the string
+            text = re.sub(r"\\u[0-9a-fA-F]{0,3}$", "", text) + '"'
+
+        text = text.rstrip()
+        if text.endswith(","):
+            text = text[:-1]
+        elif text.endswith(":"):
+            text += "null"
+
+        try:
+            return json.loads(text + "".join(reversed(self._stack)))
+        except json.JSONDecodeError:
+            # Typically an incomplete key or literal; wait for more text
+            return None
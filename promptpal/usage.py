@@ -0,0 +1,85 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+# Usage trackers that are active in the current context, innermost last
+_active_trackers: ContextVar[tuple["Usage", ...]] = ContextVar("promptpal_usage_trackers", default=())
+
+
+def _token_count(value) -> int:
+    # Usage metadata fields are None when the API does not report them
+    return value if isinstance(value, int) else 0
+
+
+@dataclass
+class Usage:
+    """Token usage accumulated over one or more model calls.
+
+    Attributes:
+        prompt_tokens: Tokens in the prompts sent.
+        output_tokens: Tokens in the generated responses.
+        total_tokens: Total tokens reported by the API.
+        calls: Number of model calls recorded.
+    """
+
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    calls: int = 0
+
+    def add(self, usage_metadata) -> None:
+        """
+        Add the usage reported for a single model call.
+
+        Args:
+            usage_metadata: The usage_metadata of a generate_content or send_message response.
+        """
+        self.prompt_tokens += _token_count(getattr(usage_metadata, "prompt_token_count", None))
+        self.output_tokens += _token_count(getattr(usage_metadata, "candidates_token_count", None))
+        self.total_tokens += _token_count(getattr(usage_metadata, "total_token_count", None))
+        self.calls += 1
+
+    def merge(self, other: "Usage") -> None:
+        """Add the counts of another Usage to this one."""
+        self.prompt_tokens += other.prompt_tokens
+        self.output_tokens += other.output_tokens
+        self.total_tokens += other.total_tokens
+        self.calls += other.calls
+
+
+@contextmanager
+def track_usage() -> Iterator[Usage]:
+    """
+    Collect the token usage of every model call made by Promptpal within the block.
+
+    Tracking is scoped to the current thread (or asyncio task), so concurrent workers can each track
+    their own calls. Trackers can be nested; every active tracker records each call.
+
+    Example:
+        with track_usage() as usage:
+            promptpal.message("assistant", "Hello")
+        print(usage.total_tokens)
+
+    Yields:
+        Usage: The usage accumulated so far.
+    """
+    usage = Usage()
+    token = _active_trackers.set((*_active_trackers.get(), usage))
+    try:
+        yield usage
+    finally:
+        _active_trackers.reset(token)
+
+
+def record_usage(usage_metadata) -> None:
+    """
+    Record the usage of a model call with every active tracker.
+
+    Args:
+        usage_metadata: The usage_metadata of the response, or None if unavailable.
+    """
+    if usage_metadata is None:
+        return
+    for usage in _active_trackers.get():
+        usage.add(usage_metadata)
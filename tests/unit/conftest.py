@@ -0,0 +1,103 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from google.genai import types
+
+
+def fake_usage(prompt_tokens: int = 5, output_tokens: int = 5) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens,
+    )
+
+
+class FakeModels:
+    """A local stand-in for client.models that answers with a configurable responder."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        return self._client.respond(model, contents, config)
+
+    def generate_content_stream(self, model, contents, config=None):
+        response = self._client.respond(model, contents, config)
+        words = response.text.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield SimpleNamespace(
+                text=word if last else f"{word} ", usage_metadata=response.usage_metadata if last else None
+            )
+
+
+class FakeChat:
+    """A local stand-in for a genai chat that keeps its history."""
+
+    def __init__(self, client, model, history=None):
+        self._client = client
+        self.model = model
+        self.history = list(history or [])
+
+    def _record(self, contents, text):
+        self.history.append(types.Content(role="user", parts=[types.Part(text=str(contents))]))
+        self.history.append(types.Content(role="model", parts=[types.Part(text=text)]))
+
+    def send_message(self, contents, config=None):
+        response = self._client.respond(self.model, contents, config)
+        self._record(contents, response.text)
+        return response
+
+    def send_message_stream(self, contents, config=None):
+        chunks = list(FakeModels(self._client).generate_content_stream(self.model, contents, config))
+        yield from chunks
+        self._record(contents, "".join(chunk.text for chunk in chunks))
+
+    def get_history(self, curated=False):
+        return list(self.history)
+
+
+class FakeChats:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, model, config=None, history=None):
+        return FakeChat(self._client, model, history)
+
+
+class FakeClient:
+    """
+    A deterministic, in-process model backend.
+
+    By default every request is answered with "echo: <contents>". Set ``responder`` to a callable
+    taking (model, contents, config) and returning text to customize responses, and ``delay`` to
+    simulate latency. ``calls`` records every (model, contents) request.
+    """
+
+    def __init__(self):
+        self.models = FakeModels(self)
+        self.chats = FakeChats(self)
+        self.files = SimpleNamespace(upload=lambda file: f"uploaded:{file}")
+        self.responder = lambda model, contents, config: f"echo: {contents}"
+        self.delay = 0.0
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def respond(self, model, contents, config):
+        with self._lock:
+            self.calls.append((model, contents))
+        if self.delay:
+            time.sleep(self.delay)
+        text = self.responder(model, contents, config)
+        return SimpleNamespace(text=text, usage_metadata=fake_usage())
+
+
+@pytest.fixture
+def fake_client(mocker, monkeypatch):
+    """Patch genai.Client so Promptpal talks to a FakeClient."""
+    monkeypatch.setenv("GEMINI_API_KEY", "test_api_key")
+    client = FakeClient()
+    mocker.patch("promptpal.promptpal.genai.Client", return_value=client)
+    return client
@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from promptpal.artifacts import ArtifactStore, artifact_filename, content_hash
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+
+
+@pytest.fixture(autouse=True)
+def mock_env_gemini_api_key(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test_api_key")
+
+
+def test_artifact_filename_uses_full_hash():
+    code = "fn main() {}"
+    assert artifact_filename("rust", code) == f"code_snippet_{content_hash(code)}.rs"
+    assert artifact_filename("unknown", code).endswith(".txt")
+
+
+def test_put_deduplicates_identical_content(tmp_path):
+    store = ArtifactStore(tmp_path)
+
+    first, written_first = store.put("print('hi')", "python", role="developer", message_number=1)
+    second, written_second = store.put("print('hi')", "python", role="refactor", message_number=2)
+
+    assert written_first
+    assert not written_second
+    assert first.path == second.path
+    assert len(store) == 1
+    assert first.sha256 in store
+    assert [a.role for a in store.find()] == ["developer", "refactor"]
+    assert store.get(first.sha256[:12]).role == "developer"
+    assert not list(tmp_path.glob(".tmp_*"))
+
+
+def test_find_filters(tmp_path):
+    store = ArtifactStore(tmp_path)
+    store.put("SELECT 1;", "sql", role="analyst", message_number=1)
+    store.put("echo hi", "bash", role="developer", message_number=2)
+
+    assert [a.language for a in store.find(role="developer")] == ["bash"]
+    assert [a.role for a in store.find(message_number=1)] == ["analyst"]
+    assert store.find(language="python") == []
+    assert store.get("0" * 64) is None
+    assert store.get("%") is None
+    assert store.get("_" * 12) is None
+
+    # The index persists across store instances
+    store.close()
+    assert len(ArtifactStore(tmp_path)) == 2
+
+
+def test_chat_records_artifacts(mocker, tmp_path):
+    mock_client = mocker.patch("promptpal.promptpal.genai.Client")
+    mock_response = MagicMock()
+    mock_response.text = "```python\nprint('hi')\n```"
+    mock_response.usage_metadata.total_token_count = 100
+    mock_client.return_value.chats.create.return_value.send_message.return_value = mock_response
+
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path))
+    promptpal.add_roles([Role(name="developer", description="Developer", system_instruction="Write code")])
+
+    promptpal.chat("developer", "Write code", write_output=False)
+    promptpal.chat("developer", "Write the same code again", write_output=False)
+
+    artifacts = promptpal.get_artifacts(role_name="developer")
+    assert [a.message_number for a in artifacts] == [1, 2]
+    assert promptpal.get_chat_stats()["files_written"]["code"] == 1
+    assert (tmp_path / artifact_filename("python", "print('hi')")).read_text() == "print('hi')"
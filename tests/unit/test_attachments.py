@@ -0,0 +1,71 @@
+from google.genai import types
+
+from promptpal.attachments import attachment_mime_type, inline_part, is_text_mime_type, read_file_bytes
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+
+PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + bytes(range(256))
+
+
+def test_mime_types(tmp_path):
+    unknown_text = tmp_path / "notes"
+    unknown_text.write_text("plain words")
+    unknown_binary = tmp_path / "blob"
+    unknown_binary.write_bytes(b"\x00\x01\x02")
+
+    assert attachment_mime_type(tmp_path / "image.png") == "image/png"
+    assert attachment_mime_type(tmp_path / "paper.pdf") == "application/pdf"
+    assert attachment_mime_type(unknown_text) == "text/plain"
+    assert attachment_mime_type(unknown_binary) == "application/octet-stream"
+    assert is_text_mime_type("application/json")
+    assert not is_text_mime_type("image/png")
+
+
+def test_inline_part(tmp_path):
+    image = tmp_path / "image.png"
+    image.write_bytes(PNG)
+    empty = tmp_path / "empty.py"
+    empty.write_bytes(b"")
+
+    part = inline_part(image)
+    assert (part.inline_data.mime_type, part.inline_data.data) == ("image/png", PNG)
+    assert inline_part(empty).inline_data.mime_type == "text/plain"
+    assert read_file_bytes(empty) == b""
+
+
+def make_promptpal(tmp_path, **kwargs):
+    promptpal = Promptpal(load_default_roles=False, output_dir=str(tmp_path / "out"), **kwargs)
+    promptpal.add_roles([Role(name="echo", description="Echo", system_instruction="Repeat")])
+    return promptpal
+
+
+def test_small_files_sent_inline_large_files_uploaded(fake_client, tmp_path, mocker):
+    small = tmp_path / "small.png"
+    small.write_bytes(PNG)
+    large = tmp_path / "large.png"
+    large.write_bytes(PNG * 10)
+    upload = mocker.spy(fake_client.files, "upload")
+    promptpal = make_promptpal(tmp_path, vertexai=False, inline_attachment_bytes=1000)
+
+    promptpal.chat("echo", f"Compare {small} and {large}", write_output=False, write_code=False)
+
+    contents = fake_client.calls[-1][1]
+    assert isinstance(contents[1], types.Part)
+    assert contents[1].inline_data.data == PNG
+    assert contents[3] == f"uploaded:{large}"
+    upload.assert_called_once_with(file=str(large))
+
+
+def test_vertex_sends_binary_files_as_inline_data(fake_client, tmp_path):
+    image = tmp_path / "image.png"
+    image.write_bytes(PNG)
+    notes = tmp_path / "notes.txt"
+    notes.write_text("some notes")
+    promptpal = make_promptpal(tmp_path, vertexai=True)
+
+    promptpal.chat("echo", f"Describe {image} using {notes}", write_output=False, write_code=False)
+
+    text, part = fake_client.calls[-1][1]
+    assert "some notes" in text
+    assert part.inline_data.mime_type == "image/png"
+    assert part.inline_data.data == PNG
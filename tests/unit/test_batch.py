@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from promptpal.batch import load_checkpoint, normalize_prompt
+from promptpal.promptpal import Promptpal, PromptRefinementType
+from promptpal.roles import Role
+
+
+@pytest.fixture(autouse=True)
+def mock_env_gemini_api_key(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test_api_key")
+
+
+@pytest.fixture
+def promptpal(mocker):
+    mocker.patch("promptpal.promptpal.genai.Client")
+    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    promptpal.add_roles(
+        [Role(name="prompt_engineer", description="Prompt engineer", system_instruction="Refine prompts")]
+    )
+    return promptpal
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  Explain   DNA\nreplication ") == "explain dna replication"
+    assert normalize_prompt("  Explain   DNA\nreplication ", casefold=False) == "Explain DNA replication"
+
+
+def test_refine_prompts_deduplicates(promptpal, mocker):
+    mock_message = mocker.patch.object(
+        promptpal, "message", side_effect=lambda role, text, **kwargs: f"refined: {text}"
+    )
+
+    prompts = ["Explain DNA", "explain   dna", "Explain RNA"]
+    results = promptpal.refine_prompts(prompts, PromptRefinementType.PROMPT_ENGINEER, max_workers=2)
+
+    assert mock_message.call_count == 2
+    assert set(results) == set(prompts)
+    assert results["explain   dna"] == results["Explain DNA"]
+
+
+def test_refine_prompts_checkpoint_and_resume(promptpal, mocker, tmp_path):
+    output_path = tmp_path / "refined.jsonl"
+    mocker.patch.object(promptpal, "message", side_effect=["refined A", Exception("API error")])
+
+    # The first prompt succeeds and the second fails
+    promptpal.refine_prompts(["A", "B"], PromptRefinementType.PROMPT_ENGINEER, str(output_path), max_workers=1)
+    lines = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert len(lines) == 2
+    assert len(load_checkpoint(output_path)) == 1
+
+    # Resuming only retries the failed prompt
+    mock_message = mocker.patch.object(promptpal, "message", return_value="refined B")
+    progress = []
+    results = promptpal.refine_prompts(
+        ["A", "B"],
+        PromptRefinementType.PROMPT_ENGINEER,
+        str(output_path),
+        progress_callback=progress.append,
+    )
+
+    assert mock_message.call_count == 1
+    assert results == {"A": "refined A", "B": "refined B"}
+    assert progress[-1].resumed == 1
+    assert progress[-1].completed == 1
+    assert progress[-1].remaining == 0
+
+
+def test_refine_prompts_keyword_runs_locally(promptpal, mocker):
+    mock_message = mocker.patch.object(promptpal, "message")
+
+    results = promptpal.refine_prompts(["please simplify this"], PromptRefinementType.KEYWORD)
+
+    mock_message.assert_not_called()
+    assert "less complex language" in results["please simplify this"]
+
+
+def test_refine_prompts_keyword_keeps_case_variants_apart(promptpal):
+    prompts = ["please simplify this", "Please Simplify This"]
+    results = promptpal.refine_prompts(prompts, PromptRefinementType.KEYWORD)
+
+    # Keyword refinement keeps the prompt's text, so each case variant gets its own result
+    assert "less complex language" in results["please simplify this"]
+    assert results["Please Simplify This"] == "Please Simplify This"
+
+
+def test_refine_prompts_requires_refinement_type(promptpal):
+    with pytest.raises(ValueError, match="refinement type is required"):
+        promptpal.refine_prompts(["A"], None)
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from promptpal.cli import main, read_batch_records, run_batch
+from promptpal.usage import track_usage
+
+ROLES_YAML = """
+echo:
+  description: "Echo role"
+  system_instruction: "Repeat the message"
+"""
+
+
+@pytest.fixture(autouse=True)
+def mock_env_gemini_api_key(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test_api_key")
+
+
+@pytest.fixture
+def mock_client(mocker):
+    mock_client = mocker.patch("promptpal.promptpal.genai.Client").return_value
+    response = mock_client.models.generate_content.return_value
+    response.text = "answer"
+    response.usage_metadata.prompt_token_count = 7
+    response.usage_metadata.candidates_token_count = 3
+    response.usage_metadata.total_token_count = 10
+    return mock_client
+
+
+@pytest.fixture
+def batch_files(tmp_path):
+    roles_file = tmp_path / "roles.yaml"
+    roles_file.write_text(ROLES_YAML)
+    input_file = tmp_path / "input.jsonl"
+    records = [
+        {"id": "a", "role": "echo", "message": "Hello"},
+        {"id": "b", "role": "echo", "message": "World"},
+        {"id": "a", "role": "echo", "message": "Hello"},
+        {"id": "c", "refinement_type": "keyword", "message": "please simplify this"},
+    ]
+    input_file.write_text("\n".join(json.dumps(record) for record in records))
+    return input_file, tmp_path / "output.jsonl", roles_file
+
+
+def test_read_batch_records_csv(tmp_path):
+    input_file = tmp_path / "input.csv"
+    input_file.write_text("role,message,refinement_type\necho,Hello,\n,Refine me,keyword\n")
+
+    records = list(read_batch_records(input_file))
+
+    assert records[0]["role"] == "echo"
+    assert "refinement_type" not in records[0]
+    assert records[1]["refinement_type"] == "keyword"
+    assert records[0]["key"] != records[1]["key"]
+
+
+def test_read_batch_records_requires_message(tmp_path):
+    input_file = tmp_path / "input.jsonl"
+    input_file.write_text('{"role": "echo"}\n')
+    with pytest.raises(ValueError, match="has no 'message'"):
+        list(read_batch_records(input_file))
+
+
+def test_batch_command(mock_client, batch_files, capsys):
+    input_file, output_file, roles_file = batch_files
+
+    status = main(
+        ["batch", str(input_file), "-o", str(output_file), "--roles-file", str(roles_file), "--no-vertexai", "-w", "2"]
+    )
+
+    assert status == 0
+    results = {r["key"]: r for r in map(json.loads, output_file.read_text().splitlines())}
+    assert set(results) == {"a", "b", "c"}
+    assert results["a"]["response"] == "answer"
+    assert results["a"]["tokens"] == 10
+    assert "less complex language" in results["c"]["response"]
+    assert mock_client.models.generate_content.call_count == 2
+
+    output = capsys.readouterr().out
+    assert "3/3 done" in output
+    assert "Tokens: 20 total (14 prompt, 6 output) over 2 calls" in output
+
+
+def test_batch_resumes_from_output(mock_client, batch_files):
+    input_file, output_file, roles_file = batch_files
+    output_file.write_text(json.dumps({"key": "a", "response": "earlier answer"}) + "\n")
+
+    progress, usage = run_batch(
+        str(input_file), str(output_file), {"vertexai": False}, roles_file=str(roles_file), workers=1
+    )
+
+    assert progress.resumed == 1
+    assert progress.completed == 2
+    assert usage.calls == 1
+    assert len(output_file.read_text().splitlines()) == 3
+
+
+def test_track_usage_is_scoped(mock_client, batch_files):
+    from promptpal.promptpal import Promptpal
+
+    _, _, roles_file = batch_files
+    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    with open(roles_file) as file:
+        promptpal.add_roles_from_file(file)
+
+    with track_usage() as outer:
+        promptpal.message("echo", "one")
+        with track_usage() as inner:
+            promptpal.message("echo", "two")
+
+    assert inner.total_tokens == 10
+    assert outer.total_tokens == 20
+    assert outer.calls == 2
@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from promptpal.coalesce import SingleFlight, request_key
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+from promptpal.usage import track_usage
+
+
+def test_request_key_distinguishes_requests():
+    assert request_key("role", "model", {"temperature": 0.1}, "hi") == request_key(
+        "role", "model", {"temperature": 0.1}, "hi"
+    )
+    assert request_key("role", "model", {"temperature": 0.1}, "hi") != request_key(
+        "role", "model", {"temperature": 0.2}, "hi"
+    )
+
+
+def test_single_flight_shares_result_and_error():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(flight.do, "key", slow)
+        started.wait(timeout=5)
+        followers = [executor.submit(flight.do, "key", slow) for _ in range(3)]
+        # Wait for the followers to join the in-flight call before releasing it
+        while flight.stats()["requests"] < 4:
+            time.sleep(0.01)
+        release.set()
+        results = [leader.result(), *(f.result() for f in followers)]
+
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {"requests": 4, "executed": 1, "coalesced": 3, "in_flight": 0}
+
+    def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        flight.do("key", failing)
+    # Finished keys are released, so the next call runs again
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_message_coalesces_concurrent_identical_requests(fake_client):
+    fake_client.delay = 0.2
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, coalesce_requests=True)
+    promptpal.add_roles([Role(name="echo", description="Echo", system_instruction="Repeat", model="gemini-2.0-flash")])
+
+    def ask(message):
+        with track_usage() as usage:
+            return promptpal.message("echo", message), usage.calls
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(ask, ["same"] * 6 + ["different"] * 2))
+
+    assert [text for text, _ in results] == ["echo: same"] * 6 + ["echo: different"] * 2
+    assert len(fake_client.calls) == 2
+    # Only the callers whose request was actually sent are charged for it
+    assert sum(calls for _, calls in results) == 2
+    stats = promptpal.get_coalescing_stats()
+    assert stats["executed"] == 2
+    assert stats["coalesced"] == 6
+
+
+def test_coalescing_disabled_by_default(fake_client):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    assert promptpal.get_coalescing_stats() == {}
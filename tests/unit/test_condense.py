@@ -0,0 +1,90 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from promptpal.condense import condense
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+
+LONG_RESPONSE = """# DNA Replication
+
+DNA replication copies the genome before cell division. It is semi-conservative, so each new DNA molecule keeps \
+one original strand. Many people find this topic interesting. The weather today is unrelated.
+
+## Enzymes
+
+Helicase unwinds the DNA double helix at the replication fork. DNA polymerase adds nucleotides to the new DNA \
+strand. Ligase joins Okazaki fragments on the lagging DNA strand.
+
+```python
+def replicate(strand):
+    line1 = 1
+    line2 = 2
+    line3 = 3
+    line4 = 4
+    return strand
+```
+
+## Trivia
+
+Bananas are yellow.
+"""
+
+
+@pytest.fixture(autouse=True)
+def mock_env_gemini_api_key(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test_api_key")
+
+
+def test_condense_keeps_informative_sentences():
+    condensed = condense(LONG_RESPONSE, max_sentences=3, max_code_lines=3)
+
+    assert "DNA replication copies the genome" in condensed
+    assert "# DNA Replication" in condensed
+    assert "The weather today is unrelated." not in condensed
+    # Headings are dropped along with sections that have no remaining content
+    assert "## Trivia" not in condensed
+    assert "Bananas" not in condensed
+    # Code blocks are truncated, not summarized
+    assert "def replicate(strand):" in condensed
+    assert "... (3 more lines)" in condensed
+    assert condensed.rstrip().endswith("```")
+
+
+def test_condense_short_text_unchanged():
+    assert condense("Short answer.") == "Short answer."
+
+
+def test_quiet_role_prints_condensed_output(mocker, capsys):
+    mock_client = mocker.patch("promptpal.promptpal.genai.Client")
+    mock_response = MagicMock()
+    mock_response.text = LONG_RESPONSE
+    mock_response.usage_metadata.total_token_count = 100
+    mock_client.return_value.chats.create.return_value.send_message.return_value = mock_response
+
+    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    promptpal.add_roles([Role(name="quiet", description="Quiet", system_instruction="Be brief", quiet=True)])
+
+    text = promptpal.chat("quiet", "Explain DNA replication", write_code=False)
+
+    assert text == LONG_RESPONSE
+    assert "Bananas" not in capsys.readouterr().out
+    mock_client.return_value.models.generate_content.assert_not_called()
+
+
+def test_quiet_mode_llm_uses_summarizer(mocker):
+    mock_client = mocker.patch("promptpal.promptpal.genai.Client")
+    mock_client.return_value.models.generate_content.return_value.text = "LLM summary"
+
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, quiet_mode="llm")
+    promptpal.add_roles(
+        [Role(name="summarizer", description="Summarizer", system_instruction="Summarize", model="gemini-2.0-flash")]
+    )
+
+    assert promptpal._quiet_response(LONG_RESPONSE) == "LLM summary"
+    assert mock_client.return_value.models.generate_content.call_args.kwargs["model"] == "gemini-2.0-flash"
+
+
+def test_invalid_quiet_mode():
+    with pytest.raises(ValueError, match="Unknown quiet mode"):
+        Promptpal(load_default_roles=False, vertexai=False, quiet_mode="loud")
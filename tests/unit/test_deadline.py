@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from promptpal.deadline import CallCancelledError, Deadline, PromptpalTimeoutError
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+
+
+@pytest.fixture
+def promptpal(fake_client, tmp_path):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path))
+    promptpal.add_roles([Role(name="echo", description="Echo", system_instruction="Repeat")])
+    return promptpal
+
+
+def test_run_returns_result_within_deadline():
+    assert Deadline(timeout=1.0).run(lambda: "done", "test") == "done"
+    assert Deadline().remaining() is None
+
+
+def test_run_times_out():
+    with pytest.raises(PromptpalTimeoutError, match="slow call"):
+        Deadline(timeout=0.05).run(lambda: time.sleep(1.0), "slow call")
+
+
+def test_cancel_from_another_thread():
+    deadline = Deadline()
+    threading.Timer(0.05, deadline.cancel).start()
+
+    started = time.monotonic()
+    with pytest.raises(CallCancelledError):
+        deadline.run(lambda: time.sleep(1.0), "slow call")
+    assert time.monotonic() - started < 0.5
+
+
+def test_chat_timeout_keeps_history_consistent(promptpal, fake_client):
+    promptpal.chat("echo", "first", write_output=False, write_code=False)
+    fake_client.delay = 0.5
+
+    with pytest.raises(PromptpalTimeoutError):
+        promptpal.chat("echo", "second", write_output=False, write_code=False, deadline=0.05)
+    # Let the abandoned request finish; it must not add to the current chat
+    time.sleep(0.6)
+
+    assert [c.parts[0].text for c in promptpal._chat.get_history()][::2] == ["first"]
+    assert promptpal.get_chat_stats()["messages_sent"] == 1
+
+    fake_client.delay = 0.0
+    assert promptpal.chat("echo", "third", write_output=False, write_code=False, deadline=1.0) == "echo: third"
+
+
+def test_message_deadline(promptpal, fake_client):
+    fake_client.delay = 0.5
+    with pytest.raises(PromptpalTimeoutError):
+        promptpal.message("echo", "hello", deadline=0.05)
+
+    deadline = Deadline(timeout=5.0)
+    deadline.cancel()
+    with pytest.raises(CallCancelledError):
+        promptpal.message("echo", "hello", deadline=deadline)
+
+
+def test_background_summarization_outlives_the_chat_deadline(promptpal, fake_client):
+    promptpal.add_roles([Role(name="summarizer", description="Summarizer", system_instruction="Summarize")])
+    deadline = Deadline(timeout=5.0)
+
+    promptpal.chat(
+        "echo", "hello", write_output=False, write_code=False, token_threshold=1, background=True, deadline=deadline
+    )
+    deadline.cancel()
+    promptpal.wait_for_artifacts(timeout=5)
+
+    history = [c.parts[0].text for c in promptpal._chat.get_history()][::2]
+    assert history == [str(["Here is a summary of the previous chat:", "echo: ['Summarize the previous chat.']"])]
@@ -0,0 +1,84 @@
+import re
+import time
+
+import pytest
+
+from promptpal.ensemble import Ensemble, EnsembleMember, MemberResult, majority_vote, normalize_answer
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+
+ANSWERS = {"a": "Yes", "b": "yes ", "c": "No", "judge": ""}
+
+
+@pytest.fixture
+def promptpal(fake_client, tmp_path):
+    def responder(model, contents, config):
+        if model == "slow-model":
+            time.sleep(1.0)
+            return "Slow"
+        if config["system_instruction"] == "judge":
+            # The answers are numbered in the order the members finished, so find the one saying "No"
+            number = re.search(r"Answer (\d+):\W+No\b", str(contents)).group(1)
+            return f"Answer {number} is best"
+        return ANSWERS[config["system_instruction"]]
+
+    fake_client.responder = responder
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path))
+    promptpal.add_roles([Role(name=name, description=name, system_instruction=name) for name in ANSWERS])
+    return promptpal
+
+
+def test_majority_vote():
+    results = [MemberResult(EnsembleMember("x"), output=text) for text in ("No", "Yes", "yes", None)]
+    assert majority_vote(results) == "Yes"
+    assert majority_vote([]) is None
+    assert normalize_answer("  Yes,\n it IS ") == "yes, it is"
+
+
+def test_majority_aggregation(promptpal):
+    result = promptpal.run_ensemble(Ensemble(["a", "b", "c"]), "Is it?")
+
+    assert result.answer.strip().lower() == "yes"
+    assert not result.stopped_early
+    assert [r.usage.total_tokens for r in result.members] == [10, 10, 10]
+    assert result.usage.total_tokens == 30
+    assert all(r.latency is not None for r in result.members)
+
+
+def test_judge_aggregation(promptpal):
+    result = promptpal.run_ensemble(Ensemble(["a", "c"], aggregate="judge", judge_role="judge"), "Is it?")
+
+    # The judge overrules the tie that a majority vote would break by completion order
+    assert result.answer == "No"
+    assert result.judge_usage.calls == 1
+
+
+def test_custom_aggregation(promptpal):
+    ensemble = Ensemble(["a", "c"], aggregate=lambda results: "|".join(sorted(r.output for r in results)))
+    assert promptpal.run_ensemble(ensemble, "Is it?").answer == "No|Yes"
+
+
+def test_early_termination(promptpal):
+    ensemble = Ensemble(["a", "b", EnsembleMember("c", model="slow-model")], quorum=2)
+
+    started = time.monotonic()
+    result = promptpal.run_ensemble(ensemble, "Is it?")
+
+    assert time.monotonic() - started < 0.8
+    assert result.answer.strip().lower() == "yes"
+    assert result.stopped_early
+    assert result.members[2].cancelled
+
+
+def test_member_errors_are_recorded(promptpal):
+    result = promptpal.run_ensemble(Ensemble(["a", "missing"]), "Is it?")
+
+    assert result.answer == "Yes"
+    assert isinstance(result.members[1].error, ValueError)
+
+
+def test_invalid_ensemble():
+    with pytest.raises(ValueError):
+        Ensemble([])
+    with pytest.raises(ValueError):
+        Ensemble(["a"], aggregate="judge")
@@ -0,0 +1,104 @@
+from promptpal.file_versions import SentFileVersions
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+
+SOURCE = "".join(f"line {i}\n" for i in range(100))
+
+
+def test_resend_unchanged_and_diff():
+    versions = SentFileVersions()
+    assert versions.resend("app.py", SOURCE) is None
+
+    versions.record({"app.py": SOURCE})
+    assert "app.py" in versions
+    assert versions.resend("app.py", SOURCE) == "\n\n[app.py is unchanged since it was sent earlier in this chat.]\n"
+
+    edited = SOURCE.replace("line 50\n", "line fifty\n")
+    diff = versions.resend("app.py", edited)
+    assert diff.startswith("\n\nChanges to app.py since it was sent earlier in this chat:\n```diff\n")
+    assert "-line 50\n+line fifty\n" in diff
+    assert "line 10\n" not in diff
+
+
+def test_resend_whole_file_when_diff_is_larger():
+    versions = SentFileVersions()
+    versions.record({"notes.txt": "short"})
+
+    assert versions.resend("notes.txt", "entirely different") is None
+
+
+def test_forget():
+    versions = SentFileVersions()
+    versions.record({"a.txt": "a", "b.txt": "b"})
+
+    versions.forget(["a.txt"])
+    assert "a.txt" not in versions
+    assert "b.txt" in versions
+    versions.forget()
+    assert "b.txt" not in versions
+
+
+def make_promptpal(tmp_path, **kwargs):
+    promptpal = Promptpal(load_default_roles=False, output_dir=str(tmp_path / "out"), **kwargs)
+    promptpal.add_roles([Role(name="echo", description="Echo", system_instruction="Repeat")])
+    return promptpal
+
+
+def test_chat_resends_diffs(fake_client, tmp_path):
+    source = tmp_path / "app.py"
+    source.write_text(SOURCE)
+    promptpal = make_promptpal(tmp_path, vertexai=True)
+
+    promptpal.chat("echo", f"Review {source}", write_output=False, write_code=False)
+    promptpal.chat("echo", f"Again {source}", write_output=False, write_code=False)
+    source.write_text(SOURCE.replace("line 50\n", "line fifty\n"))
+    promptpal.chat("echo", f"Now {source}", write_output=False, write_code=False)
+
+    first, second, third = (call[1] for call in fake_client.calls)
+    assert "line 99" in first
+    assert second == f"Again {source}\n\n[{source} is unchanged since it was sent earlier in this chat.]\n"
+    assert "+line fifty" in third
+    assert "line 99" not in third
+
+    promptpal.new_chat()
+    promptpal.chat("echo", f"Fresh {source}", write_output=False, write_code=False)
+    assert "line 99" in fake_client.calls[-1][1]
+
+
+def test_chat_resends_whole_file_after_eviction(fake_client, tmp_path):
+    source = tmp_path / "app.py"
+    source.write_text(SOURCE)
+    promptpal = make_promptpal(tmp_path, vertexai=False, evict_attachments=True)
+
+    promptpal.chat("echo", f"Review {source}", write_output=False, write_code=False)
+    promptpal.chat("echo", f"Again {source}", write_output=False, write_code=False)
+
+    assert fake_client.calls[-1][1][1].inline_data.data == SOURCE.encode()
+
+
+def test_chat_resends_whole_file_after_summarization_or_loading(fake_client, tmp_path):
+    source = tmp_path / "app.py"
+    source.write_text(SOURCE)
+    promptpal = make_promptpal(tmp_path, vertexai=True)
+    promptpal.add_roles([Role(name="summarizer", description="Summarizer", system_instruction="Summarize")])
+
+    # The response exceeds the token threshold, so the chat is replaced by a summary
+    promptpal.chat("echo", f"Review {source}", write_output=False, write_code=False, token_threshold=1)
+    promptpal.chat("echo", f"Again {source}", write_output=False, write_code=False)
+    assert "line 99" in fake_client.calls[-1][1]
+
+    promptpal.save_session(str(tmp_path / "session.jsonl"))
+    promptpal.load_session(str(tmp_path / "session.jsonl"))
+    promptpal.chat("echo", f"Once more {source}", write_output=False, write_code=False)
+    assert "line 99" in fake_client.calls[-1][1]
+
+
+def test_diff_file_resends_disabled(fake_client, tmp_path):
+    source = tmp_path / "app.py"
+    source.write_text(SOURCE)
+    promptpal = make_promptpal(tmp_path, vertexai=True, diff_file_resends=False)
+
+    promptpal.chat("echo", f"Review {source}", write_output=False, write_code=False)
+    promptpal.chat("echo", f"Again {source}", write_output=False, write_code=False)
+
+    assert "line 99" in fake_client.calls[-1][1]
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from promptpal.hedging import HedgingPolicy
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+from promptpal.usage import track_usage
+
+
+def slow(result, seconds):
+    def call():
+        time.sleep(seconds)
+        return result
+
+    return call
+
+
+def test_hedge_wins_when_primary_is_slow():
+    policy = HedgingPolicy(delay=0.02, max_extra_ratio=1.0)
+
+    assert policy.run(slow("primary", 1.0), slow("backup", 0.0)) == "backup"
+    assert policy.run(slow("primary", 0.0), slow("backup", 0.0)) == "primary"
+    stats = policy.stats()
+    assert (stats["requests"], stats["hedged"], stats["hedge_wins"]) == (2, 1, 1)
+    policy.shutdown()
+
+
+def test_budget_limits_hedges():
+    policy = HedgingPolicy(delay=0.01, max_extra_ratio=0.0)
+
+    assert policy.run(slow("primary", 0.05), slow("backup", 0.0)) == "primary"
+    assert policy.stats()["hedged"] == 0
+    assert policy.stats()["budget_denied"] == 1
+    policy.shutdown()
+
+
+def test_delay_tracks_latency_percentile():
+    policy = HedgingPolicy(percentile=50.0, min_samples=4, initial_delay=5.0)
+    assert policy.hedge_delay() == 5.0
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        policy._observe(latency)
+    assert policy.hedge_delay() == 0.2
+
+
+def test_error_raised_when_all_attempts_fail():
+    def fail(message, seconds):
+        def call():
+            time.sleep(seconds)
+            raise RuntimeError(message)
+
+        return call
+
+    policy = HedgingPolicy(delay=0.01, max_extra_ratio=1.0)
+    with pytest.raises(RuntimeError, match="primary"):
+        policy.run(fail("primary", 0.05), fail("backup", 0.0))
+    policy.shutdown()
+
+
+def test_message_hedges_to_fallback_model(fake_client, tmp_path):
+    def responder(model, contents, config):
+        if model == "gemini-2.0-flash-001":
+            return "fast"
+        time.sleep(1.0)
+        return "slow"
+
+    fake_client.responder = responder
+    policy = HedgingPolicy(delay=0.05, max_extra_ratio=1.0, fallback_model="gemini-2.0-flash-001")
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path), hedging=policy)
+    promptpal.add_roles(
+        [Role(name="analyst", description="Analyst", system_instruction="Analyze", model="gemini-1.5-pro")]
+    )
+
+    with track_usage() as usage:
+        assert promptpal.message("analyst", "hello") == "fast"
+    assert usage.calls >= 1
+    assert policy.stats()["hedge_wins"] == 1
+    policy.shutdown()
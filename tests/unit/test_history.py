@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+from google.genai import types
+
+from promptpal.history import TurnRecord, split_turns, trim_history
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+
+
+def content(role, text):
+    return types.Content(role=role, parts=[types.Part(text=text)])
+
+
+def test_trim_history_by_turns_and_bytes():
+    history = [content("user", "a" * 10), content("model", "b" * 10), content("user", "c"), content("model", "d")]
+
+    assert trim_history(history, max_turns=1) == (history[2:], 1)
+    assert trim_history(history, max_bytes=5) == (history[2:], 1)
+    assert trim_history(history, max_turns=5, max_bytes=100) == (history, 0)
+    # The latest turn is kept even if it alone exceeds the limit
+    assert trim_history(history, max_bytes=1) == (history[2:], 1)
+    assert len(split_turns(history)) == 2
+
+
+def test_turn_record_is_compact():
+    usage_metadata = SimpleNamespace(prompt_token_count=3, candidates_token_count=4, total_token_count=7)
+    response = SimpleNamespace(text="hi", usage_metadata=usage_metadata)
+    record = TurnRecord.from_response("echo", response)
+
+    assert (record.text, record.usage.total_tokens) == ("hi", 7)
+
+
+def test_chat_history_capped(fake_client, tmp_path):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path), max_history_turns=2)
+    promptpal.add_roles([Role(name="echo", description="Echo", system_instruction="Repeat")])
+
+    for text in ("one", "two", "three"):
+        promptpal.chat("echo", text, write_output=False, write_code=False)
+
+    assert [c.parts[0].text for c in promptpal._chat.get_history()][::2] == ["two", "three"]
+    usage = promptpal.get_memory_usage()
+    assert usage["history_turns"] == 2
+    assert usage["evicted_turns"] == 1
+    assert promptpal.get_last_response() == "echo: three"
+
+
+def test_inlined_files_evicted(fake_client, tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("x" * 1000)
+    promptpal = Promptpal(load_default_roles=False, vertexai=True, output_dir=str(tmp_path), evict_attachments=True)
+    promptpal.add_roles([Role(name="echo", description="Echo", system_instruction="Repeat")])
+
+    promptpal.chat("echo", f"Summarize {path}", write_output=False, write_code=False)
+
+    user_text = promptpal._chat.get_history()[0].parts[0].text
+    assert "x" * 1000 not in user_text
+    assert str(path) in user_text
+    assert promptpal.get_memory_usage()["evicted_attachment_bytes"] > 900
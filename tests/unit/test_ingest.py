@@ -0,0 +1,137 @@
+from pathlib import Path
+
+from promptpal.ingest import IgnoreRules, estimate_tokens, ingest_directory, walk_directory
+from promptpal.promptpal import Promptpal, find_existing_directories
+from promptpal.roles import Role
+
+
+def make_tree(root: Path) -> None:
+    files = {
+        ".gitignore": "*.log\nbuild/\n/secret.txt\n",
+        "README.md": "# Project",
+        "secret.txt": "hidden",
+        "app.log": "log line",
+        "src/main.py": "print('main')",
+        "src/copy.py": "print('main')",
+        "src/secret.txt": "not anchored here",
+        "src/.gitignore": "*.tmp\n!keep.tmp\n",
+        "src/scratch.tmp": "scratch",
+        "src/keep.tmp": "kept",
+        "build/out.py": "built",
+        "node_modules/lib.js": "library",
+        "docs/deep/guide.md": "guide",
+    }
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    (root / "image.png").write_bytes(b"\x89PNG\r\n\x1a\n\x00")
+
+
+def names(root: Path, paths) -> list[str]:
+    return [path.relative_to(root).as_posix() for path in paths]
+
+
+def test_ignore_rules(tmp_path):
+    rules = IgnoreRules().extend(tmp_path, ["# comment", "*.log", "/top.txt", "docs/**/*.md", "build/", "!keep.log"])
+
+    assert rules.ignored(tmp_path / "a" / "b.log", is_dir=False)
+    assert not rules.ignored(tmp_path / "keep.log", is_dir=False)
+    assert rules.ignored(tmp_path / "top.txt", is_dir=False)
+    assert not rules.ignored(tmp_path / "sub" / "top.txt", is_dir=False)
+    assert rules.ignored(tmp_path / "docs" / "x" / "y" / "z.md", is_dir=False)
+    assert rules.ignored(tmp_path / "docs" / "z.md", is_dir=False)
+    assert rules.ignored(tmp_path / "build", is_dir=True)
+    assert not rules.ignored(tmp_path / "build", is_dir=False)
+
+
+def test_walk_directory_honors_gitignore_files(tmp_path):
+    make_tree(tmp_path)
+
+    walked = names(tmp_path, walk_directory(tmp_path, max_workers=4))
+
+    # Breadth first, sorted within each directory
+    assert walked == [
+        ".gitignore",
+        "README.md",
+        "image.png",
+        "src/.gitignore",
+        "src/copy.py",
+        "src/keep.tmp",
+        "src/main.py",
+        "src/secret.txt",
+        "docs/deep/guide.md",
+    ]
+
+
+def test_ingest_directory_filters_and_deduplicates(tmp_path):
+    make_tree(tmp_path)
+
+    files, manifest = ingest_directory(tmp_path, extensions=[".py", ".md", ".png"])
+
+    assert names(tmp_path, (file.path for file, _ in files)) == ["README.md", "src/copy.py", "docs/deep/guide.md"]
+    assert manifest.duplicates == {tmp_path / "src" / "main.py": tmp_path / "src" / "copy.py"}
+    assert manifest.skipped["binary"] == 1
+    assert manifest.skipped["extension"] == 4
+    assert manifest.skipped["ignored"] > 0
+    assert not manifest.truncated
+    summary = manifest.summary()
+    assert summary.startswith(f"Directory {tmp_path}: 3 files")
+    assert "1 duplicates skipped" in summary
+    assert "- src/copy.py (13 B)" in summary
+
+
+def test_ingest_directory_stops_at_token_budget(tmp_path):
+    for i in range(20):
+        (tmp_path / f"file{i:02}.txt").write_text(f"{i:02}" * 100)
+
+    files, manifest = ingest_directory(tmp_path, max_tokens=estimate_tokens("00" * 100) * 3, max_workers=2)
+
+    assert len(files) == 3
+    assert manifest.truncated
+    assert manifest.total_tokens <= estimate_tokens("00" * 100) * 3
+    assert "truncated at token budget" in manifest.summary()
+
+
+def test_ingest_directory_skips_large_files(tmp_path):
+    (tmp_path / "small.txt").write_text("small")
+    (tmp_path / "large.txt").write_text("x" * 100)
+
+    files, manifest = ingest_directory(tmp_path, max_file_bytes=50)
+
+    assert [file.path.name for file, _ in files] == ["small.txt"]
+    assert manifest.skipped["size"] == 1
+
+
+def test_find_existing_directories(tmp_path, monkeypatch):
+    (tmp_path / "src").mkdir()
+    monkeypatch.chdir(tmp_path)
+
+    assert find_existing_directories("Review src/ and src, then ./src.") == ["src/", "./src"]
+
+
+def test_find_existing_directories_ignores_roots_and_outside_paths(tmp_path, monkeypatch):
+    (tmp_path / "project" / "src").mkdir(parents=True)
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path / "project")
+
+    assert find_existing_directories("Compare A / B") == []
+    assert find_existing_directories("Is it and / or, // or ~/?") == []
+    assert find_existing_directories(f"Read {tmp_path}/data/ and src/") == ["src/"]
+    assert find_existing_directories("Read ../data/", allowed_roots=[tmp_path / "data"]) == ["../data/"]
+
+
+def test_chat_includes_directory_contents(fake_client, tmp_path):
+    make_tree(tmp_path)
+    promptpal = Promptpal(
+        load_default_roles=False, vertexai=False, output_dir=str(tmp_path / "out"), directory_roots=[str(tmp_path)]
+    )
+    promptpal.add_roles([Role(name="echo", description="Echo", system_instruction="Repeat")])
+
+    promptpal.chat("echo", f"Review {tmp_path}/src/", write_output=False, write_code=False)
+
+    message, directory_text = fake_client.calls[-1][1].split("\n\n", 1)
+    assert message == f"Review {tmp_path}/src/"
+    assert directory_text.startswith(f"Directory {tmp_path / 'src'}: 4 files")
+    assert "print('main')" in directory_text
+    assert "scratch" not in directory_text
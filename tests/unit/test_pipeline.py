@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from promptpal.pipeline import Pipeline, render_prompt
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+
+
+@pytest.fixture
+def promptpal(fake_client, tmp_path):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path))
+    promptpal.add_roles(
+        [Role(name=name, description=name, system_instruction=name) for name in ("developer", "tester", "editor")]
+    )
+    return promptpal
+
+
+def build_pipeline() -> Pipeline:
+    return (
+        Pipeline(max_workers=4)
+        .add_step("code", "developer", "Write {task}")
+        .add_step("tests", "tester", "Test {code}")
+        .add_step("docs", "editor", "Document {code}")
+        .add_step("review", "editor", "Review {tests} and {docs}")
+    )
+
+
+def test_order_and_validation():
+    assert build_pipeline().order() == ["code", "docs", "tests", "review"]
+    with pytest.raises(ValueError, match="unknown steps"):
+        Pipeline().add_step("a", "editor", "x", depends_on=["missing"]).order()
+    with pytest.raises(ValueError, match="cycle"):
+        Pipeline().add_step("a", "editor", "{b}").add_step("b", "editor", "{a}").order()
+    assert render_prompt("def f(): {return} {x}", {"x": "1"}) == "def f(): {return} 1"
+
+
+def test_run_passes_outputs_downstream(promptpal):
+    results = promptpal.run_pipeline(build_pipeline(), {"task": "parser"})
+
+    assert list(results) == ["code", "docs", "tests", "review"]
+    assert results["code"].output == "echo: Write parser"
+    assert (
+        results["review"].output == "echo: Review echo: Test echo: Write parser and echo: Document echo: Write parser"
+    )
+    assert all(result.usage.total_tokens == 10 and result.latency >= 0 for result in results.values())
+
+
+def test_independent_branches_run_concurrently(promptpal, fake_client):
+    fake_client.delay = 0.2
+    pipeline = Pipeline(max_workers=4)
+    for name in ("a", "b", "c"):
+        pipeline.add_step(name, "editor", f"{name} {{task}}")
+
+    started = time.monotonic()
+    promptpal.run_pipeline(pipeline, {"task": "x"})
+    assert time.monotonic() - started < 0.5
+
+
+def test_rerun_only_recomputes_changed_steps(promptpal, fake_client):
+    pipeline = Pipeline().add_step("code", "developer", "Write {task}").add_step("other", "editor", "Edit {notes}")
+    pipeline.add_step("tests", "tester", "Test {code}")
+    promptpal.run_pipeline(pipeline, {"task": "parser", "notes": "n"})
+    calls = len(fake_client.calls)
+
+    results = promptpal.run_pipeline(pipeline, {"task": "parser", "notes": "changed"})
+
+    assert len(fake_client.calls) == calls + 1
+    assert results["code"].cached and results["tests"].cached
+    assert not results["other"].cached
+
+
+def test_failed_step_raises(promptpal):
+    pipeline = Pipeline().add_step("a", "missing_role", "x").add_step("b", "editor", "{a}")
+    with pytest.raises(ValueError, match="missing_role"):
+        promptpal.run_pipeline(pipeline)
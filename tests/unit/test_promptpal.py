@@ -1,5 +1,6 @@
 import os
 import tempfile
+import threading
 from unittest.mock import MagicMock
 
 import pytest
@@ -162,7 +163,7 @@ def test_chat_with_file_references(mocker):
         temp_file_path = temp_file.name
 
     # Initialize Promptpal and add roles
-    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, inline_attachment_bytes=0)  # Always upload
     role = Role(
         name="test_role",
         description="Test Role",
@@ -361,7 +362,7 @@ def test_chat_with_file_upload(mocker, tmp_path):
     mock_upload = mock_client.return_value.files.upload
     mock_upload.return_value = "uploaded_file_reference"
 
-    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, inline_attachment_bytes=0)  # Always upload
     role = Role(
         name="file_handler",
         description="File Handler",
@@ -456,7 +457,7 @@ def test_chat_with_file_upload_and_message_parts(mocker, tmp_path):
     file_refs = ["ref1", "ref2"]
 
     # Test with vertexai=False (should use file uploads)
-    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, inline_attachment_bytes=0)  # Always upload
     role = Role(
         name="file_handler",
         description="File Handler",
@@ -547,3 +548,48 @@ def test_find_existing_files(tmp_path):
     assert len(found_files) == 2
     assert str(test_file1) in found_files
     assert str(test_file2) in found_files
+
+
+def test_chat_returns_response_text(mocker):
+    mock_client = mocker.patch("promptpal.promptpal.genai.Client")
+    mock_response = MagicMock()
+    mock_response.text = "AI response text"
+    mock_response.usage_metadata.total_token_count = 500
+    mock_client.return_value.chats.create.return_value.send_message.return_value = mock_response
+
+    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    promptpal.add_roles([Role(name="role1", description="Role 1", system_instruction="Instruction 1")])
+
+    assert promptpal.chat("role1", "Explain how AI works", write_output=False) == "AI response text"
+
+
+def test_chat_background_postprocessing(mocker, tmp_path, capsys):
+    mock_client = mocker.patch("promptpal.promptpal.genai.Client")
+    mock_response = MagicMock()
+    mock_response.text = "Here you go:\n```python\nprint('hi')\n```"
+    mock_response.usage_metadata.total_token_count = 500
+    mock_client.return_value.chats.create.return_value.send_message.return_value = mock_response
+
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path))
+    promptpal.add_roles([Role(name="role1", description="Role 1", system_instruction="Instruction 1")])
+    assert promptpal.wait_for_artifacts() == []
+
+    # Hold the post-processing thread until the response text has been returned
+    release = threading.Event()
+    original_put = promptpal._artifacts.put
+
+    def blocked_put(*args, **kwargs):
+        release.wait(timeout=5)
+        return original_put(*args, **kwargs)
+
+    mocker.patch.object(promptpal._artifacts, "put", side_effect=blocked_put)
+
+    text = promptpal.chat("role1", "Write code", background=True)
+    assert text == mock_response.text
+    assert not promptpal.pending_artifacts.done()
+
+    release.set()
+    artifacts = promptpal.wait_for_artifacts(timeout=5)
+    assert len(artifacts) == 1
+    assert (tmp_path / promptpal.determine_filename("python", "print('hi')")).exists()
+    assert "Here you go:" in capsys.readouterr().out
@@ -0,0 +1,127 @@
+import json
+import threading
+
+import pytest
+
+from promptpal.promptpal_ui import PromptpalUI
+
+
+@pytest.fixture
+def ui(fake_client):
+    return PromptpalUI(vertexai=False)
+
+
+def test_refine_prompt_runs_in_background_and_streams(ui, fake_client):
+    release = threading.Event()
+    partials = []
+
+    def respond(model, contents, config):
+        release.wait(5)
+        return json.dumps({"refined_prompt": "A much better prompt"})
+
+    fake_client.responder = respond
+    ui.refined_prompt_output.observe(lambda change: partials.append(change["new"]), names="value")
+    ui.prompt_input.value = "Write a poem"
+
+    ui.refine_prompt(None)
+    assert ui.busy
+    assert ui.refine_button.disabled and not ui.cancel_button.disabled
+    ui.refine_prompt(None)  # A second click while busy is ignored
+
+    release.set()
+    ui.wait(5)
+
+    assert not ui.busy
+    assert len(fake_client.calls) == 1
+    assert ui.refined_prompt_output.value == "A much better prompt"
+    assert any(partial and partial != "A much better prompt" for partial in partials)
+    assert ui.tool_output.value.startswith("Prompt refined using Prompt Engineer in ")
+    assert ui.status.value.startswith("Done after ")
+    assert not ui.refine_button.disabled and ui.cancel_button.disabled
+
+
+def test_get_advice_streams_into_tool_output(ui, fake_client):
+    seen = []
+    fake_client.responder = lambda model, contents, config: "Be more specific about the audience"
+    ui.tool_output.observe(lambda change: seen.append(change["new"]), names="value")
+    ui.prompt_input.value = "Write a poem"
+
+    ui.get_advice(None)
+    ui.wait(5)
+
+    assert ui.tool_output.value == "Be more specific about the audience"
+    assert "Be more " in seen
+
+
+def test_cancel_in_flight_action(ui, fake_client):
+    release = threading.Event()
+    fake_client.responder = lambda model, contents, config: release.wait(5) and "late advice"
+    ui.prompt_input.value = "Write a poem"
+
+    ui.get_advice(None)
+    ui.cancel(None)
+    ui.wait(5)
+    release.set()
+
+    assert ui.status.value.startswith("Cancelled after ")
+    assert ui.tool_output.value == "Getting advice on prompt..."
+    assert not ui.get_advice_button.disabled
+
+
+def test_failure_while_showing_the_result_clears_busy_state(ui):
+    def work(deadline):
+        return "advice"
+
+    def on_done(result, elapsed):
+        raise RuntimeError("display broke")
+
+    ui._run_in_background("Getting advice", work, on_done, "Error getting advice")
+    ui.wait(5)
+
+    assert ui.tool_output.value == "Error getting advice: display broke"
+    assert ui.status.value.startswith("Failed after ")
+    assert not ui.busy
+    assert not ui.get_advice_button.disabled and ui.cancel_button.disabled
+
+
+def test_refine_prompt_requires_a_prompt(ui, fake_client):
+    ui.refine_prompt(None)
+
+    assert ui.tool_output.value == "Error: Please enter a prompt to refine."
+    assert not fake_client.calls
+
+
+def test_compare_refinements_fills_one_pane_per_method(ui, fake_client):
+    def respond(model, contents, config):
+        if "chain" in str(config["system_instruction"]).lower():
+            raise RuntimeError("overloaded")
+        return json.dumps({"refined_prompt": f"refined by {model}"})
+
+    fake_client.responder = respond
+    ui.prompt_input.value = "Write a summary of the paper"
+    ui.compare_methods_select.value = ("Prompt Engineer", "Keyword Refinement", "Chain of Thought")
+
+    ui.compare_refinements(None)
+    ui.wait(5)
+
+    engineer, keyword, chain = ui.comparison_panes.children
+    assert engineer.children[0].value.startswith("Prompt Engineer: ")
+    assert engineer.children[0].value.endswith(", 10 tokens")
+    assert engineer.children[1].value.startswith("refined by ")
+    assert keyword.children[0].value.endswith(", 0 tokens")
+    assert keyword.children[1].value == "Write a summary of the paper"
+    assert chain.children[0].value == "Chain of Thought: failed"
+    assert "Compared 2 refinement methods" in ui.tool_output.value
+    assert "Fewest tokens: Keyword Refinement (0 tokens)" in ui.tool_output.value
+
+    engineer.children[2].click()
+    assert ui.refined_prompt_output.value == engineer.children[1].value
+
+
+def test_compare_refinements_requires_a_method(ui, fake_client):
+    ui.prompt_input.value = "Write a poem"
+    ui.compare_methods_select.value = ()
+
+    ui.compare_refinements(None)
+
+    assert ui.tool_output.value == "Error: Please select at least one refinement method to compare."
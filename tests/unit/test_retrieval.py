@@ -0,0 +1,107 @@
+import pytest
+
+from promptpal.promptpal import Promptpal
+from promptpal.retrieval import RetrievalIndex, chunk_text, format_chunks
+from promptpal.roles import Role
+
+
+def write_log(path, topic_lines):
+    """Write a large file of filler lines with a few lines about specific topics."""
+    lines = [f"filler line {i} with nothing in particular" for i in range(400)]
+    for line_number, text in topic_lines.items():
+        lines[line_number] = text
+    path.write_text("\n".join(lines))
+
+
+def test_chunk_text():
+    text = "\n".join(f"line {i}" for i in range(1, 11))
+
+    chunks = chunk_text("f.txt", text, chunk_lines=4, overlap=1)
+
+    assert [(c.start_line, c.end_line) for c in chunks] == [(1, 4), (4, 7), (7, 10)]
+    assert chunks[1].text == "line 4\nline 5\nline 6\nline 7"
+    assert [(c.start_line, c.end_line) for c in chunk_text("e.txt", "")] == [(1, 0)]
+    with pytest.raises(ValueError):
+        chunk_text("f.txt", text, chunk_lines=4, overlap=4)
+
+
+def test_search_ranks_relevant_chunks(tmp_path):
+    log = tmp_path / "server.log"
+    write_log(log, {50: "database connection timeout on replica", 300: "disk quota exceeded on volume"})
+    index = RetrievalIndex()
+    index.add_file(log)
+
+    results = index.search("why the database connection timeout?", top_k=2)
+
+    assert results[0][0].start_line <= 51 <= results[0][0].end_line
+    assert "database connection timeout" in results[0][0].text
+    assert results[0][1] > results[-1][1] or len(results) == 1
+    assert index.search("", top_k=2) == []
+
+
+def test_index_is_cached_by_content_hash(tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("alpha beta")
+    index = RetrievalIndex()
+
+    assert index.add_file(notes)
+    assert not index.add_file(notes)
+    notes.write_text("gamma delta")
+    assert index.add_file(notes)
+
+    assert index.reindexed == 2
+    assert index.search("alpha") == []
+    assert index.search("gamma")[0][0].text == "gamma delta"
+
+
+def test_format_chunks_orders_by_file_and_line():
+    chunks = chunk_text("a.txt", "\n".join(str(i) for i in range(10)), chunk_lines=5, overlap=0)
+
+    text = format_chunks([chunks[1], chunks[0]])
+
+    assert text.index("(lines 1-5)") < text.index("(lines 6-10)")
+    assert "Excerpt of a.txt (lines 6-10):\n```\n5\n6\n7\n8\n9\n```" in text
+
+
+def make_promptpal(tmp_path, **kwargs):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path / "out"), **kwargs)
+    promptpal.add_roles([Role(name="echo", description="Echo", system_instruction="Repeat")])
+    return promptpal
+
+
+def test_chat_sends_only_relevant_chunks(fake_client, tmp_path, mocker):
+    log = tmp_path / "server.log"
+    write_log(log, {50: "database connection timeout on replica", 300: "disk quota exceeded on volume"})
+    small = tmp_path / "small.txt"
+    small.write_text("small file")
+    upload = mocker.spy(fake_client.files, "upload")
+    promptpal = make_promptpal(tmp_path, retrieval_top_k=1)
+
+    promptpal.chat("echo", f"Explain the database timeout in {log} and {small}", write_output=False, write_code=False)
+
+    contents = fake_client.calls[-1][1]
+    excerpt = contents[-1]
+    assert excerpt.startswith(f"\n\nExcerpt of {log} (lines 36-75)")
+    assert "database connection timeout" in excerpt
+    assert "disk quota" not in excerpt
+    assert contents[-2].inline_data.data == b"small file"  # Small files are still sent whole
+    upload.assert_not_called()
+
+
+def test_keep_retrieval_index_across_turns(fake_client, tmp_path):
+    log = tmp_path / "server.log"
+    write_log(log, {50: "database connection timeout on replica", 300: "disk quota exceeded on volume"})
+    kept = make_promptpal(tmp_path, retrieval_top_k=1, keep_retrieval_index=True)
+    dropped = make_promptpal(tmp_path, retrieval_top_k=1)
+
+    for promptpal in (kept, dropped):
+        promptpal.chat("echo", f"Read {log}", write_output=False, write_code=False)
+        promptpal.chat("echo", "What about the disk quota?", write_output=False, write_code=False)
+
+    kept_message, dropped_message = fake_client.calls[1][1], fake_client.calls[3][1]
+    assert "disk quota exceeded on volume" in kept_message
+    assert dropped_message == "What about the disk quota?"
+
+    kept.new_chat()
+    kept.chat("echo", "What about the disk quota?", write_output=False, write_code=False)
+    assert fake_client.calls[-1][1] == "What about the disk quota?"
@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+from promptpal.routing import RoutingPolicy, is_overload_error, schema_models, timed_request
+from promptpal.scheduler import Priority, RequestScheduler
+from promptpal.semantic_cache import SemanticCache
+
+
+def test_default_models_come_from_role_schema():
+    policy = RoutingPolicy()
+
+    assert set(policy.models) == set(schema_models()) - {"text-embedding-004"}
+    with pytest.raises(ValueError, match="No profile"):
+        RoutingPolicy(models=["gemini-9"])
+
+
+def test_route_keeps_role_model_within_constraints():
+    policy = RoutingPolicy()
+
+    assert policy.route("gemini-1.5-pro", 1000) == "gemini-1.5-pro"
+    assert policy.route("gemini-1.5-pro", 1000, latency_slo=5.0) == "gemini-1.5-pro"
+    assert policy.route("some-other-model", 1000) == "some-other-model"
+
+
+def test_route_by_latency_slo_and_prompt_size():
+    policy = RoutingPolicy()
+
+    # The best model that meets the SLO
+    assert policy.route("gemini-1.5-pro", 1000, latency_slo=1.0) == "gemini-2.0-flash"
+    # Larger prompts take longer, so they need faster models to meet an SLO
+    assert policy.route("gemini-1.5-pro", 100_000, latency_slo=0.9) == "gemini-2.0-flash-lite-preview-02-05"
+    assert policy.route("gemini-1.5-pro", 100_000, latency_slo=0.7) == "gemini-1.5-flash-8b"
+    # Nothing meets the SLO: the fastest model
+    assert policy.route("gemini-1.5-pro", 1000, latency_slo=0.1) == "gemini-1.5-flash-8b"
+    # Only the pro model has room for this prompt
+    assert policy.route("gemini-2.0-flash", 1_500_000) == "gemini-1.5-pro"
+
+
+def test_route_by_cost():
+    policy = RoutingPolicy(max_cost_per_call=0.01)
+
+    assert policy.route("gemini-1.5-pro", 1000) == "gemini-1.5-pro"
+    assert policy.route("gemini-1.5-pro", 100_000) == "gemini-2.0-flash"
+
+
+def test_observed_latency_replaces_profile():
+    policy = RoutingPolicy(models=["gemini-2.0-flash", "gemini-1.5-flash-8b"], min_samples=3)
+
+    for _ in range(3):
+        policy.run("gemini-2.0-flash", 0, lambda model: timed_request(lambda: "ok"))
+    # A call that made no request of its own is served, but adds no latency sample
+    policy.run("gemini-2.0-flash", 0, lambda model: "shared")
+    assert policy.calls[-1].latency is None
+
+    assert policy.estimate_latency("gemini-2.0-flash", 0) < 0.1
+    # The observed flash latency now beats the 8b profile, so flash meets a tight SLO
+    assert policy.route("gemini-2.0-flash", 0, latency_slo=0.3) == "gemini-2.0-flash"
+    assert policy.stats()["served"] == {"gemini-2.0-flash": 4}
+
+
+def test_run_falls_back_on_overload():
+    policy = RoutingPolicy()
+    attempts = []
+
+    def call(model):
+        attempts.append(model)
+        if model == "gemini-1.5-pro":
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+        return f"answer from {model}"
+
+    assert policy.run("gemini-1.5-pro", 1000, call) == "answer from gemini-1.5-flash-8b"
+    # The overloaded model is avoided during its cooldown
+    assert policy.run("gemini-1.5-pro", 1000, call) == "answer from gemini-2.0-flash"
+    assert attempts == ["gemini-1.5-pro", "gemini-1.5-flash-8b", "gemini-2.0-flash"]
+    assert [call.model for call in policy.calls] == ["gemini-1.5-flash-8b", "gemini-2.0-flash"]
+    assert policy.calls[0].fallbacks == 1
+    assert policy.stats()["overloads"] == {"gemini-1.5-pro": 1}
+
+
+def test_run_raises_other_errors():
+    policy = RoutingPolicy()
+
+    def call(model):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError, match="bad request"):
+        policy.run("gemini-1.5-pro", 1000, call)
+    assert not is_overload_error(ValueError("bad request"))
+    assert is_overload_error(RuntimeError("503 UNAVAILABLE"))
+
+
+def test_message_is_routed(fake_client):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, routing=RoutingPolicy())
+    promptpal.add_roles(
+        [Role(name="analyst", description="Analyst", system_instruction="Analyze", model="gemini-1.5-pro")]
+    )
+
+    promptpal.message("analyst", "Quick question")
+    promptpal.message("analyst", "Quick question", latency_slo=1.0)
+    promptpal.message("analyst", "Quick question", latency_slo=0.1, model="gemini-1.5-pro")
+
+    assert [model for model, _ in fake_client.calls] == ["gemini-1.5-pro", "gemini-2.0-flash", "gemini-1.5-pro"]
+    assert promptpal.get_routing_stats()["served"] == {"gemini-1.5-pro": 1, "gemini-2.0-flash": 1}
+
+
+def test_cache_hits_and_queue_time_are_not_routed_calls(fake_client):
+    scheduler = RequestScheduler(max_concurrency=1)
+    cache = SemanticCache(embedder=lambda texts: [[1.0, 0.0] for _ in texts])
+    promptpal = Promptpal(
+        load_default_roles=False, vertexai=False, routing=RoutingPolicy(), scheduler=scheduler, semantic_cache=cache
+    )
+    promptpal.add_roles(
+        [Role(name="analyst", description="Analyst", system_instruction="Analyze", model="gemini-2.0-flash")]
+    )
+    release = threading.Event()
+    blocker = threading.Thread(target=scheduler.run, args=(lambda: release.wait(5), Priority.BATCH))
+    blocker.start()
+    threading.Timer(0.3, release.set).start()
+
+    for _ in range(5):
+        promptpal.message("analyst", "Quick question")
+    blocker.join(5)
+
+    # One request reached a model; the other answers came from the cache
+    assert len(fake_client.calls) == 1
+    assert promptpal.get_routing_stats()["served"] == {"gemini-2.0-flash": 1}
+    # The 0.3s spent waiting for a scheduler slot is not part of the model's latency
+    assert promptpal._routing.calls[0].latency < 0.2
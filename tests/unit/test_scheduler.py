@@ -0,0 +1,205 @@
+import threading
+import time
+
+import pytest
+
+from promptpal.deadline import CallCancelledError, Deadline, PromptpalTimeoutError
+from promptpal.ensemble import Ensemble
+from promptpal.pipeline import Pipeline
+from promptpal.promptpal import Promptpal, PromptRefinementType
+from promptpal.roles import Role
+from promptpal.scheduler import Priority, QueueFullError, RequestScheduler, current_priority, request_priority
+from promptpal.usage import track_usage
+
+
+def wait_until(condition, timeout=5.0):
+    stop = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < stop, "Timed out waiting for the condition"
+        time.sleep(0.005)
+
+
+def start(scheduler, priority, order, name, release):
+    def call():
+        order.append(name)
+        release.wait(5)
+
+    thread = threading.Thread(target=scheduler.run, args=(call, priority))
+    thread.start()
+    return thread
+
+
+def test_request_priority_context():
+    assert current_priority(Priority.NORMAL) is Priority.NORMAL
+    with request_priority(Priority.BATCH):
+        assert current_priority(Priority.INTERACTIVE) is Priority.BATCH
+    assert current_priority(Priority.INTERACTIVE) is Priority.INTERACTIVE
+
+
+def test_weighted_fair_queuing():
+    scheduler = RequestScheduler(max_concurrency=1, weights={Priority.INTERACTIVE: 2, Priority.BATCH: 1})
+    order = []
+    gate = threading.Event()
+    release = threading.Event()
+    threads = [start(scheduler, Priority.BATCH, order, "blocker", gate)]
+    wait_until(lambda: order == ["blocker"])
+
+    for i in range(4):
+        threads.append(start(scheduler, Priority.BATCH, order, f"batch{i}", release))
+        wait_until(lambda i=i: scheduler.stats()["batch"]["queued"] == i + 1)
+    for i in range(4):
+        threads.append(start(scheduler, Priority.INTERACTIVE, order, f"interactive{i}", release))
+        wait_until(lambda i=i: scheduler.stats()["interactive"]["queued"] == i + 1)
+
+    release.set()
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    # Interactive requests get two slots for every batch slot (the blocker counts as one), but batch
+    # work is not starved
+    assert order[1:] == [
+        "interactive0",
+        "interactive1",
+        "interactive2",
+        "batch0",
+        "interactive3",
+        "batch1",
+        "batch2",
+        "batch3",
+    ]
+    stats = scheduler.stats()
+    assert stats["interactive"]["completed"] == 4
+    assert stats["batch"]["completed"] == 5
+    assert stats["batch"]["queue_time_max"] >= stats["batch"]["queue_time_p50"] > 0
+    assert stats["in_flight"] == 0
+
+
+def test_full_queue_applies_backpressure():
+    scheduler = RequestScheduler(max_concurrency=1, max_queued={Priority.BATCH: 1}, queue_full_timeout=0.05)
+    order = []
+    release = threading.Event()
+    threads = [start(scheduler, Priority.BATCH, order, "running", release)]
+    wait_until(lambda: order == ["running"])
+    threads.append(start(scheduler, Priority.BATCH, order, "queued", release))
+    wait_until(lambda: scheduler.stats()["batch"]["queued"] == 1)
+
+    with pytest.raises(QueueFullError):
+        scheduler.run(lambda: None, Priority.BATCH)
+    # Other classes have their own queues
+    with pytest.raises(PromptpalTimeoutError):
+        scheduler.run(lambda: None, Priority.INTERACTIVE, timeout=0.05)
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    stats = scheduler.stats()
+    assert stats["batch"]["rejected"] == 1
+    assert stats["interactive"]["timed_out"] == 1
+    assert order == ["running", "queued"]
+
+
+def test_queued_call_is_dropped_at_its_deadline():
+    scheduler = RequestScheduler(max_concurrency=1)
+    order = []
+    release = threading.Event()
+    thread = start(scheduler, Priority.NORMAL, order, "running", release)
+    wait_until(lambda: order == ["running"])
+
+    with pytest.raises(PromptpalTimeoutError):
+        scheduler.run(lambda: order.append("expired"), Priority.NORMAL, deadline=Deadline(timeout=0.05))
+
+    deadline = Deadline()
+    errors = []
+
+    def run_cancelled():
+        try:
+            scheduler.run(lambda: order.append("cancelled"), Priority.NORMAL, deadline=deadline)
+        except CallCancelledError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=run_cancelled)
+    waiter.start()
+    wait_until(lambda: scheduler.stats()["normal"]["queued"] == 1)
+    deadline.cancel()
+    release.set()
+    for t in (thread, waiter):
+        t.join(5)
+
+    assert order == ["running"]
+    assert len(errors) == 1
+    stats = scheduler.stats()
+    assert stats["normal"]["timed_out"] == 1
+    assert stats["normal"]["cancelled"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_message_deadline_covers_the_queue(fake_client):
+    scheduler = RequestScheduler(max_concurrency=1)
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, scheduler=scheduler)
+    promptpal.add_roles([Role(name="assistant", description="Assistant", system_instruction="Help")])
+    order = []
+    release = threading.Event()
+    thread = start(scheduler, Priority.INTERACTIVE, order, "running", release)
+    wait_until(lambda: order == ["running"])
+
+    with pytest.raises(PromptpalTimeoutError):
+        promptpal.message("assistant", "Hello", deadline=0.1)
+    wait_until(lambda: scheduler.stats()["normal"]["timed_out"] == 1)
+    release.set()
+    thread.join(5)
+
+    # The abandoned request left the queue at its deadline instead of calling the model later
+    assert not fake_client.calls
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        RequestScheduler(max_concurrency=0)
+    with pytest.raises(ValueError):
+        RequestScheduler(weights={Priority.BATCH: 0})
+
+
+def test_promptpal_calls_use_priorities(fake_client, mocker):
+    scheduler = RequestScheduler(max_concurrency=2)
+    run = mocker.spy(scheduler, "run")
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, scheduler=scheduler)
+    promptpal.add_roles(
+        [
+            Role(name="assistant", description="Assistant", system_instruction="Help"),
+            Role(name="prompt_engineer", description="Prompt engineer", system_instruction="Refine prompts"),
+        ]
+    )
+
+    promptpal.chat("assistant", "Hello", write_output=False, write_code=False)
+    promptpal.message("assistant", "Hello")
+    with request_priority(Priority.BATCH):
+        promptpal.message("assistant", "Hello")
+    promptpal.refine_prompts(["Explain DNA"], PromptRefinementType.PROMPT_ENGINEER)
+
+    assert [call.args[1] for call in run.call_args_list] == [
+        Priority.INTERACTIVE,
+        Priority.NORMAL,
+        Priority.BATCH,
+        Priority.BATCH,
+    ]
+    stats = promptpal.get_scheduler_stats()
+    assert stats["interactive"]["completed"] == 1
+    assert stats["batch"]["completed"] == 2
+
+
+def test_pipeline_and_ensemble_workers_keep_the_priority(fake_client):
+    scheduler = RequestScheduler(max_concurrency=2)
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, scheduler=scheduler)
+    promptpal.add_roles([Role(name=name, description=name, system_instruction=name) for name in ("a", "b")])
+    pipeline = Pipeline().add_step("first", "a", "Start").add_step("second", "b", "Continue {first}")
+
+    with request_priority(Priority.BATCH), track_usage() as usage:
+        promptpal.run_pipeline(pipeline)
+        promptpal.run_ensemble(Ensemble(["a", "b"]), "Is it?")
+
+    assert usage.calls == 4
+    stats = scheduler.stats()
+    assert stats["batch"]["completed"] == 4
+    assert stats["normal"]["submitted"] == 0
@@ -0,0 +1,83 @@
+import re
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from promptpal.promptpal import Promptpal  # noqa: E402
+from promptpal.roles import Role  # noqa: E402
+from promptpal.semantic_cache import SemanticCache  # noqa: E402
+
+VOCABULARY = ["reset", "password", "account", "billing", "invoice", "refund", "how", "do", "i", "my"]
+
+
+def bag_of_words(texts):
+    """Deterministic embedder: word counts over a small vocabulary."""
+    return [[re.findall(r"\w+", text.lower()).count(word) for word in VOCABULARY] for text in texts]
+
+
+def test_lookup_matches_similar_prompts():
+    cache = SemanticCache(embedder=bag_of_words, threshold=0.8)
+    cache.put("support", cache.embed("How do I reset my password"), "How do I reset my password", "Click reset.")
+
+    assert cache.lookup("support", cache.embed("how do i reset my password?")) == "Click reset."
+    assert cache.lookup("support", cache.embed("refund my invoice")) is None
+    # Partitions are per role
+    assert cache.lookup("billing", cache.embed("How do I reset my password")) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_lru_eviction_per_role():
+    cache = SemanticCache(embedder=bag_of_words, threshold=0.99, max_entries_per_role=2)
+    for prompt in ("reset password", "billing invoice"):
+        cache.put("support", cache.embed(prompt), prompt, prompt.upper())
+    # Touch the first entry so the second is least recently used
+    assert cache.lookup("support", cache.embed("reset password")) == "RESET PASSWORD"
+    cache.put("support", cache.embed("refund"), "refund", "REFUND")
+
+    assert cache.lookup("support", cache.embed("billing invoice")) is None
+    assert cache.lookup("support", cache.embed("reset password")) == "RESET PASSWORD"
+    assert cache.stats()["entries"] == {"support": 2}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_size_bound_evicts_across_roles():
+    cache = SemanticCache(embedder=bag_of_words, max_bytes=150)
+    cache.put("a", cache.embed("reset"), "reset", "x" * 50)
+    cache.put("b", cache.embed("refund"), "refund", "y" * 50)
+
+    assert cache.stats()["entries"] == {"a": 0, "b": 1}
+    assert cache.stats()["bytes"] <= 150
+
+
+def test_memory_mapped_storage(tmp_path):
+    cache = SemanticCache(embedder=bag_of_words, mmap_dir=tmp_path, max_entries_per_role=8)
+    cache.put("support", cache.embed("reset password"), "reset password", "Click reset.")
+
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    assert cache.lookup("support", cache.embed("password reset")) == "Click reset."
+
+    # Another cache sharing the directory gets its own file
+    other = SemanticCache(embedder=bag_of_words, mmap_dir=tmp_path, max_entries_per_role=8)
+    other.put("support", other.embed("refund"), "refund", "Contact billing.")
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+    assert cache.lookup("support", cache.embed("refund")) is None
+    assert cache.lookup("support", cache.embed("password reset")) == "Click reset."
+
+    other.close()
+    cache.clear()
+    assert not list(tmp_path.glob("*.npy"))
+
+
+def test_message_uses_semantic_cache(fake_client, tmp_path):
+    cache = SemanticCache(embedder=bag_of_words, threshold=0.9)
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path), semantic_cache=cache)
+    promptpal.add_roles([Role(name="support", description="Support", system_instruction="Help")])
+
+    first = promptpal.message("support", "How do I reset my password")
+    second = promptpal.message("support", "how do i reset my password?")
+    promptpal.message("support", "Where is my invoice")
+
+    assert second == first
+    assert len(fake_client.calls) == 2
@@ -0,0 +1,96 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+from promptpal.server import PromptpalServer
+
+
+@pytest.fixture
+def server(fake_client, tmp_path):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path))
+    promptpal.add_roles(
+        [
+            Role(name="echo", description="Echo", system_instruction="Repeat"),
+            Role(name="prompt_engineer", description="Prompt engineer", system_instruction="Refine"),
+        ]
+    )
+    server = PromptpalServer(promptpal, port=0, max_sessions=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, path, body=None, method="POST"):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            return response.status, response.headers.get("Content-Type"), response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get("Content-Type"), e.read().decode()
+
+
+def test_message_endpoint(server):
+    status, _, body = request(server, "/message", {"role": "echo", "message": "hello there"})
+    assert status == 200
+    assert json.loads(body) == {"response": "echo: hello there"}
+
+
+def test_message_endpoint_streaming(server):
+    status, content_type, body = request(server, "/message", {"role": "echo", "message": "a b c", "stream": True})
+
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert content_type == "application/x-ndjson"
+    assert "".join(line["chunk"] for line in lines[:-1]) == "echo: a b c"
+    assert lines[-1] == {"done": True, "response": "echo: a b c"}
+
+
+def test_chat_sessions_are_isolated(server):
+    _, _, body = request(server, "/chat", {"role": "echo", "message": "first"})
+    session_id = json.loads(body)["session_id"]
+    request(server, "/chat", {"session_id": session_id, "role": "echo", "message": "second"})
+    request(server, "/chat", {"session_id": "other", "role": "echo", "message": "elsewhere", "stream": True})
+
+    _, session = server.sessions.get(session_id)
+    assert [c.parts[0].text for c in session.promptpal._chat.get_history()][::2] == ["first", "second"]
+    assert session.promptpal.get_chat_stats()["messages_sent"] == 2
+    # Sessions share the roles and client of the server's instance
+    assert session.promptpal._client is server.promptpal._client
+    assert session.promptpal._roles is server.promptpal._roles
+
+    status, _, _ = request(server, f"/sessions/{session_id}", method="DELETE")
+    assert status == 200
+    assert len(server.sessions) == 1
+
+
+def test_refine_endpoint(server, fake_client):
+    fake_client.responder = lambda model, contents, config: "Here is your refined prompt:\nExplain DNA clearly"
+
+    status, _, body = request(server, "/refine", {"prompt": "Explain DNA", "refinement_type": "prompt_engineer"})
+
+    assert status == 200
+    assert json.loads(body) == {"refined_prompt": "Explain DNA clearly"}
+
+
+def test_errors(server):
+    assert request(server, "/message", {"role": "missing", "message": "hi"})[0] == 400
+    assert request(server, "/message", {"role": "echo"})[0] == 400
+    assert request(server, "/unknown", {})[0] == 404
+    status, _, body = request(server, "/health", method="GET")
+    assert status == 200
+    assert json.loads(body)["status"] == "ok"
+
+
+def test_sessions_evicted_beyond_limit(server):
+    for session_id in ("a", "b", "c"):
+        request(server, "/chat", {"session_id": session_id, "role": "echo", "message": "hi"})
+    assert len(server.sessions) == 2
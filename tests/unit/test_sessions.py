@@ -0,0 +1,87 @@
+import pytest
+
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+from promptpal.sessions import read_session
+
+
+def make_promptpal():
+    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    promptpal.add_roles([Role(name="role1", description="Role 1", system_instruction="Instruction 1")])
+    return promptpal
+
+
+def test_save_and_resume_session(fake_client, tmp_path):
+    path = tmp_path / "session.jsonl"
+    promptpal = make_promptpal()
+    promptpal.chat("role1", "first", write_output=False, write_code=False)
+    promptpal.save_session(str(path))
+    promptpal.chat("role1", "second", write_output=False, write_code=False)
+    promptpal.save_session(str(path))
+
+    # Only the new turns are appended on the second save
+    assert path.read_text().count('"t":"turn"') == 4
+
+    resumed = make_promptpal()
+    calls_before = len(fake_client.calls)
+    role_name = resumed.load_session(str(path))
+
+    assert role_name == "role1"
+    assert [c.parts[0].text for c in resumed._chat.get_history()] == ["first", "echo: first", "second", "echo: second"]
+    assert resumed.get_chat_stats()["tokens_used"] == 20
+    assert resumed.get_chat_stats()["messages_per_role"] == {"role1": 2}
+    # The history is restored locally instead of being replayed through the API
+    assert len(fake_client.calls) == calls_before
+
+
+def test_load_session_tail(fake_client, tmp_path):
+    path = tmp_path / "session.jsonl"
+    promptpal = make_promptpal()
+    for i in range(5):
+        promptpal.chat("role1", f"message {i}", write_output=False, write_code=False)
+        promptpal.save_session(str(path))
+
+    session = read_session(path, tail=3)
+    # The tail is trimmed so the history starts with a user turn
+    assert session.history == [("user", "message 4"), ("model", "echo: message 4")]
+    assert session.truncated
+    assert session.message_count == 5
+
+    resumed = make_promptpal()
+    resumed.load_session(str(path), tail=4)
+    assert len(resumed._chat.get_history()) == 4
+
+
+def test_save_session_after_new_chat_resets_history(fake_client, tmp_path):
+    path = tmp_path / "session.jsonl"
+    promptpal = make_promptpal()
+    promptpal.chat("role1", "old", write_output=False, write_code=False)
+    promptpal.save_session(str(path))
+    promptpal.new_chat()
+    promptpal.chat("role1", "new", write_output=False, write_code=False)
+    promptpal.save_session(str(path))
+
+    assert read_session(path).history == [("user", "new"), ("model", "echo: new")]
+
+
+def test_save_session_with_trimmed_history_stays_bounded(fake_client, tmp_path):
+    path = tmp_path / "session.jsonl"
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, max_history_turns=4)
+    promptpal.add_roles([Role(name="role1", description="Role 1", system_instruction="Instruction 1")])
+    for i in range(20):
+        promptpal.chat("role1", f"message {i}", write_output=False, write_code=False)
+        promptpal.save_session(str(path))
+
+    # Trimming replaces the history on every turn, so each save rewrites the file
+    history = [(c.role, c.parts[0].text) for c in promptpal._chat.get_history()]
+    assert path.read_text().count('"t":"turn"') == len(history) < 10
+    assert path.read_text().count('"t":"meta"') == 1
+    assert read_session(path).history[-1] == ("model", "echo: message 19")
+    assert not list(tmp_path.glob(".tmp_*"))
+
+
+def test_read_session_rejects_other_files(tmp_path):
+    path = tmp_path / "other.jsonl"
+    path.write_text('{"key": "value"}\n')
+    with pytest.raises(ValueError, match="not a promptpal session file"):
+        read_session(path)
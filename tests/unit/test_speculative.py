@@ -0,0 +1,79 @@
+import pytest
+
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+from promptpal.speculative import prompt_similarity
+
+
+@pytest.fixture
+def promptpal(fake_client, tmp_path):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path))
+    promptpal.add_roles(
+        [
+            Role(name="echo", description="Echo", system_instruction="Repeat"),
+            Role(name="prompt_engineer", description="Prompt engineer", system_instruction="Refine"),
+        ]
+    )
+    return promptpal
+
+
+def refine_to(fake_client, refined):
+    def responder(model, contents, config):
+        if config and config.get("system_instruction") == "Refine":
+            return f"Here is your refined prompt:\n{refined}"
+        return f"echo: {contents}"
+
+    fake_client.responder = responder
+
+
+def test_prompt_similarity():
+    assert prompt_similarity("Explain how DNA replicates", "explain how DNA replicates.") == pytest.approx(1.0)
+    assert prompt_similarity("Explain DNA", "Write a poem about cats") == 0.0
+    assert 0.0 < prompt_similarity("Explain how DNA replicates", "Explain how DNA replicates in detail") < 1.0
+
+
+def test_speculative_answer_kept_for_similar_refinement(promptpal, fake_client):
+    refine_to(fake_client, "Explain how DNA replicates.")
+
+    response = promptpal.refine_and_chat("echo", "Explain how DNA replicates", write_output=False, write_code=False)
+
+    assert response == "echo: Explain how DNA replicates"
+    assert [c.parts[0].text for c in promptpal._chat.get_history()][::2] == ["Explain how DNA replicates"]
+    assert promptpal.get_chat_stats()["messages_sent"] == 1
+    assert promptpal.get_speculation_stats()["accepted"] == 1
+
+
+def test_accepted_speculative_answer_keeps_sent_files(fake_client, tmp_path):
+    source = tmp_path / "app.py"
+    source.write_text("".join(f"line {i}\n" for i in range(100)))
+    promptpal = Promptpal(load_default_roles=False, vertexai=True, output_dir=str(tmp_path / "out"))
+    promptpal.add_roles(
+        [
+            Role(name="echo", description="Echo", system_instruction="Repeat"),
+            Role(name="prompt_engineer", description="Prompt engineer", system_instruction="Refine"),
+        ]
+    )
+    refine_to(fake_client, f"Review {source}.")
+
+    promptpal.refine_and_chat("echo", f"Review {source}", write_output=False, write_code=False)
+    promptpal.chat("echo", f"Again {source}", write_output=False, write_code=False)
+
+    # The file sent with the accepted answer is not sent in full again
+    assert (
+        fake_client.calls[-1][1]
+        == f"Again {source}\n\n[{source} is unchanged since it was sent earlier in this chat.]\n"
+    )
+
+
+def test_speculative_answer_discarded_for_different_refinement(promptpal, fake_client):
+    promptpal.chat("echo", "hello", write_output=False, write_code=False)
+    refine_to(fake_client, "Describe semiconservative replication step by step")
+
+    response = promptpal.refine_and_chat("echo", "Explain DNA", write_output=False, write_code=False)
+
+    assert response == "echo: Describe semiconservative replication step by step"
+    history = [c.parts[0].text for c in promptpal._chat.get_history()][::2]
+    assert history == ["hello", "Describe semiconservative replication step by step"]
+    assert promptpal.get_chat_stats()["messages_sent"] == 2
+    stats = promptpal.get_speculation_stats()
+    assert (stats["attempts"], stats["rejected"], stats["hit_rate"]) == (1, 1, 0.0)
@@ -0,0 +1,82 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from promptpal.promptpal import Promptpal, PromptRefinementType
+from promptpal.roles import Role
+from promptpal.structured import (
+    REFINED_PROMPT_SCHEMA,
+    IncrementalJSONParser,
+    StructuredOutputError,
+    parse_json_response,
+)
+
+
+@pytest.fixture(autouse=True)
+def mock_env_gemini_api_key(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test_api_key")
+
+
+@pytest.fixture
+def mock_client(mocker):
+    return mocker.patch("promptpal.promptpal.genai.Client").return_value
+
+
+@pytest.fixture
+def promptpal(mock_client):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False)
+    promptpal.add_roles(
+        [Role(name="prompt_engineer", description="Prompt engineer", system_instruction="Refine prompts")]
+    )
+    return promptpal
+
+
+def test_parse_json_response_strips_code_fence():
+    assert parse_json_response('```json\n{"refined_prompt": "Hi"}\n```') == {"refined_prompt": "Hi"}
+
+    with pytest.raises(StructuredOutputError) as error:
+        parse_json_response("Here is your refined prompt: Hi")
+    assert error.value.text == "Here is your refined prompt: Hi"
+
+
+def test_incremental_json_parser():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"refined_') is None
+    assert parser.feed('prompt": "Explain') == {"refined_prompt": "Explain"}
+    assert parser.feed(' DNA \\"rep') == {"refined_prompt": 'Explain DNA "rep'}
+    assert parser.feed('lication\\"", "tags": [1,') == {"refined_prompt": 'Explain DNA "replication"', "tags": [1]}
+    parser.feed(" 2]}")
+    assert parser.close() == {"refined_prompt": 'Explain DNA "replication"', "tags": [1, 2]}
+
+
+def test_message_with_response_schema(promptpal, mock_client):
+    mock_client.models.generate_content.return_value.text = '{"refined_prompt": "Refined"}'
+
+    result = promptpal.message("prompt_engineer", "Refine this", response_schema=REFINED_PROMPT_SCHEMA)
+
+    assert result == {"refined_prompt": "Refined"}
+    config = mock_client.models.generate_content.call_args.kwargs["config"]
+    assert config["response_mime_type"] == "application/json"
+    assert config["response_schema"] == REFINED_PROMPT_SCHEMA
+
+
+def test_refine_prompt_structured_streaming(promptpal, mock_client):
+    chunks = ['{"refined_prompt": "Explain', " DNA replication", ' step by step"}']
+    mock_client.models.generate_content_stream.return_value = [MagicMock(text=chunk) for chunk in chunks]
+    partials = []
+
+    refined = promptpal.refine_prompt(
+        "Explain DNA", PromptRefinementType.PROMPT_ENGINEER, structured=True, on_partial=partials.append
+    )
+
+    assert refined == "Explain DNA replication step by step"
+    assert partials == ["Explain", "Explain DNA replication", "Explain DNA replication step by step"]
+    mock_client.models.generate_content.assert_not_called()
+
+
+def test_refine_prompt_structured_falls_back_to_text_extraction(promptpal, mock_client):
+    mock_client.models.generate_content.return_value.text = "Here is your refined prompt:\nExplain DNA replication"
+
+    refined = promptpal.refine_prompt("Explain DNA", PromptRefinementType.PROMPT_ENGINEER, structured=True)
+
+    assert refined == "Explain DNA replication"
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from promptpal.promptpal import Promptpal
+from promptpal.roles import Role
+
+THREADS = 16
+MESSAGES_PER_THREAD = 50
+
+
+def test_shared_instance_under_concurrency(fake_client, tmp_path):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path), thread_safe=True)
+    promptpal.add_roles(
+        [
+            Role(name="even", description="Even", system_instruction="Repeat"),
+            Role(name="odd", description="Odd", system_instruction="Repeat"),
+        ]
+    )
+    start = threading.Barrier(THREADS)
+
+    def worker(worker_id: int) -> list[str]:
+        start.wait()
+        role = "even" if worker_id % 2 == 0 else "odd"
+        errors = []
+        for i in range(MESSAGES_PER_THREAD):
+            message = f"w{worker_id}-m{i}"
+            promptpal.chat(role, message, write_output=False, write_code=False)
+            if promptpal.get_last_response() != f"echo: {message}":
+                errors.append(message)
+        # Each thread sees only its own history
+        history = [c.parts[0].text for c in promptpal._thread_session()._chat.get_history()][::2]
+        if history != [f"w{worker_id}-m{i}" for i in range(MESSAGES_PER_THREAD)]:
+            errors.append(f"history of worker {worker_id}")
+        return errors
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(worker, range(THREADS)))
+
+    total = THREADS * MESSAGES_PER_THREAD
+    stats = promptpal.get_chat_stats()
+    assert results == [[]] * THREADS
+    assert stats["messages_sent"] == total
+    assert stats["tokens_used"] == total * 10
+    assert stats["messages_per_role"] == {"even": total // 2, "odd": total // 2}
+    # The calling thread's own chat is untouched
+    assert promptpal._thread_session()._chat.get_history() == []
+
+
+def test_stats_lock_counts_every_message(fake_client, tmp_path):
+    promptpal = Promptpal(load_default_roles=False, vertexai=False, output_dir=str(tmp_path))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: promptpal._record_chat_message("echo", 3), range(4000)))
+
+    assert promptpal.get_chat_stats()["messages_sent"] == 4000
+    assert promptpal.get_chat_stats()["tokens_used"] == 12000